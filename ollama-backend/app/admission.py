@@ -0,0 +1,147 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from app.settings import settings
+
+# Lower value is served first
+INTERACTIVE = 0
+BATCH = 1
+BACKGROUND = 2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _ModelGate:
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.queued = 0
+        self.queued_per_user: Counter = Counter()
+        self.waiters: List[list] = []
+        self.admitted = 0
+        self.rejected = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.admitted += 1
+        self.wait_count += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+
+class AdmissionController:
+    """Caps concurrent Ollama generations per model and queues the rest.
+
+    Waiters are ordered by priority, then by how many requests the same user
+    already has queued, then by arrival, so one user's burst interleaves with
+    everyone else instead of running ahead of them. When the queue or a
+    user's share of it is full, requests are rejected straight away.
+    """
+
+    def __init__(self):
+        self._gates: Dict[str, _ModelGate] = {}
+        self._seq = itertools.count()
+
+    def _gate(self, model: str) -> _ModelGate:
+        gate = self._gates.get(model)
+        if gate is None:
+            limit = settings.OLLAMA_MODEL_MAX_IN_FLIGHT.get(model, settings.OLLAMA_MAX_IN_FLIGHT)
+            gate = self._gates[model] = _ModelGate(limit)
+        return gate
+
+    def _reject(self, gate: _ModelGate, status_code: int, detail: str):
+        gate.rejected += 1
+        raise AdmissionRejected(status_code, detail, settings.OLLAMA_RETRY_AFTER)
+
+    def check(self, model: str, user: str):
+        """Raise AdmissionRejected now if a request would not even be queued."""
+        gate = self._gate(model)
+        if gate.in_flight < gate.max_in_flight and not gate.queued:
+            return
+        if gate.queued >= settings.OLLAMA_MAX_QUEUE:
+            self._reject(gate, 503, "The model is busy, please retry shortly")
+        if gate.queued_per_user[user] >= settings.OLLAMA_MAX_QUEUED_PER_USER:
+            self._reject(gate, 429, "Too many requests waiting for the model")
+
+    async def acquire(self, model: str, user: str, priority: int = BATCH):
+        gate = self._gate(model)
+        if gate.in_flight < gate.max_in_flight and not gate.queued:
+            gate.in_flight += 1
+            gate.record_wait(0.0)
+            return
+
+        self.check(model, user)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(gate.waiters, [priority, gate.queued_per_user[user], next(self._seq), future])
+        gate.queued += 1
+        gate.queued_per_user[user] += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait({future}, timeout=settings.OLLAMA_QUEUE_TIMEOUT)
+        except asyncio.CancelledError:
+            # A slot handed over just as we were cancelled must go back
+            if future.done() and not future.cancelled():
+                self.release(model)
+            future.cancel()
+            raise
+        finally:
+            gate.queued -= 1
+            gate.queued_per_user[user] -= 1
+            if gate.queued_per_user[user] <= 0:
+                del gate.queued_per_user[user]
+
+        if not future.done():
+            future.cancel()
+            self._reject(gate, 503, "Timed out waiting for the model")
+        gate.record_wait(time.monotonic() - started)
+
+    def release(self, model: str):
+        gate = self._gate(model)
+        gate.in_flight -= 1
+        while gate.waiters:
+            _, _, _, future = heapq.heappop(gate.waiters)
+            if future.done():
+                continue  # abandoned by a cancelled or timed-out waiter
+            gate.in_flight += 1
+            future.set_result(None)
+            break
+
+    @asynccontextmanager
+    async def slot(self, model: str, user: Optional[str], priority: int = BATCH):
+        user = user or "anonymous"
+        await self.acquire(model, user, priority)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    def stats(self) -> dict:
+        return {
+            model: {
+                "max_in_flight": gate.max_in_flight,
+                "in_flight": gate.in_flight,
+                "queued": gate.queued,
+                "admitted": gate.admitted,
+                "rejected": gate.rejected,
+                "queue_wait_avg_seconds": gate.wait_total / gate.wait_count if gate.wait_count else 0.0,
+                "queue_wait_max_seconds": gate.wait_max,
+            }
+            for model, gate in self._gates.items()
+        }
+
+
+admission = AdmissionController()
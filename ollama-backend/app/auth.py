@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, Optional
+
+from fastapi import HTTPException
+from jose import jwt, JWTError
+
+from app.db import db
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def token_key(token: str) -> str:
+    # Tokens are bearer secrets; only their hash is kept in memory or in Mongo
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def owner(user: dict) -> dict:
+    """The {"username", "role"} shape files, summaries, jobs and dashboard entries are stored under.
+
+    Queries match the embedded document exactly, so this must stay free of _id.
+    """
+    return {"username": user["username"], "role": user["role"]}
+
+
+def verify_token(token: str) -> dict:
+    """The claims of a validly signed, unexpired token; 401 otherwise."""
+    try:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("sub") is None or payload.get("role") is None:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+    return payload
+
+
+@dataclass
+class CachedUser:
+    user: dict
+    expires_at: float
+
+
+class AuthCache:
+    """Verified tokens and the account they belong to, keyed by the token's SHA-256.
+
+    A hit skips the signature check and the db.admins read. Entries live for
+    AUTH_CACHE_TTL seconds and never outlive the token's own exp. Revoking
+    drops entries in this process at once; other workers see a revocation on
+    their next miss, because every miss checks revoked_tokens and the admin's
+    tokens_valid_after.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, CachedUser]" = OrderedDict()
+        self.counts = {"hits": 0, "misses": 0}
+
+    async def user_for(self, token: str) -> dict:
+        key = token_key(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.counts["hits"] += 1
+                return dict(entry.user)
+            del self._entries[key]
+
+        self.counts["misses"] += 1
+        payload = verify_token(token)
+        user = await self._resolve(key, payload)
+        ttl = min(settings.AUTH_CACHE_TTL, payload["exp"] - time.time()) if "exp" in payload else settings.AUTH_CACHE_TTL
+        if ttl > 0 and settings.AUTH_CACHE_MAX_ENTRIES > 0:
+            self._entries[key] = CachedUser(user, time.monotonic() + ttl)
+            while len(self._entries) > settings.AUTH_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+        return dict(user)
+
+    async def _resolve(self, key: str, payload: dict) -> dict:
+        username, role = payload["sub"], payload["role"]
+        if await db.revoked_tokens.find_one({"_id": key}, {"_id": 1}):
+            raise HTTPException(status_code=401, detail="Token revoked")
+
+        if role == "superadmin":
+            # The superadmin logs in from settings; its record may not exist
+            if username != settings.SUPERADMIN_USERNAME:
+                raise HTTPException(status_code=401, detail="Invalid token payload")
+            account = await db.superadmins.find_one({"username": username}, {"_id": 1})
+            return {"_id": account["_id"] if account else None, "username": username, "role": role}
+
+        account = await db.admins.find_one({"username": username}, {"_id": 1, "tokens_valid_after": 1})
+        if not account:
+            raise HTTPException(status_code=401, detail="User no longer exists")
+        # Tokens issued before iat existed count as issued at the epoch
+        if payload.get("iat", 0) < account.get("tokens_valid_after", 0):
+            raise HTTPException(status_code=401, detail="Token revoked")
+        return {"_id": account["_id"], "username": username, "role": role}
+
+    def forget_user(self, username: str) -> int:
+        """Drop every cached token of `username` in this process."""
+        keys = [key for key, entry in self._entries.items() if entry.user["username"] == username]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    async def revoke_token(self, token: str):
+        """Reject `token` from now on, in every worker, until it would have expired anyway."""
+        key = token_key(token)
+        payload = verify_token(token)
+        expires_at = datetime.utcfromtimestamp(payload["exp"]) if "exp" in payload else datetime.utcnow()
+        await db.revoked_tokens.update_one({"_id": key}, {"$set": {"expires_at": expires_at}}, upsert=True)
+        self._entries.pop(key, None)
+
+    async def revoke_user(self, username: str):
+        """Reject every token `username` holds; tokens issued from the next second on still work."""
+        # iat has one-second resolution, so a login in this same second stays valid
+        await db.admins.update_one({"username": username}, {"$set": {"tokens_valid_after": int(time.time())}})
+        dropped = self.forget_user(username)
+        logger.info("Revoked tokens of %s (%d cached)", username, dropped)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), **self.counts}
+
+
+auth_cache = AuthCache()
+
+
+async def authenticate(token: str) -> dict:
+    """{"_id", "username", "role"} of the token's account; 401 if it is invalid or revoked.
+
+    Use owner(user) wherever the user is stored in or matched against a document.
+    """
+    return await auth_cache.user_for(token)
+
+
+class LoginThrottle:
+    """Sliding-window limits on logins, checked before any bcrypt work is spent.
+
+    Only failures count, against both the client IP and the username, so
+    users sharing an address behind NAT or a proxy are never locked out by
+    each other's successful logins. Windows are kept for at most
+    LOGIN_THROTTLE_MAX_KEYS keys, oldest dropped.
+    """
+
+    def __init__(self):
+        self._events: "OrderedDict[str, Deque[float]]" = OrderedDict()
+        self.counts = {"throttled": 0}
+
+    def _recent(self, key: str, window: int, now: float) -> Optional[Deque[float]]:
+        events = self._events.get(key)
+        if events is None:
+            return None
+        while events and events[0] <= now - window:
+            events.popleft()
+        if not events:
+            del self._events[key]
+            return None
+        return events
+
+    def _record(self, key: str, now: float):
+        self._events.setdefault(key, deque()).append(now)
+        self._events.move_to_end(key)
+        while len(self._events) > settings.LOGIN_THROTTLE_MAX_KEYS:
+            self._events.popitem(last=False)
+
+    def check(self, username: str, ip: str):
+        """429 if the IP or the username has too many recent failures."""
+        now = time.monotonic()
+        limits = (
+            (f"ip:{ip}", settings.LOGIN_IP_WINDOW_SECONDS, settings.LOGIN_MAX_FAILURES_PER_IP),
+            (f"user:{username}", settings.LOGIN_USERNAME_WINDOW_SECONDS, settings.LOGIN_MAX_FAILURES_PER_USERNAME),
+        )
+        for key, window, limit in limits:
+            events = self._recent(key, window, now)
+            if events is not None and len(events) >= limit:
+                self.counts["throttled"] += 1
+                retry_after = int(events[0] + window - now) + 1
+                raise HTTPException(
+                    status_code=429, detail="Too many login attempts, try again later", headers={"Retry-After": str(retry_after)}
+                )
+
+    def failed(self, username: str, ip: str):
+        now = time.monotonic()
+        self._record(f"ip:{ip}", now)
+        self._record(f"user:{username}", now)
+
+    def succeeded(self, username: str):
+        self._events.pop(f"user:{username}", None)
+
+    def stats(self) -> dict:
+        return {"keys": len(self._events), **self.counts}
+
+
+login_throttle = LoginThrottle()
@@ -1,5 +1,15 @@
-from pymongo import MongoClient
-from .config import settings
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.metrics import MongoCommandMetrics
+from app.settings import settings
 
-client = MongoClient(settings.MONGO_URI)
+client = AsyncIOMotorClient(
+    settings.MONGO_URI,
+    maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+    minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+    maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+    serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=settings.MONGO_SOCKET_TIMEOUT_MS,
+    event_listeners=[MongoCommandMetrics()] if settings.METRICS_ENABLED else [],
+)
 db = client["ollama_assistant"]
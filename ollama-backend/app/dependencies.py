@@ -1,20 +1,10 @@
-from fastapi import Depends, HTTPException
+from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
-from app.settings import settings
+from app.auth import authenticate
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        username: str = payload.get("sub")
-        role: str = payload.get("role")
 
-        if username is None or role is None:
-            raise HTTPException(status_code=401, detail="Invalid token payload")
-
-        return {"username": username, "role": role}
-
-    except JWTError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+    # Verified once per token and cached with the admin's _id; see AuthCache
+    return await authenticate(token)
@@ -0,0 +1,131 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from app.db import db
+
+logger = logging.getLogger(__name__)
+
+# (collection, keys, options) for every hot query path the routes run
+INDEXES = [
+    # get_chat_history: find({"username"}).sort([("timestamp", -1), ("_id", -1)]), keyset pages
+    ("chats", [("username", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {"name": "username_timestamp_id"}),
+    # superadmin history without a username filter
+    ("chats", [("timestamp", DESCENDING), ("_id", DESCENDING)], {"name": "timestamp_id"}),
+    # ContextStore and one session's history: a session's turns in order
+    ("chats", [("username", ASCENDING), ("chat_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {"name": "username_chat_id_timestamp_id"}),
+    # ContextStore and the session list
+    ("chat_sessions", [("username", ASCENDING), ("chat_id", ASCENDING)], {"name": "username_chat_id", "unique": True}),
+    ("chat_sessions", [("username", ASCENDING), ("updated_at", DESCENDING)], {"name": "username_updated_at"}),
+    # process_file / translate_file / attach_file: find_one({"user", "stored_filename"})
+    ("files", [("user", ASCENDING), ("stored_filename", ASCENDING)], {"name": "user_stored_filename"}),
+    # list_user_files: find({"user"}).sort([("uploaded_at", -1), ("_id", -1)])
+    ("files", [("user", ASCENDING), ("uploaded_at", DESCENDING), ("_id", DESCENDING)], {"name": "user_uploaded_at_id"}),
+    # superadmin file list filtered by username
+    ("files", [("user.username", ASCENDING), ("uploaded_at", DESCENDING), ("_id", DESCENDING)], {"name": "user_username_uploaded_at_id"}),
+    # superadmin file list without a username filter
+    ("files", [("uploaded_at", DESCENDING), ("_id", DESCENDING)], {"name": "uploaded_at_id"}),
+    # VectorStore.rebuild: a user's files, optionally narrowed to one chat
+    ("files", [("user.username", ASCENDING), ("chat_id", ASCENDING)], {"name": "user_username_chat_id"}),
+    # reference lookups by content hash when a file is deleted
+    ("files", [("sha256", ASCENDING)], {"name": "sha256"}),
+    # release_upload: other references to the same stored file
+    ("files", [("file_path", ASCENDING)], {"name": "file_path"}),
+    # resumable uploads: let Mongo drop abandoned sessions
+    ("upload_sessions", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+    # get_summary_history: find({"user"}).sort([("created_at", -1), ("_id", -1)])
+    ("file_summaries", [("user", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "user_created_at_id"}),
+    # summarize_document: reuse of stored chunk summaries
+    ("file_summaries", [("chunk_sha256", ASCENDING), ("processed_by", ASCENDING)], {"name": "chunk_sha256_processed_by"}),
+    # list_entries: find({"created_by"}).sort([("created_at", -1), ("_id", -1)])
+    ("dashboard", [("created_by", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {"name": "created_by_created_at_id"}),
+    # JobManager._claim: next queued job by priority, then age
+    ("jobs", [("status", ASCENDING), ("priority", DESCENDING), ("created_at", ASCENDING)], {"name": "status_priority_created_at"}),
+    # JobManager._reclaimer: running jobs with expired leases
+    ("jobs", [("status", ASCENDING), ("lease_until", ASCENDING)], {"name": "status_lease_until"}),
+    # ResponseCache: let Mongo drop expired responses
+    ("response_cache", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+    # ResponseCache._warm: recent embeddings per namespace
+    ("response_cache", [("namespace", ASCENDING), ("created_at", DESCENDING)], {"name": "namespace_created_at"}),
+    # login and admin management: find_one({"username"})
+    ("admins", [("username", ASCENDING)], {"name": "username", "unique": True}),
+    # AuthCache: tokens revoked by logout, kept until they would have expired
+    ("revoked_tokens", [("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+]
+
+# (collection, name) of indexes replaced by one above; dropped once the collection's
+# declared indexes have all been created
+SUPERSEDED = [
+    ("chats", "username_timestamp"),
+    ("chats", "timestamp"),
+    ("chats", "username_chat_id_timestamp"),
+    ("files", "user_uploaded_at"),
+    ("file_summaries", "user_created_at"),
+    ("dashboard", "created_by_created_at"),
+]
+
+
+async def ensure_indexes():
+    # create_index is a no-op when an identical index already exists
+    failed = set()
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, background=True, **options)
+        except PyMongoError as e:
+            failed.add(collection)
+            logger.warning("Could not create index %s on %s: %s", options.get("name"), collection, e)
+    for collection, name in SUPERSEDED:
+        if collection in failed:
+            continue
+        try:
+            if name in await db[collection].index_information():
+                await db[collection].drop_index(name)
+                logger.info("Dropped superseded index %s on %s", name, collection)
+        except PyMongoError as e:
+            logger.warning("Could not drop index %s on %s: %s", name, collection, e)
+
+
+async def index_report() -> dict:
+    report = {}
+    for collection in sorted({c for c, _, _ in INDEXES}):
+        declared = {options["name"]: keys for c, keys, options in INDEXES if c == collection}
+        existing = await db[collection].index_information()
+        existing_keys = {name: [(field, int(direction)) for field, direction in info["key"]] for name, info in existing.items()}
+
+        missing = [
+            name for name, keys in declared.items()
+            if [(field, int(direction)) for field, direction in keys] not in existing_keys.values()
+        ]
+        undeclared = [name for name in existing_keys if name != "_id_" and name not in declared]
+
+        # $indexStats counts accesses since the last mongod restart
+        unused = []
+        try:
+            async for stat in db[collection].aggregate([{"$indexStats": {}}]):
+                if stat["name"] != "_id_" and stat["accesses"]["ops"] == 0:
+                    unused.append(stat["name"])
+        except PyMongoError as e:
+            logger.debug("$indexStats unavailable for %s: %s", collection, e)
+
+        report[collection] = {
+            "existing": sorted(existing_keys),
+            "missing": missing,
+            "undeclared": undeclared,
+            "unused": sorted(unused),
+        }
+    return report
+
+
+async def bootstrap_indexes():
+    await ensure_indexes()
+    try:
+        report = await index_report()
+    except PyMongoError as e:
+        logger.warning("Index report failed: %s", e)
+        return
+    for collection, info in report.items():
+        if info["missing"]:
+            logger.warning("Missing indexes on %s: %s", collection, ", ".join(info["missing"]))
+        if info["unused"]:
+            logger.info("Unused indexes on %s: %s", collection, ", ".join(info["unused"]))
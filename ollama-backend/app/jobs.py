@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+import httpx
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+
+from app.admission import AdmissionRejected, BACKGROUND
+from app.auth import owner
+from app.db import db
+from app.ollama_client import ollama
+from app.settings import settings
+from app.utils.rag import vector_store
+from app.utils.summarize import summarize_document, save_summary
+from app.utils.text_cache import get_file_text
+from app.utils.translate import translation_prompt, save_translation, TRANSLATED_LANGUAGE
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("done", "failed")
+
+Progress = Callable[[dict], Awaitable[None]]
+
+
+class JobError(Exception):
+    """A job failure that retrying will not fix."""
+
+
+async def _load_file(job: dict) -> tuple:
+    file_doc = await db.files.find_one({"user": job["user"], "stored_filename": job["payload"]["filename"]})
+    if not file_doc:
+        raise JobError("File not found")
+    try:
+        content = await get_file_text(file_doc)
+    except ValueError as e:
+        raise JobError(str(e))
+    if not content.strip():
+        raise JobError("Extracted content is empty.")
+    return file_doc, content
+
+
+async def run_summarize(job: dict, progress: Progress) -> dict:
+    file_doc, content = await _load_file(job)
+    async for event in summarize_document(content, job["user"], file_doc, priority=BACKGROUND):
+        if event["event"] == "summary":
+            await save_summary(job["user"], file_doc, event["summary"], event["chunks"])
+            return {
+                "summary": event["summary"],
+                "original_filename": file_doc["original_filename"],
+                "processed_by": settings.OLLAMA_MODEL,
+            }
+        await progress(event)
+    raise JobError("Summarization produced no result")
+
+
+async def run_translate(job: dict, progress: Progress) -> dict:
+    file_doc, content = await _load_file(job)
+    await progress({"event": "translating"})
+    data = await ollama.generate(
+        translation_prompt(content),
+        timeout=settings.OLLAMA_TRANSLATE_TIMEOUT,
+        user=job["username"],
+        priority=BACKGROUND,
+        cache=True,
+    )
+    translation = data.get("response", "No translation received.")
+    await save_translation(job["user"], file_doc, translation)
+    return {
+        "original_filename": file_doc["original_filename"],
+        "translation": translation,
+        "translated_language": TRANSLATED_LANGUAGE,
+    }
+
+
+async def run_ingest(job: dict, progress: Progress) -> dict:
+    file_doc, content = await _load_file(job)
+    try:
+        chunks = await vector_store.ingest(file_doc, content, job["username"], progress)
+    except ValueError as e:
+        raise JobError(str(e))
+    return {"original_filename": file_doc["original_filename"], "chunks": chunks}
+
+
+JOB_HANDLERS: Dict[str, Callable[[dict, Progress], Awaitable[dict]]] = {
+    "summarize": run_summarize,
+    "translate": run_translate,
+    "ingest": run_ingest,
+}
+
+
+class JobManager:
+    """Durable summarize/translate/ingest jobs backed by the `jobs` collection.
+
+    Workers claim queued jobs from Mongo by priority, then age, skipping users
+    who already have JOB_MAX_RUNNING_PER_USER jobs running on any worker. Running jobs
+    hold a lease that is renewed while they work; jobs whose lease expires
+    (e.g. the process died) are put back in the queue for any worker to claim.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:6]}"
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(settings.JOB_WORKERS)]
+        self._tasks.append(asyncio.create_task(self._reclaimer()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Hand our unfinished jobs straight back instead of waiting for the lease to expire
+        await db.jobs.update_many(
+            {"status": "running", "worker_id": self.worker_id},
+            {"$set": {"status": "queued", "updated_at": datetime.utcnow()}, "$unset": {"worker_id": "", "lease_until": ""}},
+        )
+
+    async def submit(self, user: dict, job_type: str, payload: dict, priority: int = 0) -> dict:
+        now = datetime.utcnow()
+        job = {
+            "_id": uuid4().hex,
+            "type": job_type,
+            "user": owner(user),
+            "username": user["username"],
+            "payload": payload,
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "progress": None,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await db.jobs.insert_one(job)
+        self._wakeup.set()
+        return job
+
+    async def _busy_users(self) -> List[str]:
+        # Counted in Mongo so the limit holds across processes and hosts; two workers
+        # claiming at the same instant can still briefly exceed it by one each
+        rows = await db.jobs.aggregate([
+            {"$match": {"status": "running"}},
+            {"$group": {"_id": "$username", "running": {"$sum": 1}}},
+            {"$match": {"running": {"$gte": settings.JOB_MAX_RUNNING_PER_USER}}},
+        ]).to_list(length=None)
+        return [row["_id"] for row in rows]
+
+    async def _claim(self) -> Optional[dict]:
+        busy = await self._busy_users()
+        now = datetime.utcnow()
+        return await db.jobs.find_one_and_update(
+            # Missing not_before (never retried) counts as due
+            {"status": "queued", "username": {"$nin": busy}, "not_before": {"$not": {"$gt": now}}},
+            {
+                "$set": {
+                    "status": "running",
+                    "worker_id": self.worker_id,
+                    "started_at": now,
+                    "updated_at": now,
+                    "lease_until": now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("priority", DESCENDING), ("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Failed to claim a job")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(job)
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            try:
+                await db.jobs.update_one(
+                    {"_id": job_id, "worker_id": self.worker_id},
+                    {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=settings.JOB_LEASE_SECONDS)}},
+                )
+            except Exception:
+                # Keep renewing; the lease outlasts a couple of missed beats
+                logger.exception("Failed to renew the lease of job %s", job_id)
+
+    async def _finish(self, job_id: str, fields: dict, unset: dict = None):
+        update = {"$set": {**fields, "updated_at": datetime.utcnow()}}
+        update["$unset"] = {"lease_until": "", **(unset or {})}
+        await db.jobs.update_one({"_id": job_id, "worker_id": self.worker_id}, update)
+
+    async def _run(self, job: dict):
+        job_id = job["_id"]
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+
+        async def progress(event: dict):
+            await db.jobs.update_one(
+                {"_id": job_id, "worker_id": self.worker_id},
+                {"$set": {"progress": event, "updated_at": datetime.utcnow()}},
+            )
+
+        try:
+            handler = JOB_HANDLERS.get(job["type"])
+            if handler is None:
+                raise JobError(f"Unknown job type: {job['type']}")
+            result = await handler(job, progress)
+            await self._finish(job_id, {"status": "done", "result": result, "finished_at": datetime.utcnow()})
+        except asyncio.CancelledError:
+            raise
+        except (httpx.HTTPError, HTTPException, AdmissionRejected) as e:
+            # Ollama or the extraction pool was unavailable; retry later
+            if job["attempts"] < settings.JOB_MAX_ATTEMPTS:
+                # Back off so an outage does not burn every attempt within seconds
+                delay = min(settings.JOB_RETRY_BACKOFF * 2 ** (job["attempts"] - 1), settings.JOB_RETRY_BACKOFF_MAX)
+                logger.warning("Job %s attempt %s failed, retrying in %ss: %s", job_id, job["attempts"], delay, e)
+                await self._finish(
+                    job_id,
+                    {"status": "queued", "error": str(e), "not_before": datetime.utcnow() + timedelta(seconds=delay)},
+                    unset={"worker_id": ""},
+                )
+            else:
+                await self._finish(job_id, {"status": "failed", "error": str(e), "finished_at": datetime.utcnow()})
+        except Exception as e:
+            if not isinstance(e, JobError):
+                logger.exception("Job %s failed", job_id)
+            await self._finish(job_id, {"status": "failed", "error": str(e), "finished_at": datetime.utcnow()})
+        finally:
+            heartbeat.cancel()
+            self._wakeup.set()
+
+    async def _reclaimer(self):
+        while True:
+            try:
+                now = datetime.utcnow()
+                result = await db.jobs.update_many(
+                    {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$lt": settings.JOB_MAX_ATTEMPTS}},
+                    {"$set": {"status": "queued", "updated_at": now}, "$unset": {"worker_id": "", "lease_until": ""}},
+                )
+                if result.modified_count:
+                    logger.info("Re-queued %s jobs with expired leases", result.modified_count)
+                    self._wakeup.set()
+                # A job that keeps killing its worker (crash, OOM) must not be retried forever
+                result = await db.jobs.update_many(
+                    {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$gte": settings.JOB_MAX_ATTEMPTS}},
+                    {
+                        "$set": {
+                            "status": "failed",
+                            "error": f"Worker crashed or stalled on the last of {settings.JOB_MAX_ATTEMPTS} attempts",
+                            "finished_at": now,
+                            "updated_at": now,
+                        },
+                        "$unset": {"worker_id": "", "lease_until": ""},
+                    },
+                )
+                if result.modified_count:
+                    logger.warning("Failed %s jobs whose lease expired on their last attempt", result.modified_count)
+            except Exception:
+                logger.exception("Failed to re-claim expired jobs")
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 2)
+
+
+def job_view(job: dict) -> dict:
+    return {
+        "id": job["_id"],
+        "type": job["type"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "attempts": job["attempts"],
+        "progress": job.get("progress"),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+job_manager = JobManager()
@@ -1,9 +1,116 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import chat, auth, files, stt_tts, subject, dashboard, blog,admins
+from app.routes import chat, auth, files, stt_tts, subject, dashboard, blog,admins, jobs, voice, metrics
 from app.seed_admin import seed_admins  # ✅ correct import
+from app.admission import AdmissionRejected
+from app.ollama_client import ollama
+from app.db import client as mongo_client
+from app.indexes import bootstrap_indexes
+from app.utils.extraction import extraction_pool
+from app.jobs import job_manager
+from app.utils.context import contexts
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.password_handler import password_hasher
+from app.utils.stt import stt
+from app.utils.web import web_fetcher
+from app.utils.uploads import max_upload_bytes, storage_sweeper
+from app.settings import settings
+from app.logging_config import configure_logging
+from app.metrics import HTTP_IN_PROGRESS, HTTP_LATENCY, HTTP_REQUESTS
+
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared Ollama connection pool for every route
+    ollama.start()
+    ollama.start_health_checks()
+    extraction_pool.start()
+    job_manager.start()
+    storage_sweeper.start()
+    # Build indexes in the background so startup is not blocked on Mongo
+    index_task = asyncio.create_task(bootstrap_indexes()) if settings.MONGO_ENSURE_INDEXES else None
+    yield
+    if index_task is not None and not index_task.done():
+        index_task.cancel()
+    await job_manager.stop()
+    await storage_sweeper.stop()
+    await contexts.stop()
+    extraction_pool.shutdown()
+    stt.shutdown()
+    password_hasher.shutdown()
+    await web_fetcher.close()
+    await ollama.close()
+    mongo_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": exc.detail},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+# Multipart framing around the file itself
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Refuse oversized uploads from Content-Length before the body is read;
+    # the upload handlers still count bytes for chunked requests
+    if request.method == "POST" and request.url.path == "/api/files/upload":
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > max_upload_bytes() + UPLOAD_OVERHEAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": f"File is larger than {settings.UPLOAD_MAX_MB} MB"})
+    return await call_next(request)
+
+class MetricsMiddleware:
+    """Request counts, latency until the last byte and requests in progress.
+
+    Plain ASGI rather than @app.middleware, so the try/finally spans the
+    streamed body too: the in-progress gauge comes back down even when the
+    client disconnects before the body is read or the app fails mid-stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED or scope["path"] == "/metrics":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        started = time.perf_counter()
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.labels(method).inc()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            HTTP_IN_PROGRESS.labels(method).dec()
+            # The matched route template keeps label values bounded (no ids or filenames)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.labels(method, route, status).inc()
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+
 
-app = FastAPI()
+app.add_middleware(MetricsMiddleware)
 
 # Seed database on startup
 # seed_admins()
@@ -17,6 +124,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Routes
@@ -28,6 +136,9 @@ app.include_router(subject.router, prefix="/api/subject")
 app.include_router(dashboard.router, prefix="/api/dashboard")
 app.include_router(blog.router, prefix="/api/blog")
 app.include_router(admins.router, prefix="/api/admins")
+app.include_router(jobs.router, prefix="/api/jobs")
+app.include_router(voice.router, prefix="/api/voice")
+app.include_router(metrics.router)
 
 @app.get("/")
 def root():
@@ -0,0 +1,90 @@
+import os
+import threading
+from typing import Dict
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from pymongo import monitoring
+
+# LLM calls and streamed answers run far longer than prometheus' default buckets
+SLOW_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time until the last byte of the response", ["method", "route"], buckets=SLOW_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served", ["method"], multiprocess_mode="livesum")
+
+OLLAMA_LATENCY = Histogram(
+    "ollama_request_duration_seconds", "Ollama call duration", ["endpoint", "model"], buckets=SLOW_BUCKETS
+)
+OLLAMA_TTFT = Histogram(
+    "ollama_time_to_first_token_seconds", "Time until the first streamed token", ["endpoint", "model"], buckets=SLOW_BUCKETS
+)
+OLLAMA_TOKENS_PER_SECOND = Histogram(
+    "ollama_tokens_per_second", "Generation speed reported by Ollama (eval_count / eval_duration)", ["model"],
+    buckets=(1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 120, 200),
+)
+OLLAMA_TOKENS = Counter("ollama_tokens_total", "Tokens processed by Ollama", ["model", "kind"])
+OLLAMA_ERRORS = Counter("ollama_errors_total", "Failed Ollama calls", ["endpoint", "model"])
+
+MONGO_LATENCY = Histogram(
+    "mongo_command_duration_seconds", "MongoDB command duration", ["command", "collection"], buckets=FAST_BUCKETS
+)
+MONGO_FAILURES = Counter("mongo_command_failures_total", "Failed MongoDB commands", ["command", "collection"])
+
+EXTRACTION_LATENCY = Histogram(
+    "extraction_duration_seconds", "Document text extraction time", ["extension", "outcome"], buckets=SLOW_BUCKETS
+)
+
+# Set from the components' own counters just before each scrape (see app/routes/metrics.py)
+QUEUE_DEPTH = Gauge("queue_depth", "Work waiting or running, by queue", ["queue", "state"], multiprocess_mode="livesum")
+CACHE_ENTRIES = Gauge("cache_entries", "Entries held by in-process caches", ["cache"], multiprocess_mode="livesum")
+CACHE_EVENTS = Gauge("cache_events", "Cache hits and misses since start", ["cache", "event"], multiprocess_mode="livesum")
+
+
+def observe_ollama_usage(model: str, data: dict):
+    """Token counts and speed from the final Ollama response (or last stream line)."""
+    if data.get("prompt_eval_count"):
+        OLLAMA_TOKENS.labels(model, "prompt").inc(data["prompt_eval_count"])
+    if data.get("eval_count"):
+        OLLAMA_TOKENS.labels(model, "generated").inc(data["eval_count"])
+        if data.get("eval_duration"):
+            # Durations are reported in nanoseconds
+            OLLAMA_TOKENS_PER_SECOND.labels(model).observe(data["eval_count"] / (data["eval_duration"] / 1e9))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the driver sends; runs on the driver's threads."""
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        # getMore names its collection separately; its own value is the cursor id
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _collection(self, event) -> str:
+        with self._lock:
+            return self._collections.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event):
+        MONGO_LATENCY.labels(event.command_name, self._collection(event)).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._collection(event)
+        MONGO_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+        MONGO_FAILURES.labels(event.command_name, collection).inc()
+
+
+def render() -> tuple:
+    """(body, content type) for /metrics; aggregates every worker when PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,353 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional, Set
+
+import httpx
+
+from app.admission import admission, BATCH
+from app.metrics import OLLAMA_ERRORS, OLLAMA_LATENCY, OLLAMA_TTFT, observe_ollama_usage
+from app.settings import settings
+from app.utils.response_cache import response_cache, replay_chunks
+
+logger = logging.getLogger(__name__)
+
+
+class NoBackendAvailable(httpx.RequestError):
+    """Every configured Ollama backend is down, open-circuited or lacks the model."""
+
+
+def _model_name(name: str) -> str:
+    # "llama3.2" and "llama3.2:latest" are the same model to Ollama
+    return name if ":" in name else f"{name}:latest"
+
+
+class Backend:
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True  # optimistic until the first health check
+        self.models: Optional[Set[str]] = None  # None until /api/tags answers
+        self.loaded: Set[str] = set()
+        self.failures = 0
+        self.open_until = 0.0
+
+    def available(self, now: float) -> bool:
+        # Once open_until passes the circuit is half-open: one request is let
+        # through and a single further failure opens it again
+        return self.healthy and self.open_until <= now
+
+    def has_model(self, model: str) -> bool:
+        return self.models is None or _model_name(model) in self.models
+
+    def record_success(self):
+        self.failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= settings.OLLAMA_CIRCUIT_FAILURES:
+            if self.open_until <= time.monotonic():
+                logger.warning("Opening circuit for Ollama backend %s after %s failures", self.url, self.failures)
+            self.open_until = time.monotonic() + settings.OLLAMA_CIRCUIT_RESET_SECONDS
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "circuit_open": self.open_until > time.monotonic(),
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+            "models": sorted(self.models) if self.models is not None else None,
+            "loaded": sorted(self.loaded),
+        }
+
+
+class BackendRouter:
+    """Least-outstanding-requests routing over the configured Ollama nodes."""
+
+    def __init__(self, urls: List[str]):
+        self.backends = [Backend(url) for url in urls]
+
+    def choose(self, model: str, exclude: Set[Backend] = frozenset()) -> Backend:
+        now = time.monotonic()
+        model = _model_name(model)
+        candidates = [
+            b for b in self.backends
+            if b not in exclude and b.available(now) and b.has_model(model)
+        ]
+        if not candidates:
+            raise NoBackendAvailable(f"No healthy Ollama backend has model {model}")
+        # Prefer idle nodes, then nodes that already have the model in memory
+        return min(candidates, key=lambda b: (b.outstanding, model not in b.loaded, random.random()))
+
+    async def check(self, client: httpx.AsyncClient):
+        async def probe(backend: Backend):
+            try:
+                response = await client.get(f"{backend.url}/api/tags", timeout=settings.OLLAMA_CONNECT_TIMEOUT)
+                response.raise_for_status()
+                backend.models = {_model_name(m["name"]) for m in response.json().get("models", [])}
+            except (httpx.HTTPError, ValueError) as e:
+                if backend.healthy:
+                    logger.warning("Ollama backend %s failed health check: %s", backend.url, e)
+                backend.healthy = False
+                return
+            if not backend.healthy:
+                logger.info("Ollama backend %s is healthy again", backend.url)
+            backend.healthy = True
+            try:
+                response = await client.get(f"{backend.url}/api/ps", timeout=settings.OLLAMA_CONNECT_TIMEOUT)
+                backend.loaded = {_model_name(m["name"]) for m in response.json().get("models", [])}
+            except (httpx.HTTPError, ValueError):
+                backend.loaded = set()
+
+        await asyncio.gather(*(probe(b) for b in self.backends))
+
+
+def _backend_urls() -> List[str]:
+    urls = [url.strip() for url in settings.OLLAMA_BACKENDS.split(",") if url.strip()]
+    return urls or [settings.OLLAMA_BASE_URL]
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, httpx.RequestError)
+
+
+class OllamaClient:
+    """One pooled, keep-alive HTTP client shared by every route that talks to Ollama.
+
+    Requests are spread over OLLAMA_BACKENDS by BackendRouter; non-streaming
+    calls that fail on one node are retried on another.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self.router = BackendRouter(_backend_urls())
+
+    def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OLLAMA_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=settings.OLLAMA_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(settings.OLLAMA_CHAT_TIMEOUT, connect=settings.OLLAMA_CONNECT_TIMEOUT),
+            )
+
+    def start_health_checks(self):
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.router.check(self.client)
+            except Exception:
+                logger.exception("Ollama health check failed")
+            await asyncio.sleep(settings.OLLAMA_HEALTH_INTERVAL)
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Lazily start so scripts that never run the FastAPI lifespan still work
+        if self._client is None:
+            self.start()
+        return self._client
+
+    def _timeout(self, timeout: float) -> httpx.Timeout:
+        return httpx.Timeout(timeout, connect=settings.OLLAMA_CONNECT_TIMEOUT)
+
+    @asynccontextmanager
+    async def _on(self, backend: Backend):
+        backend.outstanding += 1
+        try:
+            yield
+        finally:
+            backend.outstanding -= 1
+
+    async def _post(self, path: str, model: str, payload: dict, timeout: float) -> dict:
+        tried: Set[Backend] = set()
+        backend = self.router.choose(model)
+        started = time.perf_counter()
+        while True:
+            tried.add(backend)
+            try:
+                async with self._on(backend):
+                    response = await self.client.post(
+                        f"{backend.url}{path}", json=payload, timeout=self._timeout(timeout)
+                    )
+                    response.raise_for_status()
+                backend.record_success()
+                data = response.json()
+                OLLAMA_LATENCY.labels(path, model).observe(time.perf_counter() - started)
+                observe_ollama_usage(model, data)
+                return data
+            except httpx.HTTPError as e:
+                OLLAMA_ERRORS.labels(path, model).inc()
+                if not _retryable(e):
+                    raise
+                backend.record_failure()
+                if len(tried) > settings.OLLAMA_RETRIES:
+                    raise
+                try:
+                    failed, backend = backend, self.router.choose(model, exclude=tried)
+                except NoBackendAvailable:
+                    raise e
+                logger.warning("Ollama backend %s failed, retrying on %s: %s", failed.url, backend.url, e)
+
+    async def embed(self, texts: List[str], user: str = None, priority: int = BATCH) -> List[List[float]]:
+        model = settings.OLLAMA_EMBED_MODEL
+        async with admission.slot(model, user, priority):
+            data = await self._post(
+                "/api/embed", model, {"model": model, "input": texts}, settings.OLLAMA_EMBED_TIMEOUT
+            )
+        return data["embeddings"]
+
+    async def generate(
+        self,
+        prompt: str,
+        timeout: float,
+        model: str = None,
+        user: str = None,
+        priority: int = BATCH,
+        cache: bool = False,
+        semantic: bool = False,
+    ) -> dict:
+        model = model or settings.OLLAMA_MODEL
+        if cache:
+            lookup = await response_cache.get(model, prompt, {"api": "generate"}, semantic, self.embed)
+            if lookup.text is not None:
+                return {"model": model, "response": lookup.text, "done": True, "cached": True}
+
+        async with admission.slot(model, user, priority):
+            data = await self._post(
+                "/api/generate", model, {"model": model, "prompt": prompt, "stream": False}, timeout
+            )
+        if cache:
+            await response_cache.put(lookup, data.get("response", ""))
+        return data
+
+    async def stream_generate(
+        self,
+        prompt: str,
+        timeout: float,
+        model: str = None,
+        user: str = None,
+        priority: int = BATCH,
+        cache: bool = False,
+        semantic: bool = False,
+    ) -> AsyncIterator[str]:
+        model = model or settings.OLLAMA_MODEL
+        async for chunk in self._stream(
+            "/api/generate",
+            {"model": model, "prompt": prompt, "stream": True},
+            lambda data: data.get("response", ""),
+            prompt, {"api": "generate"}, timeout, user, priority, cache, semantic,
+        ):
+            yield chunk
+
+    async def stream_chat(
+        self,
+        messages: List[dict],
+        timeout: float,
+        model: str = None,
+        user: str = None,
+        priority: int = BATCH,
+        cache: bool = False,
+        semantic: bool = False,
+    ) -> AsyncIterator[str]:
+        """Stream an /api/chat answer to a list of {"role", "content"} messages."""
+        model = model or settings.OLLAMA_MODEL
+        # A lone question is cached (and embedded) by its text, a conversation by all of it
+        if len(messages) == 1:
+            key = messages[0]["content"]
+        else:
+            key = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+        async for chunk in self._stream(
+            "/api/chat",
+            {"model": model, "messages": messages, "stream": True},
+            lambda data: (data.get("message") or {}).get("content", ""),
+            key, {"api": "chat"}, timeout, user, priority, cache, semantic,
+        ):
+            yield chunk
+
+    async def _stream(
+        self,
+        path: str,
+        payload: dict,
+        piece_of: Callable[[dict], str],
+        cache_key: str,
+        cache_options: dict,
+        timeout: float,
+        user: Optional[str],
+        priority: int,
+        cache: bool,
+        semantic: bool,
+    ) -> AsyncIterator[str]:
+        model = payload["model"]
+        if cache:
+            lookup = await response_cache.get(model, cache_key, cache_options, semantic, self.embed)
+            if lookup.text is not None:
+                for piece in replay_chunks(lookup.text):
+                    yield piece
+                    await asyncio.sleep(0)
+                return
+
+        full_response, first = "", True
+        async with admission.slot(model, user, priority):
+            backend = self.router.choose(model)
+            # Timed from here so admission queueing is not counted as model latency
+            started = time.perf_counter()
+            try:
+                async with self._on(backend), self.client.stream(
+                    "POST",
+                    f"{backend.url}{path}",
+                    json=payload,
+                    timeout=self._timeout(timeout),
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        try:
+                            data = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        if data.get("done"):
+                            observe_ollama_usage(model, data)
+                        chunk = piece_of(data)
+                        if chunk and first:
+                            first = False
+                            OLLAMA_TTFT.labels(path, model).observe(time.perf_counter() - started)
+                        full_response += chunk
+                        yield chunk
+            except httpx.HTTPError as e:
+                OLLAMA_ERRORS.labels(path, model).inc()
+                # Streams are not retried: part of the answer may already be with the client
+                if _retryable(e):
+                    backend.record_failure()
+                raise
+            backend.record_success()
+            OLLAMA_LATENCY.labels(path, model).observe(time.perf_counter() - started)
+        if cache:
+            await response_cache.put(lookup, full_response)
+
+    def stats(self) -> dict:
+        return {"backends": [b.stats() for b in self.router.backends], "response_cache": response_cache.stats()}
+
+
+ollama = OllamaClient()
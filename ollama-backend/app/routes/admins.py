@@ -1,12 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Form
+from fastapi import APIRouter, Depends, HTTPException, Form, Query, Response
+from app.auth import auth_cache
 from app.dependencies import get_current_user
 from app.db import db
-from app.utils.password_handler import hash_password  # ✅ correct now!
+from app.indexes import index_report
+from app.utils.pagination import page
+from app.admission import admission
+from app.ollama_client import ollama
+from app.utils.password_handler import password_hasher
+import time
 
 router = APIRouter()
 
 @router.post("/create")
-def create_admin(
+async def create_admin(
     username: str = Form(...),
     password: str = Form(...),
     current_user: dict = Depends(get_current_user)
@@ -14,21 +20,28 @@ def create_admin(
     if current_user["role"] != "superadmin":
         raise HTTPException(status_code=403, detail="Only superadmin can create admins")
 
-    if db.admins.find_one({"username": username}):
+    if await db.admins.find_one({"username": username}):
         raise HTTPException(status_code=400, detail="Admin already exists")
 
-    db.admins.insert_one({
+    await db.admins.insert_one({
         "username": username,
-        "password": hash_password(password)
+        "password": await password_hasher.hash(password),
+        # Tokens of an earlier admin with the same name must not carry over
+        "tokens_valid_after": int(time.time())
     })
     return {"message": "Admin created"}
 
 @router.get("/list")
-def list_admins(current_user: dict = Depends(get_current_user)):
+async def list_admins(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str = Query(None),  # X-Next-Cursor of the previous page
+    current_user: dict = Depends(get_current_user)
+):
     if current_user["role"] != "superadmin":
         raise HTTPException(status_code=403, detail="Only superadmin can view admins")
 
-    admins = list(db.admins.find({}, {"password": 0}))  # hide passwords
+    admins = await page(db.admins, {}, "_id", {"password": 0}, limit, cursor, response)  # hide passwords
 
     # 🔥 Convert ObjectId to str manually
     for admin in admins:
@@ -37,24 +50,41 @@ def list_admins(current_user: dict = Depends(get_current_user)):
     return admins
 
 @router.post("/delete")
-def delete_admin(username: str = Form(...), current_user: dict = Depends(get_current_user)):
+async def delete_admin(username: str = Form(...), current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "superadmin":
         raise HTTPException(status_code=403, detail="Only superadmin can delete admins")
 
-    result = db.admins.delete_one({"username": username})
+    result = await db.admins.delete_one({"username": username})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Admin not found")
+    auth_cache.forget_user(username)
     return {"message": "Admin deleted"}
 
 @router.post("/update-password")
-def update_admin_password(username: str = Form(...), password: str = Form(...), current_user: dict = Depends(get_current_user)):
+async def update_admin_password(username: str = Form(...), password: str = Form(...), current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "superadmin":
         raise HTTPException(status_code=403, detail="Only superadmin can update admins")
 
-    result = db.admins.update_one(
+    result = await db.admins.update_one(
         {"username": username},
-        {"$set": {"password": hash_password(password)}}
+        {"$set": {"password": await password_hasher.hash(password)}}
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Admin not found")
+    # Sessions opened with the old password end here
+    await auth_cache.revoke_user(username)
     return {"message": "Admin password updated"}
+
+@router.get("/indexes")
+async def get_index_report(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "superadmin":
+        raise HTTPException(status_code=403, detail="Only superadmin can view index status")
+
+    return await index_report()
+
+@router.get("/ollama-stats")
+async def get_ollama_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "superadmin":
+        raise HTTPException(status_code=403, detail="Only superadmin can view Ollama stats")
+
+    return {"admission": admission.stats(), **ollama.stats()}
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
+from app.auth import auth_cache, login_throttle
 from app.db import db
+from app.dependencies import oauth2_scheme
 from app.utils.jwt_handler import create_access_token
-from app.utils.password_handler import verify_password
+from app.utils.password_handler import password_hasher
 from app.settings import settings
 
 router = APIRouter()
@@ -12,18 +14,34 @@ class LoginRequest(BaseModel):
     password: str
 
 @router.post("/login")
-async def login(request: LoginRequest):
+async def login(request: LoginRequest, http_request: Request):
     username = request.username
     password = request.password
+    ip = http_request.client.host if http_request.client else "unknown"
+    login_throttle.check(username, ip)
 
     if username == settings.SUPERADMIN_USERNAME and password == settings.SUPERADMIN_PASSWORD:
+        login_throttle.succeeded(username)
         return {"token": create_access_token(username, role="superadmin")}
     
-    admin = db.admins.find_one({"username": username})
+    admin = await db.admins.find_one({"username": username})
     if not admin:
+        login_throttle.failed(username, ip)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not verify_password(password, admin["password"]):
+    valid, new_hash = await password_hasher.verify(password, admin["password"])
+    if not valid:
+        login_throttle.failed(username, ip)
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    
+
+    if new_hash:
+        # BCRYPT_ROUNDS changed; skipped if the password was changed meanwhile
+        await db.admins.update_one({"_id": admin["_id"], "password": admin["password"]}, {"$set": {"password": new_hash}})
+
+    login_throttle.succeeded(username)
     return {"token": create_access_token(username, role="admin")}
+
+@router.post("/logout")
+async def logout(token: str = Depends(oauth2_scheme)):
+    await auth_cache.revoke_token(token)
+    return {"message": "Logged out"}
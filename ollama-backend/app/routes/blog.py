@@ -1,43 +1,112 @@
+import asyncio
 import httpx
-from bs4 import BeautifulSoup
+from datetime import datetime
+from typing import List
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.db import db
+from app.auth import owner
 from app.dependencies import get_current_user
+from app.admission import AdmissionRejected, BATCH
+from app.ollama_client import ollama
+from app.settings import settings
+from app.utils.web import web_fetcher, FetchError
 from pydantic import BaseModel
 
 router = APIRouter()
 
 class BlogRequest(BaseModel):
     url: str
+    stream: bool = False
 
-@router.post("/scrape")
-async def scrape_and_summarize(req: BlogRequest, user: str = Depends(get_current_user)):
+class BlogBatchRequest(BaseModel):
+    urls: List[str]
+
+
+async def blog_prompt(url: str) -> str:
     try:
-        # Fetch and parse the blog content
-        response = httpx.get(req.url, timeout=15)
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        # Extract and trim paragraph content
-        article_text = " ".join(p.get_text() for p in soup.find_all("p"))[:3000]
-        if not article_text.strip():
-            raise HTTPException(status_code=422, detail="No meaningful content found in blog.")
-    except Exception as e:
+        # Fetch the page and keep only the article itself
+        article = await web_fetcher.fetch(url)
+    except FetchError as e:
         raise HTTPException(status_code=400, detail=f"Failed to scrape blog: {str(e)}")
 
+    article_text = article.text[:settings.BLOG_MAX_CHARS]
+    if not article_text.strip():
+        raise HTTPException(status_code=422, detail="No meaningful content found in blog.")
+    title = f"Title: {article.title}\n\n" if article.title else ""
+    return f"Summarize this blog post:\n\n{title}{article_text}"
+
+
+async def save_summary(user: dict, url: str, summary: str):
+    await db.blog_summaries.insert_one({
+        "user": owner(user),
+        "source": url,
+        "summary": summary,
+        "processed_by": settings.OLLAMA_MODEL,
+        "created_at": datetime.utcnow()
+    })
+
+
+@router.post("/scrape")
+async def scrape_and_summarize(req: BlogRequest, user: str = Depends(get_current_user)):
+    prompt = await blog_prompt(req.url)
+
+    if req.stream:
+        async def tokens():
+            summary = ""
+            try:
+                async for chunk in ollama.stream_generate(
+                    prompt, timeout=settings.OLLAMA_BLOG_TIMEOUT, user=user["username"], cache=True
+                ):
+                    summary += chunk
+                    yield chunk
+            except (httpx.HTTPError, AdmissionRejected) as e:
+                yield f"\n[Error contacting LLaMA]: {str(e)}\n"
+                return
+            await save_summary(user, req.url, summary)
+
+        return StreamingResponse(tokens(), media_type="text/plain")
+
     try:
         # Call Ollama to summarize
-        async with httpx.AsyncClient(timeout=60) as client:
-            res = await client.post(
-                "http://localhost:11434/api/generate",
-                json={
-                    "model": "llama3.2",
-                    "prompt": f"Summarize this blog post:\n\n{article_text}",
-                    "stream": False
-                }
-            )
-            data = res.json()
-            return {
-                "summary": data.get("response", "No response from LLaMA"),
-                "source": req.url
-            }
-    except httpx.RequestError as e:
+        data = await ollama.generate(
+            prompt, timeout=settings.OLLAMA_BLOG_TIMEOUT, user=user["username"], cache=True
+        )
+    except httpx.HTTPError as e:
         raise HTTPException(status_code=504, detail=f"LLaMA request failed: {str(e)}")
+
+    summary = data.get("response", "No response from LLaMA")
+    await save_summary(user, req.url, summary)
+    return {
+        "summary": summary,
+        "source": req.url
+    }
+
+
+@router.post("/scrape/batch")
+async def scrape_and_summarize_batch(req: BlogBatchRequest, user: str = Depends(get_current_user)):
+    """Summarize several posts at once; each result has either "summary" or "error"."""
+    urls = list(dict.fromkeys(req.urls))
+    if not urls:
+        raise HTTPException(status_code=400, detail="No URLs given")
+    if len(urls) > settings.BLOG_BATCH_MAX_URLS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BLOG_BATCH_MAX_URLS} URLs per batch")
+
+    semaphore = asyncio.Semaphore(settings.BLOG_BATCH_CONCURRENCY)
+
+    async def summarize(url: str) -> dict:
+        async with semaphore:
+            try:
+                prompt = await blog_prompt(url)
+                data = await ollama.generate(
+                    prompt, timeout=settings.OLLAMA_BLOG_TIMEOUT, user=user["username"], priority=BATCH, cache=True
+                )
+            except HTTPException as e:
+                return {"source": url, "error": e.detail}
+            except (httpx.HTTPError, AdmissionRejected) as e:
+                return {"source": url, "error": f"LLaMA request failed: {str(e)}"}
+        summary = data.get("response", "No response from LLaMA")
+        await save_summary(user, url, summary)
+        return {"source": url, "summary": summary}
+
+    return await asyncio.gather(*(summarize(url) for url in urls))
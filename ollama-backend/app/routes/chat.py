@@ -1,110 +1,114 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
 import httpx
-import asyncio
-import json
+from typing import Optional
+from uuid import uuid4
 from datetime import datetime
 
 from app.dependencies import get_current_user
 from app.db import db
+from app.admission import admission, AdmissionRejected
+from app.settings import settings
+from app.utils.chat import stream_answer
+from app.utils.pagination import page, json_export
 
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     message: str
+    # Conversation session: the model sees its earlier turns, and file search
+    # covers this chat's files instead of all the user's files
+    chat_id: Optional[str] = None
+    use_files: bool = True
 
 @router.post("/", response_class=StreamingResponse)
 async def chat(req: ChatRequest, current_user: dict = Depends(get_current_user)):
     username = current_user["username"]
     role = current_user["role"]
-    
-    async def generate():
-        full_response = ""
 
+    # Fail fast with 429/503 before the stream starts if the model queue is full
+    admission.check(settings.OLLAMA_MODEL, username)
+
+    async def generate():
         try:
-            async with httpx.AsyncClient(timeout=60) as client:
-                async with client.stream(
-                    "POST",
-                    "http://localhost:11434/api/generate",
-                    json={
-                        "model": "llama3.2",
-                        "prompt": req.message,
-                        "stream": True,
-                    },
-                ) as response:
-                    async for line in response.aiter_lines():
-                        if line.strip():
-                            try:
-                                data = json.loads(line)
-                                chunk = data.get("response", "")
-                                full_response += chunk
-                                yield chunk
-                                await asyncio.sleep(0)
-                            except json.JSONDecodeError:
-                                continue
-        except httpx.HTTPError as e:
+            async for chunk in stream_answer(current_user, req.message, req.chat_id, req.use_files):
+                yield chunk
+        except (httpx.HTTPError, AdmissionRejected) as e:
             yield f"\n[Error contacting LLaMA]: {str(e)}\n"
 
-        # ✅ Save chat in MongoDB with username + role
-        db.chats.insert_one({
-            "username": username,
-            "role": role,
-            "question": req.message,
-            "answer": full_response,
-            "timestamp": datetime.utcnow()
-        })
-
     return StreamingResponse(generate(), media_type="text/plain")
 
 
-@router.get("/history")
-def get_chat_history(
-    limit: int = Query(10),
-    username: str = Query(None),  # 🔥 Only superadmin can use this
-    current_user: dict = Depends(get_current_user)
-):
-    user_username = current_user["username"]
-    user_role = current_user["role"]
+@router.post("/sessions")
+async def create_session(current_user: dict = Depends(get_current_user)):
+    chat_id = uuid4().hex
+    now = datetime.utcnow()
+    await db.chat_sessions.insert_one({
+        "username": current_user["username"],
+        "chat_id": chat_id,
+        "title": "",
+        "turns": 0,
+        "created_at": now,
+        "updated_at": now,
+    })
+    return {"chat_id": chat_id}
+
 
+@router.get("/sessions")
+async def list_sessions(limit: int = Query(20, ge=1, le=100), current_user: dict = Depends(get_current_user)):
+    sessions = await db.chat_sessions.find(
+        {"username": current_user["username"]},
+        {"_id": 0, "chat_id": 1, "title": 1, "turns": 1, "created_at": 1, "updated_at": 1},
+    ).sort("updated_at", -1).limit(limit).to_list(length=limit)
+    return sessions
+
+
+def _history_query(current_user: dict, username: Optional[str], chat_id: Optional[str]) -> dict:
     query = {}
 
-    if user_role == "superadmin":
+    if current_user["role"] == "superadmin":
         if username:
             query["username"] = username  # 🔥 View specific admin's chat
     else:
-        query["username"] = user_username  # Normal admins can only see their own chats
-
-    history = db.chats.find(query).sort("timestamp", -1).limit(limit)
-
-    return [
-        {
-            "question": chat["question"],
-            "answer": chat["answer"],
-            "timestamp": chat["timestamp"]
-        }
-        for chat in history
-    ]
-    
-@router.get("/files/summary-history")
-def get_summary_history(current_user: dict = Depends(get_current_user)):
-    summaries = list(db.file_summaries.find({"admin_id": current_user["_id"]}))
-    for s in summaries:
-        s["_id"] = str(s["_id"])
-        s["admin_id"] = str(s["admin_id"])
-    return summaries
-
-@router.get("/chat/history")
-def get_chat_history(username: str = None, current_user: dict = Depends(get_current_user)):
-    query = {}
-    if current_user["role"] != "superadmin":
-        query["admin_id"] = current_user["_id"]
-    elif username:
-        user = db.admins.find_one({"username": username})
-        if user:
-            query["admin_id"] = user["_id"]
-    chats = list(db.chat_history.find(query))
-    for chat in chats:
-        chat["_id"] = str(chat["_id"])
-        chat["admin_id"] = str(chat["admin_id"])
-    return chats
+        query["username"] = current_user["username"]  # Normal admins can only see their own chats
+    if chat_id:
+        query["chat_id"] = chat_id
+    return query
+
+
+def _history_item(chat: dict) -> dict:
+    item = {"question": chat["question"], "timestamp": chat["timestamp"]}
+    if "answer" in chat:
+        item["answer"] = chat["answer"]
+    return item
+
+
+@router.get("/history")
+async def get_chat_history(
+    response: Response,
+    limit: int = Query(10, ge=1, le=500),
+    cursor: str = Query(None),  # X-Next-Cursor of the previous page
+    include_text: bool = Query(True),  # False leaves out answers, for list views
+    username: str = Query(None),  # 🔥 Only superadmin can use this
+    chat_id: str = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    projection = {"question": 1, "timestamp": 1}
+    if include_text:
+        projection["answer"] = 1
+    history = await page(
+        db.chats, _history_query(current_user, username, chat_id), "timestamp", projection, limit, cursor, response
+    )
+    return [_history_item(chat) for chat in history]
+
+
+@router.get("/history/export")
+async def export_chat_history(
+    username: str = Query(None),
+    chat_id: str = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    query = _history_query(current_user, username, chat_id)
+    cursor = db.chats.find(query, {"question": 1, "answer": 1, "timestamp": 1}).sort([("timestamp", -1), ("_id", -1)])
+    return json_export(cursor, _history_item, "chat-history.json")
@@ -1,9 +1,11 @@
 # routes/dashboard.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel
 from app.db import db
+from app.auth import owner
 from app.dependencies import get_current_user
+from app.utils.pagination import page
 from datetime import datetime
 from bson import ObjectId
 from bson.errors import InvalidId
@@ -17,44 +19,56 @@ class DashboardEntryIn(BaseModel):
     subobject_id: str = None
 
 @router.post("/")
-def create_entry(entry: DashboardEntryIn, user: str = Depends(get_current_user)):
+async def create_entry(entry: DashboardEntryIn, user: str = Depends(get_current_user)):
     # Optional: validate ObjectId
     subject_id = ObjectId(entry.subject_id) if entry.subject_id else None
     subobject_id = ObjectId(entry.subobject_id) if entry.subobject_id else None
 
-    result = db.dashboard.insert_one({
+    result = await db.dashboard.insert_one({
         "title": entry.title,
         "content": entry.content,
         "subject_id": subject_id,
         "subobject_id": subobject_id,
-        "created_by": user,
+        "created_by": owner(user),
         "created_at": datetime.utcnow()
     })
     return {"message": "Entry created", "id": str(result.inserted_id)}
 
 @router.get("/")
-def list_entries(user: str = Depends(get_current_user)):
-    entries = db.dashboard.find({"created_by": user}).sort("created_at", -1)
-    return [
-        {
+async def list_entries(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str = Query(None),  # X-Next-Cursor of the previous page
+    include_text: bool = Query(True),  # False leaves out entry content, for list views
+    user: str = Depends(get_current_user)
+):
+    projection = {"title": 1, "subject_id": 1, "subobject_id": 1, "created_at": 1}
+    if include_text:
+        projection["content"] = 1
+    entries = await page(db.dashboard, {"created_by": owner(user)}, "created_at", projection, limit, cursor, response)
+    items = []
+    for e in entries:
+        item = {
             "id": str(e["_id"]),
             "title": e["title"],
-            "content": e["content"],
             "subject_id": str(e.get("subject_id", "")),
             "subobject_id": str(e.get("subobject_id", "")),
             "created_at": e["created_at"]
         }
-        for e in entries
-    ]
+        if include_text:
+            item["content"] = e["content"]
+        items.append(item)
+    return items
+
 @router.put("/{entry_id}")
-def update_entry(entry_id: str, entry: DashboardEntryIn, user: str = Depends(get_current_user)):
+async def update_entry(entry_id: str, entry: DashboardEntryIn, user: str = Depends(get_current_user)):
     try:
         entry_obj_id = ObjectId(entry_id)
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid entry ID")
 
-    update_result = db.dashboard.update_one(
-        {"_id": entry_obj_id, "created_by": user},
+    update_result = await db.dashboard.update_one(
+        {"_id": entry_obj_id, "created_by": owner(user)},
         {"$set": {
             "title": entry.title,
             "content": entry.content,
@@ -68,13 +82,13 @@ def update_entry(entry_id: str, entry: DashboardEntryIn, user: str = Depends(get
     return {"message": "Entry updated"}
 
 @router.delete("/{entry_id}")
-def delete_entry(entry_id: str, user: str = Depends(get_current_user)):
+async def delete_entry(entry_id: str, user: str = Depends(get_current_user)):
     try:
         entry_obj_id = ObjectId(entry_id)
     except InvalidId:
         raise HTTPException(status_code=400, detail="Invalid entry ID")
 
-    result = db.dashboard.delete_one({"_id": entry_obj_id, "created_by": user})
+    result = await db.dashboard.delete_one({"_id": entry_obj_id, "created_by": owner(user)})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Entry not found")
 
@@ -82,13 +96,13 @@ def delete_entry(entry_id: str, user: str = Depends(get_current_user)):
 
 
 @router.post("/{entry_id}/attach-file")
-def attach_file(entry_id: str, filename: str, user: str = Depends(get_current_user)):
-    file = db.files.find_one({"stored_filename": filename, "user": user})
+async def attach_file(entry_id: str, filename: str, user: str = Depends(get_current_user)):
+    file = await db.files.find_one({"stored_filename": filename, "user": owner(user)})
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
 
-    db.dashboard.update_one(
-        {"_id": ObjectId(entry_id), "created_by": user},
+    await db.dashboard.update_one(
+        {"_id": ObjectId(entry_id), "created_by": owner(user)},
         {"$addToSet": {"file_ids": file["stored_filename"]}}
     )
     return {"message": "File linked to dashboard"}
@@ -1,117 +1,240 @@
-from fastapi  import APIRouter, UploadFile, File, Depends, Form, HTTPException
+from fastapi  import APIRouter, UploadFile, File, Depends, Form, HTTPException, Query, Request, Response
 from app.db import db
+from app.auth import owner
 from app.dependencies import get_current_user
-from datetime import datetime
-import os
-import shutil
+from app.admission import AdmissionRejected, INTERACTIVE
+from app.ollama_client import ollama
+from app.settings import settings
+from app.utils.text_cache import text_cache, file_sha256, get_file_text
+from app.utils.summarize import summarize_document, save_summary
+from app.utils.translate import translation_prompt, save_translation
+from app.utils.intent import intent_engine, llm_intent_prompt, parse_llm_intent
+from app.utils.rag import vector_store, chat_scope, user_scope
+from app.utils.pagination import page, json_export
+from app.utils.storage import remove_quietly, temp_path
+from app.utils.uploads import (
+    CHUNK_SIZE, copy_and_hash, file_size, max_upload_bytes, partial_path, read_file, release_upload,
+    store_upload, too_large,
+)
+from app.jobs import job_manager
+from fastapi.responses import StreamingResponse
+from starlette.requests import ClientDisconnect
+from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+import mimetypes
+import time
+from urllib.parse import quote
 from uuid import uuid4
-import pandas as pd
 import httpx
-from pdfminer.high_level import extract_text as extract_pdf_text
-from docx import Document
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
 
-UPLOAD_DIR = "uploaded_files"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+router = APIRouter()
 
+async def _uploaded(user: dict, file_doc: dict) -> dict:
+    # Embed the document in the background so chats can retrieve from it
+    if settings.RAG_ENABLED and settings.RAG_AUTO_INGEST:
+        await job_manager.submit(user, "ingest", {"filename": file_doc["stored_filename"]})
+    return {"message": "File uploaded", "filename": file_doc["stored_filename"], "deduplicated": file_doc["deduplicated"]}
 
 
+@router.post("/upload")
+async def upload_file(
+    file: UploadFile = File(...),
+    chat_id: str = Form(None),
+    user: str = Depends(get_current_user)
+):
+    # Copy to disk in chunks while hashing, then link into content-addressed storage
+    staged = temp_path()
+    try:
+        sha256, size = await asyncio.to_thread(copy_and_hash, file.file, staged)
+    except BaseException:
+        remove_quietly(staged)
+        raise
 
+    file_doc = await store_upload(user, file.filename, staged, sha256, size, chat_id)
+    return await _uploaded(user, file_doc)
 
 
-def extract_text_from_file(file_path: str) -> str:
-    _, ext = os.path.splitext(file_path)
-    ext = ext.lower()
+# ✅ Resumable uploads: create a session, PUT the bytes in pieces, then complete
+async def _get_session(upload_id: str, user: dict) -> dict:
+    session = await db.upload_sessions.find_one({"_id": upload_id, "username": user["username"]})
+    if not session or session["expires_at"] < datetime.utcnow():
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
 
-    if ext == ".txt":
-        with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
 
-    elif ext == ".docx":
-        try:
-            doc = Document(file_path)
-            return "\n".join([p.text for p in doc.paragraphs])
-        except Exception as e:
-            raise ValueError("Failed to read DOCX file: " + str(e))
+def _session_view(session: dict) -> dict:
+    return {"upload_id": session["_id"], "offset": session["received"], "size": session["size"]}
 
-    elif ext == ".pdf":
-        try:
-            # Try reading PDF via PyMuPDF (better for scanned PDFs)
-            doc = fitz.open(file_path)
-            return "\n".join([page.get_text() for page in doc])
-        except Exception:
-            # Fallback to pdfminer if needed
-            try:
-                return extract_pdf_text(file_path)
-            except Exception as e:
-                raise ValueError("Failed to read PDF file: " + str(e))
 
-    elif ext == ".xlsx":
-        try:
-            df = pd.read_excel(file_path, engine="openpyxl")
-            return df.to_string(index=False)
-        except Exception as e:
-            raise ValueError("Failed to read Excel file: " + str(e))
+@router.post("/uploads")
+async def create_upload_session(
+    filename: str = Form(...),
+    size: int = Form(..., ge=0),
+    chat_id: str = Form(None),
+    user: dict = Depends(get_current_user)
+):
+    if size > max_upload_bytes():
+        raise too_large()
+
+    now = datetime.utcnow()
+    session = {
+        "_id": uuid4().hex,
+        "user": owner(user),
+        "username": user["username"],
+        "filename": filename,
+        "size": size,
+        "chat_id": chat_id,
+        "received": 0,
+        "created_at": now,
+        "expires_at": now + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS),
+    }
+    open(partial_path(session["_id"]), "wb").close()
+    await db.upload_sessions.insert_one(session)
+    return {**_session_view(session), "chunk_size": settings.UPLOAD_CHUNK_MB * 1024 * 1024}
 
-    elif ext in [".png", ".jpg", ".jpeg"]:
-        try:
-            return pytesseract.image_to_string(Image.open(file_path))
-        except Exception as e:
-            raise ValueError("Failed OCR image reading: " + str(e))
 
-    else:
-        raise ValueError(f"Unsupported file type: {ext}")
+@router.get("/uploads/{upload_id}")
+async def get_upload_session(upload_id: str, user: dict = Depends(get_current_user)):
+    return _session_view(await _get_session(upload_id, user))
 
 
-@router.post("/upload")
-async def upload_file(
-    file: UploadFile = File(...),
-    chat_id: str = Form(None),
-    user: str = Depends(get_current_user)
+@router.put("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    user: dict = Depends(get_current_user)
 ):
-    # Save file to disk
-    file_id = str(uuid4())
-    filename = f"{file_id}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Save to MongoDB
-    db.files.insert_one({
-        "user": user,
-        "original_filename": file.filename,
-        "stored_filename": filename,
-        "file_path": file_path,
-        "chat_id": chat_id,
-        "uploaded_at": datetime.utcnow(),
-    })
+    session = await _get_session(upload_id, user)
+    if offset != session["received"]:
+        raise HTTPException(status_code=409, detail={"message": "Offset mismatch", "offset": session["received"]})
+
+    # Claim the offset first, so a second PUT at the same offset cannot interleave
+    # its bytes with ours; the claim is a lease in case this worker dies mid-chunk
+    def lease() -> datetime:
+        return datetime.utcnow() + timedelta(seconds=settings.UPLOAD_WRITE_LEASE_SECONDS)
+
+    writer = uuid4().hex
+    claimed = await db.upload_sessions.update_one(
+        {"_id": upload_id, "received": offset, "writing_until": {"$not": {"$gt": datetime.utcnow()}}},
+        {"$set": {"writer": writer, "writing_until": lease()}},
+    )
+    if not claimed.modified_count:
+        raise HTTPException(status_code=409, detail="Another request is writing to this upload")
+    owned = {"_id": upload_id, "writer": writer}
+
+    path = partial_path(upload_id)
+    written = 0
+    renew_at = time.monotonic() + settings.UPLOAD_WRITE_LEASE_SECONDS / 2
+
+    def write(data: bytes, at: int):
+        with open(path, "r+b") as f:
+            f.seek(at)
+            f.truncate()
+            f.write(data)
+
+    async def renew():
+        if not (await db.upload_sessions.update_one(owned, {"$set": {"writing_until": lease()}})).matched_count:
+            raise HTTPException(status_code=409, detail="Upload session was modified concurrently")
+
+    async def commit():
+        result = await db.upload_sessions.update_one(
+            owned,
+            {
+                "$set": {"received": offset + written, "expires_at": datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)},
+                "$unset": {"writer": "", "writing_until": ""},
+            },
+        )
+        return result.modified_count
 
-    return {"message": "File uploaded", "filename": filename}
+    buffer = bytearray()
+    try:
+        async for data in request.stream():
+            if offset + written + len(buffer) + len(data) > session["size"]:
+                raise HTTPException(status_code=413, detail="Chunk goes past the declared upload size")
+            buffer += data
+            if len(buffer) >= CHUNK_SIZE:
+                await asyncio.to_thread(write, bytes(buffer), offset + written)
+                written += len(buffer)
+                buffer.clear()
+            if time.monotonic() >= renew_at:
+                await renew()
+                renew_at = time.monotonic() + settings.UPLOAD_WRITE_LEASE_SECONDS / 2
+        if buffer:
+            await asyncio.to_thread(write, bytes(buffer), offset + written)
+            written += len(buffer)
+    except ClientDisconnect:
+        # Keep whatever reached the disk so the client resumes from there
+        await commit()
+        raise
+    except BaseException:
+        await db.upload_sessions.update_one(owned, {"$unset": {"writer": "", "writing_until": ""}})
+        raise
+
+    if not await commit():
+        raise HTTPException(status_code=409, detail="Upload session was modified concurrently")
+    return _session_view({**session, "received": offset + written})
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, user: dict = Depends(get_current_user)):
+    session = await _get_session(upload_id, user)
+    if session["received"] != session["size"]:
+        raise HTTPException(status_code=409, detail={"message": "Upload is incomplete", "offset": session["received"]})
+    # Claim the session so a concurrent or retried complete cannot store the file twice
+    claimed = await db.upload_sessions.update_one(
+        {"_id": upload_id, "received": session["size"], "completing": {"$exists": False}},
+        {"$set": {"completing": datetime.utcnow()}},
+    )
+    if not claimed.modified_count:
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+
+    staged = partial_path(upload_id)
+    try:
+        sha256 = await asyncio.to_thread(file_sha256, staged)
+        file_doc = await store_upload(session["user"], session["filename"], staged, sha256, session["size"], session["chat_id"])
+    except BaseException:
+        # Keep the session and its bytes so the client can complete again
+        await db.upload_sessions.update_one({"_id": upload_id}, {"$unset": {"completing": ""}})
+        raise
+    # Only now is the file safely in storage and db.files
+    await db.upload_sessions.delete_one({"_id": upload_id})
+    return await _uploaded(user, file_doc)
+
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str, user: dict = Depends(get_current_user)):
+    session = await _get_session(upload_id, user)
+    await db.upload_sessions.delete_one({"_id": session["_id"]})
+    remove_quietly(partial_path(upload_id))
+    return {"message": "Upload aborted"}
 
 
 @router.get("/list")
-def list_user_files(
+async def list_user_files(
+    response: Response,
     chat_id: str = None,
     username: str = None,  # ✅ optional for superadmin
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str = Query(None),  # X-Next-Cursor of the previous page
     user: dict = Depends(get_current_user)
 ):
     query = {}
 
     if user.get("role") != "superadmin":
-        query["user"] = user["_id"]
+        query["user"] = owner(user)
     elif username:
-        # ✅ Lookup the user's ObjectId by username
-        target_user = db.admins.find_one({"username": username})
-        if not target_user:
-            return []
-        query["user"] = target_user["_id"]
+        query["user.username"] = username
 
     if chat_id:
         query["chat_id"] = chat_id
 
-    files = db.files.find(query).sort("uploaded_at", -1)
+    projection = {"original_filename": 1, "stored_filename": 1, "uploaded_at": 1, "chat_id": 1}
+    files = await page(db.files, query, "uploaded_at", projection, limit, cursor, response)
     return [
         {
             "filename": f["original_filename"],
@@ -122,130 +245,260 @@ def list_user_files(
         for f in files
     ]
 
+@router.delete("/{filename}")
+async def delete_file(filename: str, user: str = Depends(get_current_user)):
+    file_doc = await db.files.find_one({"user": owner(user), "stored_filename": filename})
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    # Drop the blob and cached text once no other upload shares the same content
+    if await release_upload(file_doc) and file_doc.get("sha256"):
+        await text_cache.invalidate(file_doc["sha256"])
+    await vector_store.remove(file_doc)
+
+    return {"message": "File deleted"}
+
+
+def _byte_range(header: str, size: int):
+    # Only single ranges ("bytes=0-99", "bytes=100-", "bytes=-500"); anything else gets the whole file
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start, end = int(first), int(last) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, detail="Requested range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+
+@router.get("/{filename}/download")
+async def download_file(filename: str, request: Request, user: dict = Depends(get_current_user)):
+    file_doc = await db.files.find_one({"user": owner(user), "stored_filename": filename})
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+    size = await file_size(file_doc)
+    if size is None:
+        raise HTTPException(status_code=404, detail="File content is missing")
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(file_doc['original_filename'])}",
+    }
+    media_type = mimetypes.guess_type(file_doc["original_filename"])[0] or "application/octet-stream"
+    byte_range = _byte_range(request.headers.get("range"), size)
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(read_file(file_doc), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(read_file(file_doc, start, end), status_code=206, media_type=media_type, headers=headers)
+
+
+@router.get("/search")
+async def search_files(
+    q: str,
+    chat_id: str = None,
+    k: int = Query(None, ge=1, le=20),
+    user: dict = Depends(get_current_user)
+):
+    scope = chat_scope(user["username"], chat_id) if chat_id else user_scope(user["username"])
+    passages = await vector_store.search(scope, q, user["username"], k)
+    return [
+        {
+            "filename": p.filename,
+            "original_filename": p.original_filename,
+            "chunk": p.chunk,
+            "score": round(p.score, 4),
+            "text": p.text,
+        }
+        for p in passages
+    ]
+
 @router.post("/process")
 async def process_file(
     filename: str = Form(...),
+    progress: bool = Form(False),
+    stream: bool = Form(False),
     user: str = Depends(get_current_user)
 ):
     from fastapi import Request
-    import traceback
-
-    file_doc = db.files.find_one({"user": user, "stored_filename": filename})
+    file_doc = await db.files.find_one({"user": owner(user), "stored_filename": filename})
     if not file_doc:
         raise HTTPException(status_code=404, detail="File not found")
 
     # Step 2: Extract content
     try:
-        content = extract_text_from_file(file_doc["file_path"])
+        content = await get_file_text(file_doc)
         if not content.strip():
             raise HTTPException(status_code=400, detail="Extracted content is empty.")
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to extract file content")
 
-    # Step 3: Prepare LLaMA prompt
-    prompt = f"Please summarize the following document:\n\n{content[:3000]}"
+    # Step 3: Map-reduce summary, optionally streaming progress as NDJSON
+    if progress:
+        async def events():
+            try:
+                async for event in summarize_document(content, user, file_doc):
+                    if event["event"] == "summary":
+                        await save_summary(user, file_doc, event["summary"], event["chunks"])
+                        event.update(
+                            original_filename=file_doc["original_filename"],
+                            processed_by=settings.OLLAMA_MODEL,
+                        )
+                    yield json.dumps(event) + "\n"
+            except (httpx.HTTPError, AdmissionRejected) as e:
+                yield json.dumps({"event": "error", "detail": f"Ollama error: {str(e)}"}) + "\n"
+
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    # Plain-text streaming of the final summary, like /api/chat/
+    if stream:
+        async def tokens():
+            try:
+                async for event in summarize_document(content, user, file_doc, stream=True):
+                    if event["event"] == "token":
+                        yield event["text"]
+                    elif event["event"] == "summary":
+                        await save_summary(user, file_doc, event["summary"], event["chunks"])
+            except (httpx.HTTPError, AdmissionRejected) as e:
+                yield f"\n[Error contacting LLaMA]: {str(e)}\n"
+
+        return StreamingResponse(tokens(), media_type="text/plain")
 
     # Step 4: Call Ollama with full error logging
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            response = await client.post(
-                "http://localhost:11434/api/generate",
-                json={"model": "llama3.2", "prompt": prompt, "stream": False}
-            )
-            response.raise_for_status()  # ensures 4xx/5xx are caught
-            data = response.json()
-            print("🟢 Ollama responded:", data)
-            summary = data.get("response", "No response content from Ollama")
+        async for event in summarize_document(content, user, file_doc):
+            if event["event"] == "summary":
+                summary = event["summary"] or "No response content from Ollama"
+                chunks = event["chunks"]
+
+    except AdmissionRejected:
+        raise
 
     except httpx.HTTPStatusError as e:
-        print("❌ HTTP error from Ollama:", e.response.status_code, e.response.text)
+        logger.error("Ollama returned %s while summarizing %s: %s", e.response.status_code, filename, e.response.text)
         raise HTTPException(status_code=500, detail=f"Ollama returned {e.response.status_code}: {e.response.text}")
 
     except httpx.RequestError as e:
-        print("❌ Request error contacting Ollama:", e)
+        logger.error("Could not reach Ollama while summarizing %s: %s", filename, e)
         raise HTTPException(status_code=500, detail=f"Ollama connection error: {str(e)}")
 
     except Exception as e:
-        print("🔥 Unexpected error:", traceback.format_exc())
+        logger.exception("Summarizing %s failed", filename)
         raise HTTPException(status_code=500, detail=f"Ollama failed: {str(e)}")
 
-        # Step 6: Save summary to MongoDB
-    db.file_summaries.insert_one({
-    "user": user,
-    "filename": file_doc["stored_filename"],
-    "original_filename": file_doc["original_filename"],
-    "summary": summary,
-    "processed_by": "llama3.2",
-    "created_at": datetime.utcnow()
-})
+    # Step 5: Save summary to MongoDB
+    await save_summary(user, file_doc, summary, chunks)
 
     return {
         "summary": summary,
         "original_filename": file_doc["original_filename"],
-        "processed_by": "llama3.2"
+        "processed_by": settings.OLLAMA_MODEL
     }
     
+def _summary_item(r: dict) -> dict:
+    item = {
+        "original_filename": r.get("original_filename"),
+        "processed_by": r.get("processed_by"),
+        "created_at": r.get("created_at")
+    }
+    if "summary" in r:
+        item["summary"] = r["summary"]
+    return item
+
+
 @router.get("/summary-history")
-def get_summary_history(
+async def get_summary_history(
+    response: Response,
     user: str = Depends(get_current_user),
-    filename: str = None  # Optional filter
+    filename: str = None,  # Optional filter
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str = Query(None),  # X-Next-Cursor of the previous page
+    include_text: bool = Query(True),  # False leaves out the summaries, for list views
 ):
-    query = {"user": user}
+    query = {"user": owner(user), "partial": {"$ne": True}}
     if filename:
         query["filename"] = filename
 
-    records = db.file_summaries.find(query).sort("created_at", -1)
+    projection = {"original_filename": 1, "processed_by": 1, "created_at": 1}
+    if include_text:
+        projection["summary"] = 1
+    records = await page(db.file_summaries, query, "created_at", projection, limit, cursor, response)
+    return [_summary_item(r) for r in records]
+
+
+@router.get("/summary-history/export")
+async def export_summary_history(user: str = Depends(get_current_user), filename: str = None):
+    query = {"user": owner(user), "partial": {"$ne": True}}
+    if filename:
+        query["filename"] = filename
+    cursor = db.file_summaries.find(
+        query, {"original_filename": 1, "summary": 1, "processed_by": 1, "created_at": 1}
+    ).sort([("created_at", -1), ("_id", -1)])
+    return json_export(cursor, _summary_item, "summary-history.json")
 
-    return [
-        {
-            "original_filename": r.get("original_filename"),
-            "summary": r.get("summary"),
-            "processed_by": r.get("processed_by"),
-            "created_at": r.get("created_at")
-        }
-        for r in records
-    ]
 @router.post("/translate")
 async def translate_file(
     filename: str = Form(...),
+    stream: bool = Form(False),
     user: str = Depends(get_current_user)
 ):
     # 1. Find file metadata
-    file_doc = db.files.find_one({"user": user, "stored_filename": filename})
+    file_doc = await db.files.find_one({"user": owner(user), "stored_filename": filename})
     if not file_doc:
         raise HTTPException(status_code=404, detail="File not found")
 
     # 2. Extract file text
     try:
-        content = extract_text_from_file(file_doc["file_path"])
+        content = await get_file_text(file_doc)
+    except HTTPException:
+        raise
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to read file")
 
     # 3. Prepare Strong Translation Prompt (Improved!)
-    prompt = (
-        "You are a professional Kurdish (Sorani) translator. "
-        "Translate the following English document into fluent, formal Kurdish language. "
-        "Do not mix English words. "
-        "Keep sentences clear, formal, and properly structured.\n\n"
-        "Here is the text:\n\n"
-        f"{content[:3000]}"  # Limit long documents to 3000 chars
-    )
+    prompt = translation_prompt(content)
+
+    # 4. Send to Ollama, streaming the translation as it is generated if asked
+    if stream:
+        async def tokens():
+            translation = ""
+            try:
+                async for chunk in ollama.stream_generate(
+                    prompt, timeout=settings.OLLAMA_TRANSLATE_TIMEOUT, user=user["username"], cache=True
+                ):
+                    translation += chunk
+                    yield chunk
+            except (httpx.HTTPError, AdmissionRejected) as e:
+                yield f"\n[Error contacting LLaMA]: {str(e)}\n"
+                return
+            await save_translation(user, file_doc, translation)
+
+        return StreamingResponse(tokens(), media_type="text/plain")
 
-    # 4. Send to Ollama
     try:
-        async with httpx.AsyncClient(timeout=120) as client:
-            response = await client.post(
-                "http://localhost:11434/api/generate",
-                json={"model": "llama3.2", "prompt": prompt, "stream": False}
-            )
-        response.raise_for_status()
-        data = response.json()
+        data = await ollama.generate(
+            prompt, timeout=settings.OLLAMA_TRANSLATE_TIMEOUT, user=user["username"], cache=True
+        )
         translation = data.get("response", "No translation received.")
+    except AdmissionRejected:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ollama error: {str(e)}")
 
+    await save_translation(user, file_doc, translation)
+
     # 5. Return clean
     return {
         "original_filename": file_doc["original_filename"],
@@ -255,16 +508,16 @@ async def translate_file(
     
 @router.post("/detect-intent")
 async def detect_intent(prompt: str = Form(...)):
-    final_prompt = (
-        "You are an assistant. Only respond with exactly one word: "
-        '"summarize", "translate", or "unknown".\n\n'
-        f"User message: {prompt}"
+    # Rules and the local classifier answer in microseconds; the LLM only breaks ties
+    local = intent_engine.classify(prompt)
+    if local.confidence >= settings.INTENT_MIN_CONFIDENCE:
+        return {"intent": local.intent, "confidence": local.confidence, "source": local.source}
+
+    result = await ollama.generate(
+        llm_intent_prompt(prompt), timeout=settings.OLLAMA_INTENT_TIMEOUT, priority=INTERACTIVE, cache=True
     )
-    async with httpx.AsyncClient(timeout=30) as client:
-        response = await client.post(
-            "http://localhost:11434/api/generate",
-            json={"model": "llama3.2", "prompt": final_prompt, "stream": False}
-        )
-    response.raise_for_status()
-    result = response.json()
-    return {"intent": result.get("response", "").strip().lower()}
\ No newline at end of file
+    intent = parse_llm_intent(result.get("response", ""))
+    if intent is None:
+        # The model ignored the one-word instruction; keep the local answer
+        return {"intent": local.intent, "confidence": local.confidence, "source": local.source}
+    return {"intent": intent, "source": "llm"}
\ No newline at end of file
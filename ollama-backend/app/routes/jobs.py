@@ -0,0 +1,64 @@
+import asyncio
+import json
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from app.db import db
+from app.auth import owner
+from app.dependencies import get_current_user
+from app.jobs import job_manager, job_view, TERMINAL_STATUSES
+from app.settings import settings
+
+router = APIRouter()
+
+class JobRequest(BaseModel):
+    type: Literal["summarize", "translate", "ingest"]
+    filename: str
+    priority: Optional[int] = Field(None, ge=0, le=10)  # superadmin only; workers take higher first
+
+async def _get_job(job_id: str, current_user: dict) -> dict:
+    job = await db.jobs.find_one({"_id": job_id})
+    if not job or (current_user["role"] != "superadmin" and job["username"] != current_user["username"]):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/")
+async def submit_job(req: JobRequest, current_user: dict = Depends(get_current_user)):
+    # A user picking their own priority could jump ahead of everyone else's jobs
+    if req.priority and current_user["role"] != "superadmin":
+        raise HTTPException(status_code=403, detail="Only superadmin can set job priority")
+
+    file_doc = await db.files.find_one({"user": owner(current_user), "stored_filename": req.filename})
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    job = await job_manager.submit(current_user, req.type, {"filename": req.filename}, req.priority or 0)
+    return {"job_id": job["_id"], "status": job["status"]}
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    return job_view(await _get_job(job_id, current_user))
+
+@router.get("/{job_id}/follow")
+async def follow_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = await _get_job(job_id, current_user)
+
+    async def updates():
+        last_seen = None
+        current = job
+        while True:
+            if current["updated_at"] != last_seen:
+                last_seen = current["updated_at"]
+                yield json.dumps(jsonable_encoder(job_view(current))) + "\n"
+            if current["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(settings.JOB_FOLLOW_INTERVAL)
+            current = await db.jobs.find_one({"_id": job_id})
+            if current is None:
+                return
+
+    return StreamingResponse(updates(), media_type="application/x-ndjson")
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response
+
+from app.admission import admission
+from app.auth import auth_cache
+from app.db import db
+from app.metrics import CACHE_ENTRIES, CACHE_EVENTS, QUEUE_DEPTH, render
+from app.settings import settings
+from app.utils.context import contexts
+from app.utils.extraction import extraction_pool
+from app.utils.password_handler import password_hasher
+from app.utils.response_cache import response_cache
+from app.utils.stt import stt
+from app.utils.tts import tts
+from app.utils.web import web_fetcher
+
+router = APIRouter()
+
+JOB_STATES = ("queued", "running")
+
+
+async def refresh_gauges():
+    for model, gate in admission.stats().items():
+        QUEUE_DEPTH.labels(f"ollama:{model}", "queued").set(gate["queued"])
+        QUEUE_DEPTH.labels(f"ollama:{model}", "running").set(gate["in_flight"])
+    QUEUE_DEPTH.labels("extraction", "pending").set(extraction_pool.pending)
+    QUEUE_DEPTH.labels("stt", "running").set(stt.stats()["sessions"])
+    QUEUE_DEPTH.labels("tts", "running").set(tts.stats()["in_flight"])
+    QUEUE_DEPTH.labels("bcrypt", "pending").set(password_hasher.stats()["pending"])
+
+    # The job queue is shared by every worker, so this one comes from Mongo
+    counts = {state: 0 for state in JOB_STATES}
+    async for row in db.jobs.aggregate([
+        {"$match": {"status": {"$in": list(JOB_STATES)}}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ]):
+        counts[row["_id"]] = row["count"]
+    for state, count in counts.items():
+        QUEUE_DEPTH.labels("jobs", state).set(count)
+
+    responses = response_cache.stats()
+    CACHE_ENTRIES.labels("response").set(responses["memory_entries"])
+    for event in ("memory_hits", "mongo_hits", "semantic_hits", "misses"):
+        CACHE_EVENTS.labels("response", event).set(responses[event])
+    audio = tts.cache.stats()
+    CACHE_ENTRIES.labels("tts_audio").set(audio["entries"])
+    for event in ("hits", "misses"):
+        CACHE_EVENTS.labels("tts_audio", event).set(audio.get(event, 0))
+    pages = web_fetcher.stats()
+    CACHE_ENTRIES.labels("blog_pages").set(pages["entries"])
+    for event in ("hits", "revalidated", "fetched"):
+        CACHE_EVENTS.labels("blog_pages", event).set(pages[event])
+    CACHE_ENTRIES.labels("chat_context").set(contexts.stats()["sessions"])
+    tokens = auth_cache.stats()
+    CACHE_ENTRIES.labels("auth_tokens").set(tokens["entries"])
+    for event in ("hits", "misses"):
+        CACHE_EVENTS.labels("auth_tokens", event).set(tokens[event])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    await refresh_gauges()
+    body, content_type = render()
+    return Response(body, media_type=content_type)
@@ -1,11 +1,16 @@
-import os
-import uuid
+import asyncio
+import json
+from typing import Optional
 import speech_recognition as sr
-from fastapi import UploadFile, File, APIRouter, Depends, HTTPException
+from fastapi import UploadFile, File, APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from app.auth import authenticate
 from app.dependencies import get_current_user
+from app.settings import settings
+from app.utils.storage import temp_path, remove_quietly, CHUNK_SIZE
+from app.utils.tts import tts, TTSError
+from app.utils.stt import stt, STTBusy, STTError
 
-from gtts import gTTS
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 
@@ -14,28 +19,115 @@ router = APIRouter()
 class TTSRequest(BaseModel):
     text: str
     
+def _decode_audio(path: str) -> bytes:
+    # WAV/AIFF/FLAC in, 16-bit mono PCM at STT_SAMPLE_RATE out
+    with sr.AudioFile(path) as source:
+        audio = sr.Recognizer().record(source)
+    return audio.get_raw_data(convert_rate=settings.STT_SAMPLE_RATE, convert_width=2)
+
+
 @router.post("/stt")
 async def speech_to_text(file: UploadFile = File(...), user: str = Depends(get_current_user)):
-    temp_filename = f"temp_{uuid.uuid4().hex}.wav"
-    contents = await file.read()
+    # Scratch copy under STORAGE_TEMP_DIR; the sweeper removes anything a crash leaves behind
+    temp_filename = temp_path(".wav")
     with open(temp_filename, "wb") as f:
-        f.write(contents)
+        while chunk := await file.read(CHUNK_SIZE):
+            f.write(chunk)
 
     try:
-        r = sr.Recognizer()
-        with sr.AudioFile(temp_filename) as source:
-            audio = r.record(source)
-        text = r.recognize_google(audio)  # Replace with your offline engine if needed
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        pcm = await asyncio.to_thread(_decode_audio, temp_filename)
+    except (ValueError, EOFError) as e:
+        raise HTTPException(status_code=400, detail=f"Unsupported audio: {e}")
     finally:
-        os.remove(temp_filename)
+        remove_quietly(temp_filename)
+
+    try:
+        text = await stt.transcribe(pcm, settings.STT_SAMPLE_RATE)
+    except STTBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(settings.STT_RETRY_AFTER)})
+    except STTError as e:
+        raise HTTPException(status_code=503, detail=f"Speech recognition unavailable: {e}")
 
     return {"text": text}
 
+
+@router.websocket("/stt/stream")
+async def speech_to_text_stream(
+    websocket: WebSocket,
+    token: str = Query(...),
+    sample_rate: int = Query(None, ge=8000, le=48000),
+):
+    """Live transcription.
+
+    Send binary frames of 16-bit little-endian mono PCM, then {"type": "end"}.
+    Receives {"type": "partial"|"final", "text"} while audio arrives and
+    {"type": "done", "text"} with the whole transcript at the end.
+    """
+    try:
+        await authenticate(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    rate = sample_rate or settings.STT_SAMPLE_RATE
+    max_bytes = settings.STT_MAX_SECONDS * rate * 2
+    received, last_partial = 0, None
+    try:
+        async with stt.session(rate) as session:
+            await websocket.send_json({"type": "ready", "sample_rate": rate})
+            while received < max_bytes:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                if message.get("bytes"):
+                    received += len(message["bytes"])
+                    result = await session.accept(message["bytes"])
+                    # Vosk repeats the same partial for every frame of silence
+                    if result and (result["type"] == "final" or result["text"] != last_partial):
+                        last_partial = result["text"] if result["type"] == "partial" else None
+                        await websocket.send_json(result)
+                elif message.get("text") and json.loads(message["text"]).get("type") == "end":
+                    break
+            await websocket.send_json({"type": "done", "text": await session.finish()})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except STTBusy as e:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=str(e))
+    except (STTError, ValueError) as e:
+        await websocket.send_json({"type": "error", "detail": str(e)})
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+
+
 @router.post("/tts")
-async def text_to_speech(req: TTSRequest, user: str = Depends(get_current_user)):
-    filename = f"tts_{uuid.uuid4().hex}.mp3"
-    tts = gTTS(text=req.text)
-    tts.save(filename)
-    return FileResponse(filename, media_type="audio/mpeg", filename="output.mp3")
\ No newline at end of file
+async def text_to_speech(
+    req: Optional[TTSRequest] = None,
+    text: Optional[str] = Query(None),  # the web client sends ?text=
+    user: str = Depends(get_current_user)
+):
+    text = req.text if req else text
+    if not text or not text.strip():
+        raise HTTPException(status_code=400, detail="No text to speak")
+    if len(text) > settings.TTS_MAX_CHARS:
+        raise HTTPException(status_code=413, detail=f"Text is longer than {settings.TTS_MAX_CHARS} characters")
+
+    # Audio streams sentence by sentence; the first one is synthesized before
+    # responding so engine failures still come back as a proper error
+    audio = tts.stream(text)
+    try:
+        first = await audio.__anext__()
+    except TTSError as e:
+        await audio.aclose()
+        raise HTTPException(status_code=503, detail=f"Text-to-speech unavailable: {e}")
+
+    async def body():
+        yield first
+        async for chunk in audio:
+            yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=tts.engine.media_type,
+        headers={"Content-Disposition": f'attachment; filename="output.{tts.engine.extension}"'},
+    )
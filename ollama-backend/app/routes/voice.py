@@ -0,0 +1,223 @@
+import asyncio
+import json
+import logging
+import time
+from contextlib import AsyncExitStack
+from typing import Optional
+
+import httpx
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+
+from app.admission import AdmissionRejected
+from app.auth import authenticate
+from app.settings import settings
+from app.utils.chat import stream_answer
+from app.utils.stt import stt, STTBusy, STTError, SAMPLE_WIDTH
+from app.utils.tts import tts, TTSError, SentenceBuffer
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+class UtteranceTooLong(Exception):
+    """More than STT_MAX_SECONDS of audio without ending the utterance."""
+
+
+class VoiceConversation:
+    """One voice chat socket: speech in, answer text and audio out, turn after turn.
+
+    Recognised speech is sent to the model as soon as the STT engine marks an
+    utterance final (or the client sends {"type": "end"}). Answer tokens are
+    cut into sentences and each sentence is synthesized while the model keeps
+    writing, so the first audio goes out after the first sentence.
+    """
+
+    def __init__(self, websocket: WebSocket, user: dict, chat_id: Optional[str], sample_rate: int, auto_submit: bool):
+        self.websocket = websocket
+        self.user = user
+        self.chat_id = chat_id
+        self.sample_rate = sample_rate
+        self.auto_submit = auto_submit
+        self.max_bytes = settings.STT_MAX_SECONDS * sample_rate * SAMPLE_WIDTH
+        self._received = 0
+        self._send_lock = asyncio.Lock()
+        self._stt_stack: Optional[AsyncExitStack] = None
+        self._session = None
+        self._submitted = 0
+        self._last_partial = None
+        self._heard_at = None
+        self._turn: Optional[asyncio.Task] = None
+
+    async def send(self, message: dict, audio: bytes = None):
+        # Audio goes out as a JSON header followed by one binary frame; keep the pair together
+        async with self._send_lock:
+            await self.websocket.send_json(message)
+            if audio is not None:
+                await self.websocket.send_bytes(audio)
+
+    async def _open_session(self):
+        self._stt_stack = AsyncExitStack()
+        self._session = await self._stt_stack.enter_async_context(stt.session(self.sample_rate))
+        self._submitted = 0
+        self._received = 0
+
+    async def _close_session(self) -> str:
+        """Finish recognition and return what was heard but not yet submitted."""
+        if self._session is None:
+            return ""
+        try:
+            await self._session.finish()
+            return " ".join(self._session.finals[self._submitted:])
+        finally:
+            await self._stt_stack.aclose()
+            self._session = self._stt_stack = None
+
+    async def hear(self, pcm: bytes):
+        if self._session is None:
+            await self._open_session()
+        if self._heard_at is None:
+            self._heard_at = time.perf_counter()
+        # Engines like whisper keep and re-decode the whole utterance, so its length is what costs
+        self._received += len(pcm)
+        if self._received > self.max_bytes:
+            raise UtteranceTooLong(f"Utterance longer than {settings.STT_MAX_SECONDS} seconds")
+        result = await self._session.accept(pcm)
+        if not result or (result["type"] == "partial" and result["text"] == self._last_partial):
+            return
+        self._last_partial = result["text"] if result["type"] == "partial" else None
+        await self.send(result)
+        if result["type"] == "final" and result["text"] and self.auto_submit:
+            self._submitted = len(self._session.finals)
+            self.submit(result["text"])
+
+    async def end_utterance(self):
+        text = await self._close_session()
+        if text.strip():
+            self.submit(text)
+
+    def submit(self, text: str):
+        # Speaking again interrupts the answer still being given
+        self.cancel()
+        heard_at, self._heard_at = self._heard_at, None
+        self._turn = asyncio.create_task(self._answer(text, heard_at))
+        self._turn.add_done_callback(_log_turn_failure)
+
+    def cancel(self):
+        if self._turn is not None and not self._turn.done():
+            self._turn.cancel()
+
+    async def _answer(self, question: str, heard_at: Optional[float]):
+        started = time.perf_counter()
+        timings = {"stt_ms": round((started - heard_at) * 1000) if heard_at else None}
+        await self.send({"type": "question", "text": question})
+
+        sentences: asyncio.Queue = asyncio.Queue()
+        speaker = asyncio.create_task(self._speak(sentences, started, timings))
+        splitter, answer = SentenceBuffer(), ""
+        try:
+            async for chunk in stream_answer(self.user, question, self.chat_id):
+                if not chunk:
+                    continue
+                if not answer:
+                    timings["first_token_ms"] = round((time.perf_counter() - started) * 1000)
+                answer += chunk
+                await self.send({"type": "token", "text": chunk})
+                for sentence in splitter.feed(chunk):
+                    # Start synthesis now; the speaker sends results in order
+                    sentences.put_nowait(asyncio.create_task(tts.synthesize(sentence)))
+            for sentence in splitter.flush():
+                sentences.put_nowait(asyncio.create_task(tts.synthesize(sentence)))
+            sentences.put_nowait(None)
+            await speaker
+            await self.send({"type": "done", "answer": answer, **timings})
+        except (httpx.HTTPError, AdmissionRejected) as e:
+            await self.send({"type": "error", "detail": f"Error contacting LLaMA: {e}"})
+        except TTSError as e:
+            await self.send({"type": "error", "detail": f"Text-to-speech unavailable: {e}"})
+        except (WebSocketDisconnect, RuntimeError):
+            pass  # the client went away mid-answer
+        finally:
+            speaker.cancel()
+            while not sentences.empty():
+                task = sentences.get_nowait()
+                if task is not None:
+                    task.cancel()
+
+    async def _speak(self, sentences: asyncio.Queue, started: float, timings: dict):
+        seq = 0
+        while (task := await sentences.get()) is not None:
+            audio = await task
+            if seq == 0:
+                timings["first_audio_ms"] = round((time.perf_counter() - started) * 1000)
+            await self.send({"type": "audio", "seq": seq, "format": tts.engine.extension}, audio)
+            seq += 1
+
+    async def close(self):
+        self.cancel()
+        if self._stt_stack is not None:
+            await self._stt_stack.aclose()
+
+
+def _log_turn_failure(task: asyncio.Task):
+    # Nothing awaits a turn; expected errors are reported to the client inside _answer
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Voice turn failed", exc_info=task.exception())
+
+
+@router.websocket("/ws")
+async def voice_chat(
+    websocket: WebSocket,
+    token: str = Query(...),
+    chat_id: str = Query(None),
+    sample_rate: int = Query(None, ge=8000, le=48000),
+    auto_submit: bool = Query(True),
+):
+    """Voice chat.
+
+    Client sends binary frames of 16-bit little-endian mono PCM, and JSON
+    control messages: {"type": "end"} (utterance finished), {"type": "text",
+    "text"} (typed question) or {"type": "cancel"} (stop the current answer).
+
+    Server sends "ready", "partial"/"final" transcripts, "question", "token"
+    for each piece of the answer, "audio" headers each followed by a binary
+    frame holding one sentence as a complete audio file, and "done" with
+    stt_ms / first_token_ms / first_audio_ms timings.
+    """
+    try:
+        user = await authenticate(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+
+    conversation = VoiceConversation(
+        websocket, user, chat_id, sample_rate or settings.STT_SAMPLE_RATE, auto_submit
+    )
+    try:
+        await conversation.send({"type": "ready", "sample_rate": conversation.sample_rate, "audio_format": tts.engine.extension})
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                await conversation.hear(message["bytes"])
+                continue
+            control = json.loads(message.get("text") or "{}")
+            if control.get("type") == "end":
+                await conversation.end_utterance()
+            elif control.get("type") == "text" and control.get("text", "").strip():
+                conversation.submit(control["text"])
+            elif control.get("type") == "cancel":
+                conversation.cancel()
+    except WebSocketDisconnect:
+        pass
+    except STTBusy as e:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason=str(e))
+    except UtteranceTooLong as e:
+        await websocket.close(code=status.WS_1009_MESSAGE_TOO_BIG, reason=str(e))
+    except (STTError, TTSError, ValueError) as e:
+        await conversation.send({"type": "error", "detail": str(e)})
+        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+    finally:
+        await conversation.close()
@@ -1,9 +1,15 @@
 # app/seed_admin.py
 
+import logging
+
 from pymongo import MongoClient
+from app.logging_config import configure_logging
 from app.utils.password_handler import hash_password
 from app.settings import settings  # ✅ Use your configured superadmin username/password
 
+logger = logging.getLogger(__name__)
+
+
 def seed_admins():
     client = MongoClient("mongodb://localhost:27017")
     db = client["ollama_assistant"]
@@ -18,7 +24,7 @@ def seed_admins():
         "password": hash_password(settings.SUPERADMIN_PASSWORD)
     })
 
-    print(f"✅ Superadmin ({settings.SUPERADMIN_USERNAME}) inserted.")
+    logger.info("✅ Superadmin (%s) inserted.", settings.SUPERADMIN_USERNAME)
 
     # Insert Default Admin into `admins` collection
     db.admins.insert_one({
@@ -26,7 +32,9 @@ def seed_admins():
         "password": hash_password("secret123")
     })
 
-    print("✅ Default Admin (admin/secret123) inserted.")
+    logger.info("✅ Default Admin (admin) inserted.")
 
 if __name__ == "__main__":
+    # Run as a script nothing else sets up logging, and INFO would be dropped
+    configure_logging()
     seed_admins()
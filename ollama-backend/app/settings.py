@@ -1,7 +1,16 @@
+from typing import Dict
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     MONGO_URI: str
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_MIN_POOL_SIZE: int = 0
+    MONGO_MAX_IDLE_TIME_MS: int = 60000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 5000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SOCKET_TIMEOUT_MS: int = 30000
+    MONGO_ENSURE_INDEXES: bool = True
     SECRET_KEY: str = "super-secret-key"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 360
@@ -9,6 +18,167 @@ class Settings(BaseSettings):
     SUPERADMIN_USERNAME: str = "superadmin"
     SUPERADMIN_PASSWORD: str = "supersecret"
 
+    # Ollama
+    OLLAMA_BASE_URL: str = "http://localhost:11434"
+    # Comma-separated list of Ollama nodes; falls back to OLLAMA_BASE_URL
+    OLLAMA_BACKENDS: str = ""
+    OLLAMA_HEALTH_INTERVAL: float = 15.0
+    OLLAMA_CIRCUIT_FAILURES: int = 3
+    OLLAMA_CIRCUIT_RESET_SECONDS: float = 30.0
+    OLLAMA_RETRIES: int = 1
+    OLLAMA_MODEL: str = "llama3.2"
+    OLLAMA_MAX_CONNECTIONS: int = 20
+    OLLAMA_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    OLLAMA_KEEPALIVE_EXPIRY: float = 60.0
+    OLLAMA_CONNECT_TIMEOUT: float = 5.0
+    OLLAMA_CHAT_TIMEOUT: float = 60.0
+    OLLAMA_SUMMARIZE_TIMEOUT: float = 30.0
+    OLLAMA_TRANSLATE_TIMEOUT: float = 120.0
+    OLLAMA_INTENT_TIMEOUT: float = 30.0
+    OLLAMA_BLOG_TIMEOUT: float = 60.0
+    # Admission control in front of Ollama
+    OLLAMA_MAX_IN_FLIGHT: int = 4
+    OLLAMA_MODEL_MAX_IN_FLIGHT: Dict[str, int] = {}
+    OLLAMA_MAX_QUEUE: int = 32
+    OLLAMA_MAX_QUEUED_PER_USER: int = 4
+    OLLAMA_QUEUE_TIMEOUT: float = 30.0
+    OLLAMA_RETRY_AFTER: int = 5
+
+    # Extracted document text cache (in-memory tier, bytes)
+    TEXT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+
+    # Document extraction process pool
+    EXTRACTION_WORKERS: int = 2
+    EXTRACTION_MAX_QUEUE: int = 16
+    EXTRACTION_TIMEOUT: float = 120.0
+    EXTRACTION_MAX_FILE_MB: int = 50
+    EXTRACTION_RETRY_AFTER: int = 5
+
+    # Map-reduce summarization of long documents
+    SUMMARY_CHUNK_TOKENS: int = 1000
+    SUMMARY_CONCURRENCY: int = 4
+
+    # Background summarize/translate jobs
+    JOB_WORKERS: int = 2
+    JOB_MAX_RUNNING_PER_USER: int = 1  # across all workers
+    JOB_MAX_ATTEMPTS: int = 3
+    # Seconds before retrying a job Ollama or extraction failed; doubles per attempt
+    JOB_RETRY_BACKOFF: float = 10.0
+    JOB_RETRY_BACKOFF_MAX: float = 300.0
+    JOB_LEASE_SECONDS: int = 60
+    JOB_POLL_INTERVAL: float = 2.0
+    JOB_FOLLOW_INTERVAL: float = 0.5
+
+    # Ollama response cache
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 1000
+    RESPONSE_CACHE_TTL_SECONDS: int = 24 * 3600
+    RESPONSE_CACHE_SEMANTIC: bool = False
+    RESPONSE_CACHE_SEMANTIC_THRESHOLD: float = 0.95
+    RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES: int = 5000
+    OLLAMA_EMBED_MODEL: str = "nomic-embed-text"
+    OLLAMA_EMBED_TIMEOUT: float = 30.0
+
+    # Local intent detection; below this confidence the LLM decides
+    INTENT_MIN_CONFIDENCE: float = 0.6
+    INTENT_TRAINING_FILE: str = ""
+
+    # Uploads; resumable sessions expire after UPLOAD_SESSION_TTL_HOURS without progress
+    UPLOAD_MAX_MB: int = 100
+    UPLOAD_CHUNK_MB: int = 8
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    UPLOAD_WRITE_LEASE_SECONDS: int = 60  # a chunk PUT that stalls this long loses its claim on the session
+
+    # Where uploads and generated audio are kept; S3_* apply when STORAGE_BACKEND is "s3"
+    # (any S3-compatible endpoint, e.g. MinIO via S3_ENDPOINT_URL)
+    STORAGE_BACKEND: str = "local"
+    STORAGE_LOCAL_DIR: str = "uploaded_files"
+    STORAGE_TEMP_DIR: str = "uploaded_files/tmp"
+    S3_BUCKET: str = ""
+    S3_PREFIX: str = ""
+    S3_ENDPOINT_URL: str = ""
+    S3_REGION: str = ""
+    S3_ACCESS_KEY_ID: str = ""
+    S3_SECRET_ACCESS_KEY: str = ""
+    STORAGE_GC_INTERVAL: int = 3600
+    STORAGE_TEMP_RETENTION_HOURS: int = 24
+    STORAGE_ORPHAN_GRACE_HOURS: int = 1
+    TTS_RETENTION_HOURS: int = 24  # audio under tts/ that is not an AudioCache entry
+
+    # Text-to-speech: "gtts" (online) or the offline "espeak" / "piper" engines
+    TTS_ENGINE: str = "gtts"
+    TTS_LANGUAGE: str = "en"
+    TTS_VOICE: str = ""
+    TTS_ESPEAK_BINARY: str = "espeak-ng"
+    TTS_PIPER_BINARY: str = "piper"
+    TTS_PIPER_MODEL: str = ""
+    TTS_CACHE_MAX_MB: int = 200
+    TTS_CONCURRENCY: int = 2
+    TTS_MAX_CHARS: int = 5000
+
+    # Speech-to-text: offline "vosk" / "whisper" (whisper.cpp) or the online "google"
+    STT_ENGINE: str = "google"
+    STT_VOSK_MODEL: str = ""
+    STT_WHISPER_MODEL: str = "base.en"
+    STT_SAMPLE_RATE: int = 16000
+    STT_WORKERS: int = 2
+    STT_THREADS_PER_WORKER: int = 2
+    STT_MAX_SESSIONS: int = 8
+    STT_MAX_SECONDS: int = 300
+    STT_PARTIAL_INTERVAL: float = 1.0
+    STT_RETRY_AFTER: int = 5
+
+    # Retrieval over uploaded files for /api/chat
+    RAG_ENABLED: bool = True
+    RAG_AUTO_INGEST: bool = True
+    RAG_INDEX_DIR: str = "rag_index"
+    RAG_CHUNK_TOKENS: int = 300
+    RAG_EMBED_BATCH: int = 32
+    RAG_TOP_K: int = 4
+    RAG_MIN_SCORE: float = 0.35
+    RAG_MAX_CONTEXT_TOKENS: int = 1500
+    RAG_ANN_MIN_ROWS: int = 20000
+    RAG_MAX_OPEN_SCOPES: int = 64
+
+    # Logging and /metrics; LOG_FORMAT "json" writes one JSON object per line
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"
+    METRICS_ENABLED: bool = True
+
+    # Blog scraping; fetched pages are kept as extracted text for BLOG_CACHE_TTL
+    # seconds, then revalidated with ETag / Last-Modified
+    BLOG_FETCH_TIMEOUT: float = 15.0
+    BLOG_MAX_CONNECTIONS: int = 20
+    BLOG_MAX_PAGE_MB: int = 5
+    BLOG_MAX_CHARS: int = 3000
+    BLOG_CACHE_TTL: int = 600
+    BLOG_CACHE_MAX_MB: int = 32
+    BLOG_BATCH_MAX_URLS: int = 20
+    BLOG_BATCH_CONCURRENCY: int = 4
+
+    # Conversation memory for chat sessions (requests with a chat_id)
+    CHAT_CONTEXT_TOKENS: int = 3000
+    CHAT_SUMMARY_TOKENS: int = 300
+    CHAT_HISTORY_MAX_TURNS: int = 50
+    CHAT_CONTEXT_CACHE_SESSIONS: int = 1000
+    CHAT_SYSTEM_PROMPT: str = ""
+
+    # Verified tokens and their admin record; revocations reach other workers within the TTL at most
+    AUTH_CACHE_TTL: int = 60
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+
+    # bcrypt runs on its own thread pool; raising BCRYPT_ROUNDS rehashes passwords at their next login
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 32
+
+    # Login throttling, counted per worker: failures per client IP and per username
+    LOGIN_IP_WINDOW_SECONDS: int = 60
+    LOGIN_MAX_FAILURES_PER_IP: int = 20
+    LOGIN_USERNAME_WINDOW_SECONDS: int = 300
+    LOGIN_MAX_FAILURES_PER_USERNAME: int = 5
+    LOGIN_THROTTLE_MAX_KEYS: int = 10000
+
     class Config:
         env_file = ".env"
 
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+
+import httpx
+
+from app.admission import AdmissionRejected, INTERACTIVE
+from app.db import db
+from app.ollama_client import ollama
+from app.settings import settings
+from app.utils.context import contexts, mongo_now
+from app.utils.rag import vector_store, build_prompt, chat_scope, user_scope
+
+logger = logging.getLogger(__name__)
+
+
+async def stream_answer(
+    user: dict, message: str, chat_id: Optional[str] = None, use_files: bool = True
+) -> AsyncIterator[str]:
+    """Stream the model's answer to one chat message, then record the turn in `chats`.
+
+    Shared by the text chat and voice chat routes. With a chat_id the model
+    sees the session's earlier turns (see ContextStore). Ollama and admission
+    errors are re-raised after whatever was answered so far has been saved.
+    """
+    username = user["username"]
+
+    # Ground the answer in the most relevant chunks of the user's uploads
+    passages = []
+    if settings.RAG_ENABLED and use_files:
+        scope = chat_scope(username, chat_id) if chat_id else user_scope(username)
+        try:
+            passages = await vector_store.search(scope, message, username)
+        except (httpx.HTTPError, AdmissionRejected) as e:
+            logger.warning("File retrieval failed, answering without it: %s", e)
+
+    prompt = build_prompt(message, passages)
+    if chat_id:
+        messages = await contexts.messages(username, chat_id, prompt)
+    else:
+        messages = [{"role": "user", "content": prompt}]
+
+    full_response, error = "", None
+    try:
+        async for chunk in ollama.stream_chat(
+            messages,
+            timeout=settings.OLLAMA_CHAT_TIMEOUT,
+            user=username,
+            priority=INTERACTIVE,
+            cache=True,
+            # A similar question over different excerpts or history is not the same question
+            semantic=len(messages) == 1 and not passages,
+        ):
+            full_response += chunk
+            yield chunk
+            await asyncio.sleep(0)
+    except (httpx.HTTPError, AdmissionRejected) as e:
+        error = e
+
+    # ✅ Save chat in MongoDB with username + role
+    turn = {
+        "username": username,
+        "role": user["role"],
+        "question": message,
+        "answer": full_response,
+        "chat_id": chat_id,
+        "sources": [{"filename": p.filename, "chunk": p.chunk} for p in passages],
+        "timestamp": mongo_now()
+    }
+    await db.chats.insert_one(turn)
+    if chat_id:
+        await contexts.add_turn(username, chat_id, turn)
+    if error is not None:
+        raise error
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from pymongo import ReturnDocument
+
+from app.admission import AdmissionRejected, BACKGROUND
+from app.db import db
+from app.ollama_client import ollama
+from app.settings import settings
+from app.utils.summarize import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Below is a summary of a conversation so far, followed by the turns that came after it. "
+    "Write an updated summary of the whole conversation in at most {words} words. Keep names, "
+    "numbers, decisions and open questions; leave out greetings and small talk.\n\n"
+    "Summary so far:\n{summary}\n\nLater turns:\n{turns}"
+)
+SUMMARY_MESSAGE = "Summary of the earlier part of this conversation:\n{summary}"
+
+
+def mongo_now() -> datetime:
+    # BSON dates keep milliseconds; truncating keeps cached and stored timestamps comparable
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+    timestamp: datetime
+    tokens: int
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "Turn":
+        question, answer = doc.get("question", ""), doc.get("answer", "")
+        return cls(question, answer, doc["timestamp"], estimate_tokens(question) + estimate_tokens(answer))
+
+
+@dataclass
+class SessionContext:
+    username: str
+    chat_id: str
+    summary: str = ""
+    summary_tokens: int = 0
+    summarized_until: Optional[datetime] = None
+    turns: List[Turn] = field(default_factory=list)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def last_timestamp(self) -> Optional[datetime]:
+        return self.turns[-1].timestamp if self.turns else self.summarized_until
+
+    def history_tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+    def set_summary(self, summary: str, until: datetime):
+        self.summary, self.summary_tokens, self.summarized_until = summary, estimate_tokens(summary), until
+        self.turns = [turn for turn in self.turns if turn.timestamp > until]
+
+    def add(self, turn: Turn):
+        if self.last_timestamp is None or turn.timestamp > self.last_timestamp:
+            self.turns.append(turn)
+            del self.turns[:-settings.CHAT_HISTORY_MAX_TURNS]
+
+
+class ContextStore:
+    """Conversation history per chat session, assembled into /api/chat messages within a token budget.
+
+    A session's turns are read from `chats` once and then kept in memory with
+    their token estimates (LRU over CHAT_CONTEXT_CACHE_SESSIONS sessions);
+    later turns only fetch what is newer than the last turn seen, so turns
+    answered by other workers are still picked up. When the history outgrows
+    CHAT_CONTEXT_TOKENS, the oldest turns are folded into a rolling summary in
+    the background and stored in `chat_sessions`.
+    """
+
+    def __init__(self):
+        self._sessions: "OrderedDict[Tuple[str, str], SessionContext]" = OrderedDict()
+        self._summarizing: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def _get(self, username: str, chat_id: str) -> SessionContext:
+        key = (username, chat_id)
+        ctx = self._sessions.get(key)
+        if ctx is None:
+            ctx = self._sessions[key] = SessionContext(username, chat_id)
+            while len(self._sessions) > settings.CHAT_CONTEXT_CACHE_SESSIONS:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(key)
+        return ctx
+
+    async def _refresh(self, ctx: SessionContext):
+        session = await db.chat_sessions.find_one(
+            {"username": ctx.username, "chat_id": ctx.chat_id}, {"summary": 1, "summarized_until": 1}
+        )
+        until = (session or {}).get("summarized_until")
+        if until and (ctx.summarized_until is None or until > ctx.summarized_until):
+            ctx.set_summary(session.get("summary", ""), until)
+
+        query = {"username": ctx.username, "chat_id": ctx.chat_id}
+        if ctx.last_timestamp is not None:
+            query["timestamp"] = {"$gt": ctx.last_timestamp}
+        docs = await db.chats.find(query, {"question": 1, "answer": 1, "timestamp": 1}) \
+            .sort("timestamp", -1).limit(settings.CHAT_HISTORY_MAX_TURNS).to_list(length=None)
+        for doc in reversed(docs):
+            ctx.add(Turn.from_doc(doc))
+
+    async def messages(self, username: str, chat_id: str, prompt: str) -> List[dict]:
+        """System prompt, summary and as many recent turns as fit, then `prompt` as the user message."""
+        ctx = self._get(username, chat_id)
+        async with ctx.lock:
+            await self._refresh(ctx)
+            summary, summary_tokens, turns = ctx.summary, ctx.summary_tokens, list(ctx.turns)
+
+        head = []
+        if settings.CHAT_SYSTEM_PROMPT:
+            head.append({"role": "system", "content": settings.CHAT_SYSTEM_PROMPT})
+        if summary:
+            head.append({"role": "system", "content": SUMMARY_MESSAGE.format(summary=summary)})
+
+        budget = settings.CHAT_CONTEXT_TOKENS - estimate_tokens(prompt) - summary_tokens
+        history = []
+        for turn in reversed(turns):
+            if not turn.answer:
+                continue  # the answer failed; the question alone would only confuse the model
+            if turn.tokens > budget:
+                break
+            budget -= turn.tokens
+            history.append({"role": "assistant", "content": turn.answer})
+            history.append({"role": "user", "content": turn.question})
+        history.reverse()
+        return head + history + [{"role": "user", "content": prompt}]
+
+    async def add_turn(self, username: str, chat_id: str, doc: dict):
+        """Record a turn just saved to `chats`."""
+        session = await db.chat_sessions.find_one_and_update(
+            {"username": username, "chat_id": chat_id},
+            {"$set": {"updated_at": doc["timestamp"]}, "$inc": {"turns": 1}, "$setOnInsert": {"created_at": doc["timestamp"]}},
+            projection={"title": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if not session.get("title"):
+            # Sessions are named after their first question
+            await db.chat_sessions.update_one({"_id": session["_id"]}, {"$set": {"title": doc["question"][:80]}})
+        # A session that is not cached is read in full on its next turn
+        ctx = self._sessions.get((username, chat_id))
+        if ctx is None:
+            return
+        ctx.add(Turn.from_doc(doc))
+        if ctx.history_tokens() > settings.CHAT_CONTEXT_TOKENS:
+            self._schedule_summary(ctx)
+
+    def _schedule_summary(self, ctx: SessionContext):
+        key = (ctx.username, ctx.chat_id)
+        if key in self._summarizing:
+            return
+        task = asyncio.create_task(self._summarize(ctx))
+        self._summarizing[key] = task
+        task.add_done_callback(lambda _: self._summarizing.pop(key, None))
+
+    async def _summarize(self, ctx: SessionContext):
+        # Fold the oldest turns until what is left fills half the budget
+        async with ctx.lock:
+            remaining, fold = ctx.history_tokens(), []
+            for turn in ctx.turns:
+                if remaining <= settings.CHAT_CONTEXT_TOKENS // 2:
+                    break
+                fold.append(turn)
+                remaining -= turn.tokens
+            previous, previous_until = ctx.summary, ctx.summarized_until
+        if not fold:
+            return
+
+        prompt = SUMMARY_PROMPT.format(
+            words=settings.CHAT_SUMMARY_TOKENS * 3 // 4,
+            summary=previous or "(none yet)",
+            turns="\n\n".join(f"User: {t.question}\nAssistant: {t.answer}" for t in fold),
+        )
+        try:
+            data = await ollama.generate(
+                prompt, timeout=settings.OLLAMA_SUMMARIZE_TIMEOUT, user=ctx.username, priority=BACKGROUND
+            )
+        except (httpx.HTTPError, AdmissionRejected) as e:
+            logger.warning("Conversation summary for %s/%s failed: %s", ctx.username, ctx.chat_id, e)
+            return
+        summary = data.get("response", "").strip()
+        if not summary:
+            return
+
+        until = fold[-1].timestamp
+        # Only move forward from the summary we started from; another worker may have got there first
+        result = await db.chat_sessions.update_one(
+            {"username": ctx.username, "chat_id": ctx.chat_id, "summarized_until": previous_until},
+            {"$set": {"summary": summary, "summarized_until": until}},
+        )
+        if result.matched_count:
+            async with ctx.lock:
+                if ctx.summarized_until == previous_until:
+                    ctx.set_summary(summary, until)
+
+    async def stop(self):
+        tasks = list(self._summarizing.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"sessions": len(self._sessions), "summarizing": len(self._summarizing)}
+
+
+contexts = ContextStore()
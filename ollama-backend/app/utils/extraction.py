@@ -0,0 +1,156 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+import fitz
+import pandas as pd
+import pytesseract
+from docx import Document
+from fastapi import HTTPException
+from pdfminer.high_level import extract_text as extract_pdf_text
+from PIL import Image
+
+from app.metrics import EXTRACTION_LATENCY
+from app.settings import settings
+
+SUPPORTED_EXTENSIONS = {".txt", ".docx", ".pdf", ".xlsx", ".png", ".jpg", ".jpeg"}
+
+
+def extract_text_from_file(file_path: str, ext: str = None) -> str:
+    # Stored blobs are named by content hash, so the type comes from the original filename
+    ext = (ext or os.path.splitext(file_path)[1]).lower()
+
+    if ext == ".txt":
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    elif ext == ".docx":
+        try:
+            doc = Document(file_path)
+            return "\n".join([p.text for p in doc.paragraphs])
+        except Exception as e:
+            raise ValueError("Failed to read DOCX file: " + str(e))
+
+    elif ext == ".pdf":
+        try:
+            # Try reading PDF via PyMuPDF (better for scanned PDFs)
+            doc = fitz.open(file_path)
+            return "\n".join([page.get_text() for page in doc])
+        except Exception:
+            # Fallback to pdfminer if needed
+            try:
+                return extract_pdf_text(file_path)
+            except Exception as e:
+                raise ValueError("Failed to read PDF file: " + str(e))
+
+    elif ext == ".xlsx":
+        try:
+            df = pd.read_excel(file_path, engine="openpyxl")
+            return df.to_string(index=False)
+        except Exception as e:
+            raise ValueError("Failed to read Excel file: " + str(e))
+
+    elif ext in [".png", ".jpg", ".jpeg"]:
+        try:
+            return pytesseract.image_to_string(Image.open(file_path))
+        except Exception as e:
+            raise ValueError("Failed OCR image reading: " + str(e))
+
+    else:
+        raise ValueError(f"Unsupported file type: {ext}")
+
+
+class ExtractionPool:
+    """Runs extract_text_from_file in a bounded process pool off the event loop."""
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._killed: "weakref.WeakSet[ProcessPoolExecutor]" = weakref.WeakSet()
+
+    def start(self):
+        if self._executor is None:
+            # spawn keeps the children free of the parent's event loop and Mongo threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._discard(self._executor)
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        executor.shutdown(wait=False, cancel_futures=True)
+        # A request finishing late must not throw away the pool that replaced this one
+        if self._executor is executor:
+            self._executor = None
+
+    def _terminate(self, executor: ProcessPoolExecutor):
+        # A running job cannot be cancelled; killing its process is the only way to get the CPU back.
+        # Other jobs on this pool fail with BrokenProcessPool and the next request starts a fresh pool.
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        self._killed.add(executor)
+        self._discard(executor)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def extract(self, file_path: str, ext: str = None) -> str:
+        max_bytes = settings.EXTRACTION_MAX_FILE_MB * 1024 * 1024
+        if os.path.getsize(file_path) > max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"File is larger than {settings.EXTRACTION_MAX_FILE_MB} MB and cannot be processed",
+            )
+
+        if self._pending >= settings.EXTRACTION_MAX_QUEUE:
+            raise HTTPException(
+                status_code=503,
+                detail="Document extraction is busy, please retry shortly",
+                headers={"Retry-After": str(settings.EXTRACTION_RETRY_AFTER)},
+            )
+
+        self.start()
+        executor = self._executor
+        self._pending += 1
+        extension = (ext or os.path.splitext(file_path)[1]).lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            extension = "other"  # keeps the metric's label set bounded
+        started, outcome = time.perf_counter(), "error"
+        try:
+            job = executor.submit(extract_text_from_file, file_path, ext)
+            text = await asyncio.wait_for(asyncio.wrap_future(job), timeout=settings.EXTRACTION_TIMEOUT)
+            outcome = "ok"
+            return text
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            # wait_for cancelled the job; that only works while it is still queued
+            if not job.cancelled():
+                self._terminate(executor)
+            raise HTTPException(status_code=504, detail="Document extraction timed out")
+        except BrokenProcessPool:
+            if executor in self._killed:
+                # Shared a pool with a job that timed out; nothing wrong with this document
+                raise HTTPException(
+                    status_code=503,
+                    detail="Document extraction was interrupted, please retry shortly",
+                    headers={"Retry-After": str(settings.EXTRACTION_RETRY_AFTER)},
+                )
+            # A worker died (e.g. out of memory); rebuild the pool for the next request
+            self._discard(executor)
+            raise HTTPException(status_code=500, detail="Document extraction worker crashed")
+        finally:
+            self._pending -= 1
+            # Includes time queued for a free worker, which is what callers wait for
+            EXTRACTION_LATENCY.labels(extension, outcome).observe(time.perf_counter() - started)
+
+
+extraction_pool = ExtractionPool()
@@ -0,0 +1,138 @@
+import csv
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.settings import settings
+
+INTENTS = ("summarize", "translate", "unknown")
+
+TRAINING_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "intent_train.csv")
+
+SUMMARIZE_RULE = re.compile(
+    r"\b(summar(y|ise|ize|ised|ized|ies)|sum (it )?up|tl;?dr|recap|gist|overview"
+    r"|key (points|takeaways|findings)|main (points|ideas)|in a nutshell)\b|کورت"
+)
+TRANSLATE_RULE = re.compile(r"\b(translat\w*|kurd(ish|î|i)|sorani)\b|وەرگێڕ|گێڕ|wergêr")
+
+
+def llm_intent_prompt(prompt: str) -> str:
+    return (
+        "You are an assistant. Only respond with exactly one word: "
+        '"summarize", "translate", or "unknown".\n\n'
+        f"User message: {prompt}"
+    )
+
+
+def parse_llm_intent(text: str) -> Optional[str]:
+    """The intent the LLM answered, or None if its first word is not one of INTENTS."""
+    words = re.findall(r"[a-z]+", text.lower())
+    return words[0] if words and words[0] in INTENTS else None
+
+
+def _features(text: str) -> List[str]:
+    # Word uni/bigrams plus character 4-grams, so "summarise" still looks like "summarize"
+    words = re.findall(r"[\w;']+", text.lower())
+    features = list(words)
+    features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        features += [f"#{padded[i:i + 4]}" for i in range(max(len(padded) - 3, 1))]
+    return features
+
+
+@dataclass
+class IntentResult:
+    intent: str
+    confidence: float
+    source: str
+
+
+class IntentClassifier:
+    """TF-IDF features with a multinomial logistic regression, trained in NumPy."""
+
+    def __init__(self, l2: float = 1e-3, iterations: int = 400, learning_rate: float = 2.0):
+        self.l2 = l2
+        self.iterations = iterations
+        self.learning_rate = learning_rate
+        self.vocabulary: Dict[str, int] = {}
+        self.idf: Optional[np.ndarray] = None
+        self.weights: Optional[np.ndarray] = None
+        self.bias: Optional[np.ndarray] = None
+
+    def _vectorize(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float64)
+        for row, text in enumerate(texts):
+            for feature, count in Counter(_features(text)).items():
+                column = self.vocabulary.get(feature)
+                if column is not None:
+                    matrix[row, column] = 1.0 + math.log(count)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1.0, norms)
+
+    def fit(self, texts: List[str], labels: List[str]) -> "IntentClassifier":
+        document_frequency: Counter = Counter()
+        for text in texts:
+            document_frequency.update(set(_features(text)))
+        self.vocabulary = {feature: i for i, feature in enumerate(sorted(document_frequency))}
+        n = len(texts)
+        self.idf = np.array(
+            [math.log((1 + n) / (1 + document_frequency[f])) + 1 for f in sorted(document_frequency)]
+        )
+
+        x = self._vectorize(texts)
+        y = np.zeros((n, len(INTENTS)))
+        y[np.arange(n), [INTENTS.index(label) for label in labels]] = 1.0
+
+        self.weights = np.zeros((x.shape[1], len(INTENTS)))
+        self.bias = np.zeros(len(INTENTS))
+        for _ in range(self.iterations):
+            gradient = (self._softmax(x @ self.weights + self.bias) - y) / n
+            self.weights -= self.learning_rate * (x.T @ gradient + self.l2 * self.weights)
+            self.bias -= self.learning_rate * gradient.sum(axis=0)
+        return self
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probabilities = self._softmax(self._vectorize([text]) @ self.weights + self.bias)[0]
+        best = int(np.argmax(probabilities))
+        return INTENTS[best], float(probabilities[best])
+
+
+class IntentEngine:
+    """Keyword rules first, then the local classifier; callers fall back to the LLM on low confidence."""
+
+    def __init__(self, training_file: str = TRAINING_FILE):
+        self.training_file = training_file
+        self._classifier: Optional[IntentClassifier] = None
+
+    @property
+    def classifier(self) -> IntentClassifier:
+        if self._classifier is None:
+            with open(self.training_file, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            self._classifier = IntentClassifier().fit([r["text"] for r in rows], [r["label"] for r in rows])
+        return self._classifier
+
+    def classify(self, text: str) -> IntentResult:
+        lowered = text.lower()
+        wants_summary = bool(SUMMARIZE_RULE.search(lowered))
+        wants_translation = bool(TRANSLATE_RULE.search(lowered))
+        if wants_summary != wants_translation:
+            return IntentResult("summarize" if wants_summary else "translate", 1.0, "rules")
+
+        intent, confidence = self.classifier.predict(text)
+        return IntentResult(intent, confidence, "classifier")
+
+
+intent_engine = IntentEngine(settings.INTENT_TRAINING_FILE or TRAINING_FILE)
@@ -1,16 +1,20 @@
 # app/utils/jwt_handler.py
 
 from datetime import datetime, timedelta
+from uuid import uuid4
 from jose import jwt
 from app.config import settings
 
 def create_access_token(username: str, role: str, expires_delta: timedelta = None):
-    to_encode = {"sub": username, "role": role}
+    now = datetime.utcnow()
+    # iat lets a password change revoke tokens issued before it (see app/auth.py);
+    # jti keeps two logins in the same second from sharing a token a logout revokes
+    to_encode = {"sub": username, "role": role, "iat": now, "jti": uuid4().hex}
 
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
 
     to_encode.update({"exp": expire})
 
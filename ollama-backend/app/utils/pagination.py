@@ -0,0 +1,79 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, List, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response
+from fastapi.responses import StreamingResponse
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+EXPORT_BATCH_SIZE = 500
+
+
+def encode_cursor(doc: dict, field: str) -> str:
+    value = "" if field == "_id" else doc[field].isoformat()
+    return base64.urlsafe_b64encode(f"{value}|{doc['_id']}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, field: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        value, _, oid = raw.partition("|")
+        return (None if field == "_id" else datetime.fromisoformat(value)), ObjectId(oid)
+    except (ValueError, InvalidId, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(query: dict, field: str, cursor: Optional[str]) -> dict:
+    """Narrow `query` to documents after `cursor` in (field, _id) descending order."""
+    if not cursor:
+        return query
+    value, oid = decode_cursor(cursor, field)
+    if field == "_id":
+        keyset = {"_id": {"$lt": oid}}
+    else:
+        keyset = {"$or": [{field: {"$lt": value}}, {field: value, "_id": {"$lt": oid}}]}
+    return {"$and": [query, keyset]} if query else keyset
+
+
+async def page(
+    collection, query: dict, field: str, projection: dict, limit: int, cursor: Optional[str], response: Response
+) -> List[dict]:
+    """One page of newest-first documents; the next page's cursor goes in the X-Next-Cursor header.
+
+    Keyset pagination costs the same on page 1000 as on page 1, and ties on
+    `field` are broken by _id, so no document is skipped or repeated.
+    """
+    sort = [("_id", -1)] if field == "_id" else [(field, -1), ("_id", -1)]
+    docs = await collection.find(after_cursor(query, field, cursor), projection) \
+        .sort(sort).limit(limit + 1).to_list(length=limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1], field)
+    return docs
+
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def json_export(cursor, serialize: Callable[[dict], dict], filename: str) -> StreamingResponse:
+    """Stream a Motor cursor as one JSON array without holding the result set in memory."""
+
+    async def body():
+        yield "["
+        first = True
+        async for doc in cursor.batch_size(EXPORT_BATCH_SIZE):
+            yield ("" if first else ",") + json.dumps(serialize(doc), default=_json_default, ensure_ascii=False)
+            first = False
+        yield "]"
+
+    return StreamingResponse(
+        body(), media_type="application/json", headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -1,9 +1,77 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.settings import settings
+
+# Pinning min and max to the default makes any other cost "needs update",
+# so existing hashes follow BCRYPT_ROUNDS up or down on the next login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+
+class PasswordHasher:
+    """bcrypt on a small dedicated thread pool, so a burst of logins never stalls the event loop.
+
+    bcrypt releases the GIL, so PASSWORD_HASH_WORKERS caps the CPU logins may
+    take. Past PASSWORD_HASH_MAX_PENDING queued calls, new ones get a 503
+    instead of piling up behind the pool.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self.counts = {"hashed": 0, "verified": 0, "rehashed": 0, "rejected": 0}
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= settings.PASSWORD_HASH_MAX_PENDING:
+            self.counts["rejected"] += 1
+            raise HTTPException(status_code=503, detail="Too many logins in progress, try again shortly", headers={"Retry-After": "1"})
+        self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        self.counts["hashed"] += 1
+        return await self._run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(matches, new hash) where the new hash is set when the stored one uses another cost."""
+        self.counts["verified"] += 1
+        valid, new_hash = await self._run(pwd_context.verify_and_update, password, hashed)
+        if new_hash:
+            self.counts["rehashed"] += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {"pending": self._pending, "workers": settings.PASSWORD_HASH_WORKERS, **self.counts}
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+import numpy as np
+
+from app.admission import BACKGROUND, INTERACTIVE
+from app.db import db
+from app.ollama_client import ollama
+from app.settings import settings
+from app.utils.summarize import chunk_text, estimate_tokens
+
+try:
+    import hnswlib
+except ImportError:  # optional; exact search is used without it
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+Progress = Callable[[dict], Awaitable[None]]
+
+RAG_PROMPT = (
+    "Use the following excerpts from the user's uploaded files to answer the question. "
+    "If they are not relevant, answer from your own knowledge.\n\n"
+    "{context}\n\nQuestion: {question}"
+)
+
+
+def chat_scope(username: str, chat_id: str) -> str:
+    return f"chat:{username}:{chat_id}"
+
+
+def user_scope(username: str) -> str:
+    return f"user:{username}"
+
+
+def _scope_query(scope: str) -> dict:
+    kind, rest = scope.split(":", 1)
+    if kind == "chat":
+        # Chat ids are hex; a ":" can only belong to the username
+        username, chat_id = rest.rsplit(":", 1)
+        return {"user.username": username, "chat_id": chat_id}
+    return {"user.username": rest}
+
+
+def _slug(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()[:32]
+
+
+def _save_npy(path: str, array: np.ndarray):
+    tmp = f"{path}.{uuid4().hex}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def _save_json(path: str, data):
+    tmp = f"{path}.{uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _load_json(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@dataclass
+class Passage:
+    text: str
+    score: float
+    filename: str
+    original_filename: str
+    chunk: int
+
+
+class _LoadedScope:
+    def __init__(self, meta: dict, matrix: np.ndarray):
+        self.meta = meta
+        self.matrix = matrix  # read-only memmap, rows are unit vectors
+        self.ann = None
+        if hnswlib is not None and matrix.shape[0] >= settings.RAG_ANN_MIN_ROWS:
+            self.ann = hnswlib.Index(space="ip", dim=matrix.shape[1])
+            self.ann.init_index(max_elements=matrix.shape[0], ef_construction=200, M=16)
+            self.ann.add_items(np.asarray(matrix))
+
+    def top_k(self, vector: np.ndarray, k: int) -> List[tuple]:
+        k = min(k, self.matrix.shape[0])
+        if self.ann is not None:
+            self.ann.set_ef(max(64, k * 4))
+            labels, distances = self.ann.knn_query(vector, k=k)
+            # hnswlib's "ip" space reports 1 - dot product
+            return [(int(i), 1.0 - float(d)) for i, d in zip(labels[0], distances[0])]
+        scores = self.matrix @ vector
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(i), float(scores[i])) for i in best]
+
+
+class VectorStore:
+    """Chunk embeddings of uploaded files, searchable per user or per chat.
+
+    Embeddings are stored once per document content hash and embedding model
+    under RAG_INDEX_DIR/docs. Each scope (all of a user's files, or the files of
+    one chat) gets a concatenated matrix that searches open as a memory map,
+    so an index is never held in RAM twice and survives restarts. Large scopes
+    use an HNSW graph when hnswlib is installed.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._scopes: "OrderedDict[str, tuple]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _doc_paths(self, sha256: str) -> tuple:
+        base = os.path.join(self.root, "docs", _slug(settings.OLLAMA_EMBED_MODEL), sha256)
+        return f"{base}.npy", f"{base}.json"
+
+    def _scope_meta_path(self, scope: str) -> str:
+        return os.path.join(self.root, "scopes", f"{_slug(scope)}.json")
+
+    def has_document(self, sha256: str) -> bool:
+        return all(os.path.exists(p) for p in self._doc_paths(sha256))
+
+    async def _embed(self, chunks: List[str], username: str, priority: int, progress: Progress = None) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(chunks), settings.RAG_EMBED_BATCH):
+            batch = chunks[start:start + settings.RAG_EMBED_BATCH]
+            vectors.extend(await ollama.embed(batch, user=username, priority=priority))
+            if progress:
+                await progress({"event": "embedding", "completed": start + len(batch), "total": len(chunks)})
+        matrix = np.asarray(vectors, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        return matrix
+
+    async def ingest(self, file_doc: dict, text: str, username: str, progress: Progress = None) -> int:
+        sha256 = file_doc["sha256"]
+        if self.has_document(sha256):
+            chunks = len(await asyncio.to_thread(_load_json, self._doc_paths(sha256)[1]))
+        else:
+            pieces = chunk_text(text, settings.RAG_CHUNK_TOKENS)
+            if not pieces:
+                raise ValueError("Extracted content is empty.")
+            matrix = await self._embed(pieces, username, BACKGROUND, progress)
+            npy_path, json_path = self._doc_paths(sha256)
+            os.makedirs(os.path.dirname(npy_path), exist_ok=True)
+            # Vectors first: a document only counts as indexed once its chunk texts exist
+            await asyncio.to_thread(_save_npy, npy_path, matrix)
+            await asyncio.to_thread(_save_json, json_path, pieces)
+            chunks = len(pieces)
+
+        await db.files.update_one(
+            {"_id": file_doc["_id"]},
+            {"$set": {"rag": {"model": settings.OLLAMA_EMBED_MODEL, "chunks": chunks, "indexed_at": datetime.utcnow()}}},
+        )
+        await self.refresh(file_doc)
+        return chunks
+
+    def _scopes_of(self, file_doc: dict) -> List[str]:
+        username = file_doc["user"]["username"]
+        scopes = [user_scope(username)]
+        if file_doc.get("chat_id"):
+            scopes.append(chat_scope(username, file_doc["chat_id"]))
+        return scopes
+
+    async def refresh(self, file_doc: dict):
+        for scope in self._scopes_of(file_doc):
+            await self.rebuild(scope)
+
+    async def rebuild(self, scope: str):
+        lock = self._locks.setdefault(scope, asyncio.Lock())
+        async with lock:
+            files = await db.files.find(
+                _scope_query(scope), {"stored_filename": 1, "original_filename": 1, "sha256": 1}
+            ).sort("uploaded_at", 1).to_list(length=None)
+            files = [f for f in files if f.get("sha256") and self.has_document(f["sha256"])]
+            await asyncio.to_thread(self._write_scope, scope, files)
+            self._scopes.pop(scope, None)
+
+    def _write_scope(self, scope: str, files: List[dict]):
+        meta_path = self._scope_meta_path(scope)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        old_matrix = None
+        if os.path.exists(meta_path):
+            old_matrix = _load_json(meta_path).get("matrix")
+
+        entries, rows, matrices = [], [], []
+        for f in files:
+            matrix = np.load(self._doc_paths(f["sha256"])[0], mmap_mode="r")
+            entries.append({"filename": f["stored_filename"], "original_filename": f["original_filename"], "sha256": f["sha256"]})
+            rows.extend([len(entries) - 1, chunk] for chunk in range(matrix.shape[0]))
+            matrices.append(matrix)
+
+        if not matrices:
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+        else:
+            # A fresh matrix file per rebuild so open memory maps stay valid
+            matrix_name = f"{_slug(scope)}-{uuid4().hex[:8]}.npy"
+            _save_npy(os.path.join(os.path.dirname(meta_path), matrix_name), np.concatenate(matrices))
+            _save_json(meta_path, {"scope": scope, "model": settings.OLLAMA_EMBED_MODEL, "matrix": matrix_name, "files": entries, "rows": rows})
+        if old_matrix:
+            try:
+                os.remove(os.path.join(os.path.dirname(meta_path), old_matrix))
+            except FileNotFoundError:
+                pass
+
+    async def remove(self, file_doc: dict):
+        """Drop a deleted upload from its scopes, and its vectors once no upload shares the content."""
+        await self.refresh(file_doc)
+        sha256 = file_doc.get("sha256")
+        if sha256 and not await db.files.count_documents({"sha256": sha256}, limit=1):
+            for path in self._doc_paths(sha256):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _open(self, scope: str) -> Optional[_LoadedScope]:
+        meta_path = self._scope_meta_path(scope)
+        try:
+            mtime = os.path.getmtime(meta_path)
+        except FileNotFoundError:
+            self._scopes.pop(scope, None)
+            return None
+        cached = self._scopes.get(scope)
+        if cached and cached[0] == mtime:
+            self._scopes.move_to_end(scope)
+            return cached[1]
+
+        meta = _load_json(meta_path)
+        if meta["model"] != settings.OLLAMA_EMBED_MODEL:
+            return None  # built with another embedding model; re-ingest to use it
+        try:
+            matrix = np.load(os.path.join(os.path.dirname(meta_path), meta["matrix"]), mmap_mode="r")
+        except FileNotFoundError:
+            return None  # lost a race with a rebuild; the next search sees the new matrix
+        loaded = _LoadedScope(meta, matrix)
+        self._scopes[scope] = (mtime, loaded)
+        while len(self._scopes) > settings.RAG_MAX_OPEN_SCOPES:
+            self._scopes.popitem(last=False)
+        return loaded
+
+    async def search(self, scope: str, query: str, username: str, k: int = None) -> List[Passage]:
+        loaded = await asyncio.to_thread(self._open, scope)
+        if loaded is None:
+            return []
+
+        vector = np.asarray((await ollama.embed([query], user=username, priority=INTERACTIVE))[0], dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        hits = await asyncio.to_thread(loaded.top_k, vector, k or settings.RAG_TOP_K)
+
+        passages, texts = [], {}
+        for row, score in hits:
+            if score < settings.RAG_MIN_SCORE:
+                continue
+            file_index, chunk = loaded.meta["rows"][row]
+            entry = loaded.meta["files"][file_index]
+            if entry["sha256"] not in texts:
+                try:
+                    texts[entry["sha256"]] = await asyncio.to_thread(_load_json, self._doc_paths(entry["sha256"])[1])
+                except FileNotFoundError:
+                    continue
+            passages.append(Passage(
+                text=texts[entry["sha256"]][chunk],
+                score=score,
+                filename=entry["filename"],
+                original_filename=entry["original_filename"],
+                chunk=chunk,
+            ))
+        return passages
+
+
+def build_prompt(question: str, passages: List[Passage]) -> str:
+    if not passages:
+        return question
+    sections, budget = [], settings.RAG_MAX_CONTEXT_TOKENS
+    for i, p in enumerate(passages, 1):
+        section = f"[{i}] {p.original_filename}\n{p.text}"
+        budget -= estimate_tokens(section)
+        if budget < 0 and sections:
+            break
+        sections.append(section)
+    return RAG_PROMPT.format(context="\n\n".join(sections), question=question)
+
+
+vector_store = VectorStore(settings.RAG_INDEX_DIR)
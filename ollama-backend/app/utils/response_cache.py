@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+from pymongo.errors import PyMongoError
+
+from app.db import db
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+Embed = Callable[[List[str]], Awaitable[List[List[float]]]]
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.split())
+
+
+@dataclass
+class CacheLookup:
+    key: str
+    namespace: str
+    text: Optional[str] = None
+    embedding: Optional[np.ndarray] = None
+
+
+class _VectorTier:
+    """Unit-normalised prompt embeddings for one model/options namespace."""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def add(self, key: str, vector: np.ndarray):
+        if self.matrix.shape[0] and self.matrix.shape[1] != vector.shape[0]:
+            return  # embedding model changed dimensions; ignore stale vectors
+        self.matrix = np.vstack([self.matrix.reshape(-1, vector.shape[0]), vector[None, :]])
+        self.keys.append(key)
+        overflow = len(self.keys) - settings.RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES
+        if overflow > 0:
+            self.keys = self.keys[overflow:]
+            self.matrix = self.matrix[overflow:]
+
+    def nearest(self, vector: np.ndarray) -> Optional[tuple]:
+        if not self.keys or self.matrix.shape[1] != vector.shape[0]:
+            return None
+        scores = self.matrix @ vector
+        best = int(np.argmax(scores))
+        return self.keys[best], float(scores[best])
+
+
+class ResponseCache:
+    """Cache of Ollama responses keyed by (model, normalized prompt, options).
+
+    Lookups try an exact in-memory LRU, then the `response_cache` collection
+    (expired by a TTL index), then, for callers that opt in, the nearest
+    earlier prompt by embedding cosine similarity.
+    """
+
+    def __init__(self):
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._vectors: Dict[str, _VectorTier] = {}
+        self._warmed = set()
+        self.counts: Counter = Counter()
+
+    def _keys(self, model: str, prompt: str, options: dict) -> tuple:
+        namespace = hashlib.sha256(json.dumps({"model": model, "options": options}, sort_keys=True).encode()).hexdigest()
+        key = hashlib.sha256(f"{namespace}:{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+        return key, namespace
+
+    def _remember(self, key: str, text: str):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > settings.RESPONSE_CACHE_MAX_ENTRIES:
+            self._memory.popitem(last=False)
+
+    async def _load(self, key: str) -> Optional[str]:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        doc = await db.response_cache.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}}, {"response": 1})
+        if doc is None:
+            return None
+        self._remember(key, doc["response"])
+        return doc["response"]
+
+    async def _warm(self, namespace: str):
+        # Seed the similarity tier from Mongo once per namespace
+        self._warmed.add(namespace)
+        tier = self._vectors.setdefault(namespace, _VectorTier())
+        cursor = db.response_cache.find(
+            {"namespace": namespace, "embedding": {"$exists": True}, "expires_at": {"$gt": datetime.utcnow()}},
+            {"embedding": 1},
+        ).sort("created_at", -1).limit(settings.RESPONSE_CACHE_SEMANTIC_MAX_ENTRIES)
+        docs = await cursor.to_list(length=None)
+        for doc in reversed(docs):
+            tier.add(doc["_id"], np.asarray(doc["embedding"], dtype=np.float32))
+
+    async def get(
+        self, model: str, prompt: str, options: dict, semantic: bool = False, embed: Embed = None
+    ) -> CacheLookup:
+        key, namespace = self._keys(model, prompt, options)
+        lookup = CacheLookup(key=key, namespace=namespace)
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return lookup
+
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.counts["memory_hits"] += 1
+            lookup.text = self._memory[key]
+            return lookup
+
+        try:
+            lookup.text = await self._load(key)
+        except PyMongoError as e:
+            logger.warning("Response cache lookup failed: %s", e)
+        if lookup.text is not None:
+            self.counts["mongo_hits"] += 1
+            return lookup
+
+        if semantic and settings.RESPONSE_CACHE_SEMANTIC and embed is not None:
+            try:
+                if namespace not in self._warmed:
+                    await self._warm(namespace)
+                vector = np.asarray((await embed([normalize_prompt(prompt)]))[0], dtype=np.float32)
+                vector /= np.linalg.norm(vector) or 1.0
+                lookup.embedding = vector
+                match = self._vectors[namespace].nearest(vector)
+                if match and match[1] >= settings.RESPONSE_CACHE_SEMANTIC_THRESHOLD:
+                    lookup.text = await self._load(match[0])
+                    if lookup.text is not None:
+                        self.counts["semantic_hits"] += 1
+                        return lookup
+            except Exception as e:
+                # The similarity tier is best effort; an embedding outage is just a miss
+                logger.warning("Semantic cache lookup failed: %s", e)
+
+        self.counts["misses"] += 1
+        return lookup
+
+    async def put(self, lookup: CacheLookup, text: str):
+        if not settings.RESPONSE_CACHE_ENABLED or not text.strip():
+            return
+        self._remember(lookup.key, text)
+        now = datetime.utcnow()
+        doc = {
+            "namespace": lookup.namespace,
+            "response": text,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=settings.RESPONSE_CACHE_TTL_SECONDS),
+        }
+        if lookup.embedding is not None:
+            doc["embedding"] = lookup.embedding.tolist()
+            self._vectors.setdefault(lookup.namespace, _VectorTier()).add(lookup.key, lookup.embedding)
+        try:
+            await db.response_cache.update_one({"_id": lookup.key}, {"$set": doc}, upsert=True)
+        except PyMongoError as e:
+            logger.warning("Response cache write failed: %s", e)
+
+    def stats(self) -> dict:
+        hits = self.counts["memory_hits"] + self.counts["mongo_hits"] + self.counts["semantic_hits"]
+        total = hits + self.counts["misses"]
+        return {
+            **{k: self.counts[k] for k in ("memory_hits", "mongo_hits", "semantic_hits", "misses")},
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+def replay_chunks(text: str) -> List[str]:
+    # Split a cached answer into word-sized pieces so it streams like a live one
+    pieces, current = [], ""
+    for char in text:
+        current += char
+        if char.isspace():
+            pieces.append(current)
+            current = ""
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+response_cache = ResponseCache()
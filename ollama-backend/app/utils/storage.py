@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncContextManager, AsyncIterator, Optional
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+BLOB_PREFIX = "blobs"
+TTS_PREFIX = "tts"
+
+
+class Storage(ABC):
+    """Where uploaded documents and generated audio live, addressed by key ("blobs/ab/<sha256>").
+
+    Work in progress (upload sessions, scratch files for libraries that need
+    a path) always stays under STORAGE_TEMP_DIR on local disk; finished
+    files are handed over with save_file.
+    """
+
+    @abstractmethod
+    async def save_file(self, key: str, local_path: str):
+        """Move a finished local file into storage."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def size(self, key: str) -> Optional[int]:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def read(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Stream bytes start..end (inclusive), like an HTTP Range; FileNotFoundError if the key is missing."""
+
+    @abstractmethod
+    def list(self, prefix: str) -> AsyncIterator[tuple]:
+        """Yield (key, size, modified) for every object under prefix."""
+
+    @abstractmethod
+    def local_path(self, key: str, suffix: str = "") -> AsyncContextManager[str]:
+        """A filesystem path holding the object, for libraries that cannot read streams."""
+
+
+def temp_path(suffix: str = "") -> str:
+    os.makedirs(settings.STORAGE_TEMP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=settings.STORAGE_TEMP_DIR)
+    os.close(fd)
+    return path
+
+
+def remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    async def save_file(self, key: str, local_path: str):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # shutil.move falls back to copy + delete when the temp dir is on another filesystem
+        await asyncio.to_thread(shutil.move, local_path, path)
+
+    async def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    async def size(self, key: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self._path(key))
+        except FileNotFoundError:
+            return None
+
+    async def delete(self, key: str):
+        remove_quietly(self._path(key))
+
+    async def read(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self._path(key), "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = await asyncio.to_thread(f.read, CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def list(self, prefix: str) -> AsyncIterator[tuple]:
+        base = self._path(prefix) if prefix else self.root
+        entries = []
+
+        def walk():
+            for directory, _, files in os.walk(base):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+                    entries.append((os.path.relpath(path, self.root).replace(os.sep, "/"), stat.st_size, modified))
+
+        await asyncio.to_thread(walk)
+        for entry in entries:
+            yield entry
+
+    @asynccontextmanager
+    async def local_path(self, key: str, suffix: str = "") -> AsyncIterator[str]:
+        yield self._path(key)
+
+
+class S3Storage(Storage):
+    """Any S3-compatible object store (AWS, MinIO, Ceph...); boto3 calls run in threads."""
+
+    def __init__(self):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 needs the boto3 package")
+        self.bucket = settings.S3_BUCKET
+        self.prefix = settings.S3_PREFIX.strip("/")
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL or None,
+            region_name=settings.S3_REGION or None,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID or None,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY or None,
+        )
+        self._missing = self.client.exceptions.ClientError
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    async def save_file(self, key: str, local_path: str):
+        # upload_file streams from disk and switches to multipart for large files
+        await asyncio.to_thread(self.client.upload_file, local_path, self.bucket, self._key(key))
+        remove_quietly(local_path)
+
+    async def size(self, key: str) -> Optional[int]:
+        try:
+            head = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self._key(key))
+        except self._missing as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return head["ContentLength"]
+
+    async def exists(self, key: str) -> bool:
+        return await self.size(key) is not None
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self._key(key))
+
+    async def read(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        kwargs = {"Bucket": self.bucket, "Key": self._key(key)}
+        if start or end is not None:
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        try:
+            body = (await asyncio.to_thread(self.client.get_object, **kwargs))["Body"]
+        except self._missing as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(key) from e
+            raise
+        try:
+            while chunk := await asyncio.to_thread(body.read, CHUNK_SIZE):
+                yield chunk
+        finally:
+            body.close()
+
+    async def list(self, prefix: str) -> AsyncIterator[tuple]:
+        paginator = self.client.get_paginator("list_objects_v2")
+        pages = await asyncio.to_thread(lambda: list(paginator.paginate(Bucket=self.bucket, Prefix=self._key(prefix))))
+        strip = len(self._key("")) if self.prefix else 0
+        for page in pages:
+            for obj in page.get("Contents", []):
+                yield obj["Key"][strip:], obj["Size"], obj["LastModified"]
+
+    @asynccontextmanager
+    async def local_path(self, key: str, suffix: str = "") -> AsyncIterator[str]:
+        path = temp_path(suffix)
+        try:
+            await asyncio.to_thread(self.client.download_file, self.bucket, self._key(key), path)
+            yield path
+        finally:
+            remove_quietly(path)
+
+
+def create_storage() -> Storage:
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage()
+    if settings.STORAGE_BACKEND != "local":
+        raise RuntimeError(f"Unknown STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
+    return LocalStorage(settings.STORAGE_LOCAL_DIR)
+
+
+storage = create_storage()
@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+import numpy as np
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Audio everywhere in here is 16-bit little-endian mono PCM
+SAMPLE_WIDTH = 2
+
+
+class STTError(Exception):
+    """The speech engine is missing or failed."""
+
+
+class STTBusy(STTError):
+    """Every recognition slot is taken."""
+
+
+class Recognizer(ABC):
+    """One utterance stream. Only ever called from one worker thread at a time."""
+
+    @abstractmethod
+    def accept(self, pcm: bytes) -> Optional[dict]:
+        """Feed audio; may return {"type": "partial" | "final", "text": ...}."""
+
+    @abstractmethod
+    def finish(self) -> str:
+        """Flush and return the text of the last, unfinished utterance."""
+
+
+class STTEngine(ABC):
+    name = ""
+
+    def load(self):
+        """Load models; runs once, in a worker thread."""
+
+    @abstractmethod
+    def recognizer(self, sample_rate: int, live: bool = True) -> Recognizer:
+        """live=False for whole files, where partial transcripts are not wanted."""
+
+
+class _VoskRecognizer(Recognizer):
+    def __init__(self, recognizer):
+        self.rec = recognizer
+
+    def accept(self, pcm: bytes) -> Optional[dict]:
+        if self.rec.AcceptWaveform(pcm):
+            return {"type": "final", "text": json.loads(self.rec.Result()).get("text", "")}
+        return {"type": "partial", "text": json.loads(self.rec.PartialResult()).get("partial", "")}
+
+    def finish(self) -> str:
+        return json.loads(self.rec.FinalResult()).get("text", "")
+
+
+class VoskEngine(STTEngine):
+    """Offline Kaldi models (https://alphacephei.com/vosk/models); truly incremental."""
+
+    name = "vosk"
+
+    def __init__(self):
+        self.model = None
+
+    def load(self):
+        try:
+            from vosk import Model, SetLogLevel
+        except ImportError:
+            raise STTError("STT_ENGINE=vosk needs the vosk package")
+        if not settings.STT_VOSK_MODEL:
+            raise STTError("STT_VOSK_MODEL is not set")
+        SetLogLevel(-1)
+        self.model = Model(settings.STT_VOSK_MODEL)
+
+    def recognizer(self, sample_rate: int, live: bool = True) -> Recognizer:
+        from vosk import KaldiRecognizer
+
+        return _VoskRecognizer(KaldiRecognizer(self.model, sample_rate))
+
+
+def _to_float16k(pcm: bytes, sample_rate: int) -> np.ndarray:
+    audio = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+    if sample_rate != 16000 and len(audio):
+        positions = np.arange(0, len(audio), sample_rate / 16000)
+        audio = np.interp(positions, np.arange(len(audio)), audio).astype(np.float32)
+    return audio
+
+
+class _WhisperRecognizer(Recognizer):
+    # Whisper has no incremental mode; partials re-run the model over the
+    # audio so far every STT_PARTIAL_INTERVAL seconds of new audio
+    def __init__(self, model, sample_rate: int, live: bool):
+        self.model = model
+        self.sample_rate = sample_rate
+        self.live = live
+        self.buffer = bytearray()
+        self.decoded_at = 0
+
+    def _transcribe(self) -> str:
+        segments = self.model.transcribe(_to_float16k(bytes(self.buffer), self.sample_rate))
+        return " ".join(s.text.strip() for s in segments).strip()
+
+    def accept(self, pcm: bytes) -> Optional[dict]:
+        self.buffer += pcm
+        if not self.live or len(self.buffer) - self.decoded_at < settings.STT_PARTIAL_INTERVAL * self.sample_rate * SAMPLE_WIDTH:
+            return None
+        self.decoded_at = len(self.buffer)
+        return {"type": "partial", "text": self._transcribe()}
+
+    def finish(self) -> str:
+        return self._transcribe() if self.buffer else ""
+
+
+class WhisperEngine(STTEngine):
+    """whisper.cpp on CPU through pywhispercpp; STT_WHISPER_MODEL is a model name or .bin path."""
+
+    name = "whisper"
+
+    def __init__(self):
+        self.model = None
+
+    def load(self):
+        try:
+            from pywhispercpp.model import Model
+        except ImportError:
+            raise STTError("STT_ENGINE=whisper needs the pywhispercpp package")
+        self.model = Model(settings.STT_WHISPER_MODEL, n_threads=settings.STT_THREADS_PER_WORKER, print_progress=False)
+
+    def recognizer(self, sample_rate: int, live: bool = True) -> Recognizer:
+        return _WhisperRecognizer(self.model, sample_rate, live)
+
+
+class _GoogleRecognizer(Recognizer):
+    def __init__(self, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.buffer = bytearray()
+
+    def accept(self, pcm: bytes) -> Optional[dict]:
+        self.buffer += pcm
+        return None
+
+    def finish(self) -> str:
+        import speech_recognition as sr
+
+        if not self.buffer:
+            return ""
+        try:
+            return sr.Recognizer().recognize_google(sr.AudioData(bytes(self.buffer), self.sample_rate, SAMPLE_WIDTH))
+        except sr.UnknownValueError:
+            return ""
+        except sr.RequestError as e:
+            raise STTError(str(e))
+
+
+class GoogleEngine(STTEngine):
+    """The previous online recognizer; no partials, everything is sent at the end."""
+
+    name = "google"
+
+    def recognizer(self, sample_rate: int, live: bool = True) -> Recognizer:
+        return _GoogleRecognizer(sample_rate)
+
+
+ENGINES = {engine.name: engine for engine in (VoskEngine, WhisperEngine, GoogleEngine)}
+
+
+class RecognitionSession:
+    def __init__(self, service: "SpeechToText", recognizer: Recognizer):
+        self._service = service
+        self._recognizer = recognizer
+        self.finals: List[str] = []
+
+    async def accept(self, pcm: bytes) -> Optional[dict]:
+        result = await self._service.run(self._recognizer.accept, pcm)
+        if result and result["type"] == "final" and result["text"]:
+            self.finals.append(result["text"])
+        return result
+
+    async def finish(self) -> str:
+        last = await self._service.run(self._recognizer.finish)
+        if last:
+            self.finals.append(last)
+        return " ".join(self.finals)
+
+
+class SpeechToText:
+    """Recognition on a bounded thread pool; engines release the GIL while decoding.
+
+    At most STT_MAX_SESSIONS recognitions (file uploads and live streams)
+    run at once; further callers get STTBusy instead of queueing.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._engine: Optional[STTEngine] = None
+        self._load_lock = threading.Lock()
+        self._sessions = 0
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=settings.STT_WORKERS, thread_name_prefix="stt")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _engine_ready(self) -> STTEngine:
+        with self._load_lock:
+            if self._engine is None:
+                if settings.STT_ENGINE not in ENGINES:
+                    raise STTError(f"Unknown STT_ENGINE: {settings.STT_ENGINE}")
+                engine = ENGINES[settings.STT_ENGINE]()
+                engine.load()
+                self._engine = engine
+            return self._engine
+
+    async def run(self, fn, *args):
+        self.start()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    @asynccontextmanager
+    async def session(self, sample_rate: int, live: bool = True) -> AsyncIterator[RecognitionSession]:
+        if self._sessions >= settings.STT_MAX_SESSIONS:
+            raise STTBusy("Speech recognition is busy, please retry shortly")
+        self._sessions += 1
+        try:
+            engine = await self.run(self._engine_ready)
+            recognizer = await self.run(engine.recognizer, sample_rate, live)
+            yield RecognitionSession(self, recognizer)
+        finally:
+            self._sessions -= 1
+
+    async def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        async with self.session(sample_rate, live=False) as session:
+            step = sample_rate * SAMPLE_WIDTH  # one second per call keeps partial work small
+            for start in range(0, len(pcm), step):
+                await session.accept(pcm[start:start + step])
+            return await session.finish()
+
+    def stats(self) -> dict:
+        return {"engine": settings.STT_ENGINE, "sessions": self._sessions, "max_sessions": settings.STT_MAX_SESSIONS}
+
+
+stt = SpeechToText()
@@ -0,0 +1,205 @@
+import asyncio
+import hashlib
+import logging
+import math
+import re
+from datetime import datetime
+from typing import AsyncIterator, Dict, List
+
+from app.admission import BATCH
+from app.auth import owner
+from app.db import db
+from app.ollama_client import ollama
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough English average; good enough to keep chunks inside the model context
+CHARS_PER_TOKEN = 4
+
+DOCUMENT_PROMPT = "Please summarize the following document:\n\n{text}"
+CHUNK_PROMPT = (
+    "The following is one section of a longer document. "
+    "Summarize the key points of this section:\n\n{text}"
+)
+REDUCE_PROMPT = (
+    "The following are summaries of consecutive sections of one document. "
+    "Combine them into a single, coherent summary of the whole document:\n\n{text}"
+)
+
+
+async def save_summary(user: dict, file_doc: dict, summary: str, chunks: int):
+    await db.file_summaries.insert_one({
+        "user": owner(user),
+        "filename": file_doc["stored_filename"],
+        "original_filename": file_doc["original_filename"],
+        "summary": summary,
+        "chunks": chunks,
+        "processed_by": settings.OLLAMA_MODEL,
+        "created_at": datetime.utcnow()
+    })
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _split_long(paragraph: str, max_chars: int) -> List[str]:
+    # Break an oversized paragraph at sentence ends, then hard-wrap what is left
+    pieces, current = [], ""
+    for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks, current = [], ""
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for piece in _split_long(paragraph, max_chars) if len(paragraph) > max_chars else [paragraph]:
+            if current and len(current) + len(piece) + 2 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _summarize(prompt: str, username: str, priority: int) -> str:
+    data = await ollama.generate(
+        prompt, timeout=settings.OLLAMA_SUMMARIZE_TIMEOUT, user=username, priority=priority, cache=True
+    )
+    return data.get("response", "")
+
+
+async def _summarize_stream(prompt: str, username: str, priority: int) -> AsyncIterator[dict]:
+    async for chunk in ollama.stream_generate(
+        prompt, timeout=settings.OLLAMA_SUMMARIZE_TIMEOUT, user=username, priority=priority, cache=True
+    ):
+        yield {"event": "token", "text": chunk}
+
+
+async def _fold(partials: List[str], username: str, priority: int) -> str:
+    # Combine partial summaries until they fit into a single reduce prompt. Each pass
+    # should roughly halve the text; cap the passes and stop as soon as one fails to
+    # shrink it, so a model that echoes its input cannot keep us calling Ollama forever.
+    combined = "\n\n".join(partials)
+    budget = settings.SUMMARY_CHUNK_TOKENS
+    max_passes = math.ceil(math.log2(max(2, estimate_tokens(combined) / budget))) + 2
+    for _ in range(max_passes):
+        if estimate_tokens(combined) <= budget:
+            return combined
+        groups = chunk_text(combined, budget)
+        semaphore = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+
+        async def fold(group: str) -> str:
+            async with semaphore:
+                return await _summarize(REDUCE_PROMPT.format(text=group), username, priority)
+
+        folded = "\n\n".join(await asyncio.gather(*(fold(g) for g in groups)))
+        if len(folded) >= len(combined):
+            logger.warning("Reduce pass did not shorten the summaries (%d -> %d chars); truncating", len(combined), len(folded))
+            break
+        combined = folded
+    if estimate_tokens(combined) > budget:
+        combined = combined[:(budget - 1) * CHARS_PER_TOKEN]
+    return combined
+
+
+async def _final(prompt: str, stream: bool, username: str, priority: int) -> AsyncIterator[dict]:
+    if not stream:
+        yield {"event": "summary", "summary": await _summarize(prompt, username, priority)}
+        return
+    summary = ""
+    async for event in _summarize_stream(prompt, username, priority):
+        summary += event["text"]
+        yield event
+    yield {"event": "summary", "summary": summary}
+
+
+async def summarize_document(
+    text: str, user: dict, file_doc: dict, stream: bool = False, priority: int = BATCH
+) -> AsyncIterator[dict]:
+    """Map-reduce summary of a document, yielding progress events.
+
+    Chunk summaries are stored in `file_summaries` with `partial: True` and
+    keyed by chunk hash, so a re-run only asks Ollama for missing chunks.
+    With `stream`, the final generation is also yielded as "token" events.
+    The last event is {"event": "summary", ...}.
+    """
+    chunks = chunk_text(text, settings.SUMMARY_CHUNK_TOKENS)
+    total = len(chunks)
+    username = user["username"]
+
+    if total <= 1:
+        yield {"event": "progress", "done": 0, "total": 1}
+        async for event in _final(DOCUMENT_PROMPT.format(text=chunks[0] if chunks else text), stream, username, priority):
+            if event["event"] == "summary":
+                event["chunks"] = 1
+            yield event
+        return
+
+    hashes = [hashlib.sha256(chunk.encode("utf-8")).hexdigest() for chunk in chunks]
+    partials: Dict[str, str] = {}
+    async for doc in db.file_summaries.find(
+        {"partial": True, "chunk_sha256": {"$in": hashes}, "processed_by": settings.OLLAMA_MODEL},
+        {"chunk_sha256": 1, "summary": 1},
+    ):
+        partials[doc["chunk_sha256"]] = doc["summary"]
+
+    done = sum(1 for h in hashes if h in partials)
+    yield {"event": "progress", "done": done, "total": total}
+
+    semaphore = asyncio.Semaphore(settings.SUMMARY_CONCURRENCY)
+
+    async def summarize_chunk(index: int) -> None:
+        async with semaphore:
+            summary = await _summarize(CHUNK_PROMPT.format(text=chunks[index]), username, priority)
+        partials[hashes[index]] = summary
+        await db.file_summaries.insert_one({
+            "user": owner(user),
+            "filename": file_doc["stored_filename"],
+            "original_filename": file_doc["original_filename"],
+            "partial": True,
+            "chunk_sha256": hashes[index],
+            "chunk_index": index,
+            "chunk_count": total,
+            "summary": summary,
+            "processed_by": settings.OLLAMA_MODEL,
+            "created_at": datetime.utcnow(),
+        })
+
+    missing = {i for i, h in enumerate(hashes) if h not in partials}
+    # The same chunk text can repeat inside a document; summarize it once
+    unique = {hashes[i]: i for i in sorted(missing, reverse=True)}
+    tasks = [asyncio.create_task(summarize_chunk(i)) for i in unique.values()]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            await finished
+            done = sum(1 for h in hashes if h in partials)
+            yield {"event": "progress", "done": done, "total": total}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield {"event": "reducing", "total": total}
+    combined = await _fold([partials[h] for h in hashes], username, priority)
+    async for event in _final(REDUCE_PROMPT.format(text=combined), stream, username, priority):
+        if event["event"] == "summary":
+            event["chunks"] = total
+        yield event
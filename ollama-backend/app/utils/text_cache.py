@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.db import db
+from app.settings import settings
+from app.utils.extraction import extraction_pool
+from app.utils.uploads import local_file
+
+# Mongo documents are capped at 16 MB; bigger texts only live in memory
+MAX_PERSISTED_BYTES = 15 * 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class ExtractedTextCache:
+    """Extracted document text keyed by content hash.
+
+    A bounded in-memory LRU sits in front of the `extracted_texts` collection,
+    and concurrent requests for the same hash share a single extraction.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._size = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    def _remember(self, sha256: str, text: str):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if sha256 in self._entries:
+            self._entries.move_to_end(sha256)
+            return
+        self._entries[sha256] = text
+        self._size += size
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted.encode("utf-8"))
+
+    def _forget(self, sha256: str):
+        text = self._entries.pop(sha256, None)
+        if text is not None:
+            self._size -= len(text.encode("utf-8"))
+
+    async def get(self, sha256: str) -> Optional[str]:
+        if sha256 in self._entries:
+            self._entries.move_to_end(sha256)
+            return self._entries[sha256]
+
+        doc = await db.extracted_texts.find_one({"_id": sha256})
+        if doc is None:
+            return None
+        self._remember(sha256, doc["text"])
+        return doc["text"]
+
+    async def put(self, sha256: str, text: str):
+        self._remember(sha256, text)
+        if len(text.encode("utf-8")) <= MAX_PERSISTED_BYTES:
+            await db.extracted_texts.update_one(
+                {"_id": sha256},
+                {"$set": {"text": text, "created_at": datetime.utcnow()}},
+                upsert=True,
+            )
+
+    async def get_or_extract(self, sha256: str, extract: Callable[[], Awaitable[str]]) -> str:
+        text = await self.get(sha256)
+        if text is not None:
+            return text
+
+        if sha256 in self._in_flight:
+            return await asyncio.shield(self._in_flight[sha256])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[sha256] = future
+        try:
+            text = await extract()
+            await self.put(sha256, text)
+            future.set_result(text)
+            return text
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[sha256]
+
+    async def invalidate(self, sha256: str):
+        self._forget(sha256)
+        await db.extracted_texts.delete_one({"_id": sha256})
+
+
+text_cache = ExtractedTextCache(settings.TEXT_CACHE_MAX_BYTES)
+
+
+async def get_file_text(file_doc: dict) -> str:
+    # Extracted text is cached by content hash, so each document is parsed once
+    sha256 = file_doc.get("sha256")
+    if not sha256:
+        # Uploaded before hashes were recorded
+        sha256 = await asyncio.to_thread(file_sha256, file_doc["file_path"])
+        await db.files.update_one({"_id": file_doc["_id"]}, {"$set": {"sha256": sha256}})
+        file_doc["sha256"] = sha256
+
+    async def extract():
+        async with local_file(file_doc) as path:
+            return await extraction_pool.extract(path, os.path.splitext(file_doc["original_filename"])[1])
+
+    return await text_cache.get_or_extract(sha256, extract)
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from app.auth import owner
+from app.db import db
+from app.settings import settings
+
+TRANSLATED_LANGUAGE = "Kurdish"
+
+
+def translation_prompt(content: str) -> str:
+    return (
+        "You are a professional Kurdish (Sorani) translator. "
+        "Translate the following English document into fluent, formal Kurdish language. "
+        "Do not mix English words. "
+        "Keep sentences clear, formal, and properly structured.\n\n"
+        "Here is the text:\n\n"
+        f"{content[:3000]}"  # Limit long documents to 3000 chars
+    )
+
+
+async def save_translation(user: dict, file_doc: dict, translation: str):
+    await db.file_translations.insert_one({
+        "user": owner(user),
+        "filename": file_doc["stored_filename"],
+        "original_filename": file_doc["original_filename"],
+        "translation": translation,
+        "translated_language": TRANSLATED_LANGUAGE,
+        "processed_by": settings.OLLAMA_MODEL,
+        "created_at": datetime.utcnow()
+    })
@@ -0,0 +1,361 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import re
+import struct
+import subprocess
+import tempfile
+import wave
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.settings import settings
+from app.utils.storage import TTS_PREFIX, remove_quietly, storage, temp_path
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END = re.compile(r"(?<=[.!?؟。])\s+|\n+")
+# Very short pieces ("Hi.") sound choppy on their own; merge them with the next one
+MIN_SENTENCE_CHARS = 20
+
+
+class TTSError(Exception):
+    """The speech engine is missing or failed."""
+
+
+class TTSEngine(ABC):
+    name = ""
+    media_type = "audio/mpeg"
+    extension = "mp3"
+
+    def voice(self) -> str:
+        return ""
+
+    @abstractmethod
+    def synthesize(self, text: str) -> bytes:
+        ...
+
+
+class GTTSEngine(TTSEngine):
+    """Google Translate's TTS; needs network access."""
+
+    name = "gtts"
+
+    def voice(self) -> str:
+        return settings.TTS_LANGUAGE
+
+    def synthesize(self, text: str) -> bytes:
+        from gtts import gTTS
+        from gtts.tts import gTTSError
+
+        buffer = io.BytesIO()
+        try:
+            gTTS(text=text, lang=settings.TTS_LANGUAGE).write_to_fp(buffer)
+        except gTTSError as e:
+            raise TTSError(str(e))
+        return buffer.getvalue()
+
+
+class EspeakEngine(TTSEngine):
+    """Offline espeak-ng; text goes in on stdin, WAV comes out on stdout."""
+
+    name = "espeak"
+    media_type = "audio/wav"
+    extension = "wav"
+
+    def voice(self) -> str:
+        return settings.TTS_VOICE or settings.TTS_LANGUAGE
+
+    def synthesize(self, text: str) -> bytes:
+        try:
+            result = subprocess.run(
+                [settings.TTS_ESPEAK_BINARY, "--stdout", "-v", self.voice()],
+                input=text.encode("utf-8"), capture_output=True, check=True, timeout=60,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            raise TTSError(f"espeak failed: {e}")
+        return result.stdout
+
+
+class PiperEngine(TTSEngine):
+    """Offline piper neural voices; TTS_PIPER_MODEL points at the .onnx voice."""
+
+    name = "piper"
+    media_type = "audio/wav"
+    extension = "wav"
+
+    def voice(self) -> str:
+        return os.path.basename(settings.TTS_PIPER_MODEL)
+
+    def synthesize(self, text: str) -> bytes:
+        fd, path = tempfile.mkstemp(suffix=".wav")
+        os.close(fd)
+        try:
+            subprocess.run(
+                [settings.TTS_PIPER_BINARY, "--model", settings.TTS_PIPER_MODEL, "--output_file", path],
+                input=text.encode("utf-8"), capture_output=True, check=True, timeout=120,
+            )
+            with open(path, "rb") as f:
+                return f.read()
+        except (OSError, subprocess.SubprocessError) as e:
+            raise TTSError(f"piper failed: {e}")
+        finally:
+            os.remove(path)
+
+
+ENGINES = {engine.name: engine for engine in (GTTSEngine, EspeakEngine, PiperEngine)}
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences, pending = [], ""
+    for piece in SENTENCE_END.split(text):
+        piece = " ".join(piece.split())
+        if not piece:
+            continue
+        pending = f"{pending} {piece}" if pending else piece
+        if len(pending) >= MIN_SENTENCE_CHARS:
+            sentences.append(pending)
+            pending = ""
+    if pending:
+        sentences.append(pending)
+    return sentences
+
+
+class SentenceBuffer:
+    """Cuts streamed text (e.g. LLM tokens) into speakable sentences as soon as each one ends."""
+
+    MARKUP = re.compile(r"[*#`_]+")
+
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, text: str) -> List[str]:
+        self.pending += self.MARKUP.sub("", text)
+        pieces = SENTENCE_END.split(self.pending)
+        # The last piece may still be growing
+        complete, self.pending = pieces[:-1], pieces[-1]
+        sentences, carry = [], ""
+        for piece in complete:
+            piece = " ".join(piece.split())
+            if not piece:
+                continue
+            carry = f"{carry} {piece}" if carry else piece
+            if len(carry) >= MIN_SENTENCE_CHARS:
+                sentences.append(carry)
+                carry = ""
+        if carry:
+            # Too short to say alone; it goes out with the next sentence
+            self.pending = f"{carry} {self.pending.lstrip()}"
+        return sentences
+
+    def flush(self) -> List[str]:
+        rest, self.pending = " ".join(self.pending.split()), ""
+        return [rest] if rest else []
+
+
+def _wav_frames(data: bytes) -> tuple:
+    with wave.open(io.BytesIO(data)) as w:
+        return (w.getnchannels(), w.getsampwidth(), w.getframerate()), w.readframes(w.getnframes())
+
+
+def _wav_stream_header(channels: int, sampwidth: int, rate: int) -> bytes:
+    # Length fields are maxed out because the total is unknown while streaming
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, rate, rate * channels * sampwidth, channels * sampwidth, sampwidth * 8)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+class AudioCache:
+    """Synthesized sentences in storage under TTS_PREFIX, keyed by content hash and evicted LRU past a byte budget.
+
+    Objects are shared by every worker and host; each process keeps its own
+    in-memory index, built from storage.list on first use and ordered by write
+    time. A sentence another process synthesized is picked up on a miss.
+    Entries leave only by eviction; the storage sweep skips keys the cache owns.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "Optional[OrderedDict[str, int]]" = None
+        self._size = 0
+        self._loading: Optional[asyncio.Lock] = None
+        self.counts: Counter = Counter()
+
+    @staticmethod
+    def key(name: str) -> str:
+        return f"{TTS_PREFIX}/{name[:2]}/{name}"
+
+    @staticmethod
+    def owns(key: str) -> bool:
+        parts = key.split("/")
+        return len(parts) == 3 and parts[0] == TTS_PREFIX and len(parts[1]) == 2 and parts[2].startswith(parts[1])
+
+    async def _ensure_loaded(self):
+        if self._entries is not None:
+            return
+        if self._loading is None:
+            self._loading = asyncio.Lock()
+        async with self._loading:
+            if self._entries is not None:
+                return
+            found = [
+                (modified, key.rsplit("/", 1)[-1], size)
+                async for key, size, modified in storage.list(TTS_PREFIX)
+                if self.owns(key)
+            ]
+            self._entries = OrderedDict((name, size) for _, name, size in sorted(found))
+            self._size = sum(self._entries.values())
+        await self._evict()
+
+    def _add(self, name: str, size: int):
+        if name not in self._entries:
+            self._entries[name] = size
+            self._size += size
+
+    def _drop(self, name: str):
+        if name in self._entries:
+            self._size -= self._entries.pop(name)
+
+    async def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            await storage.delete(self.key(name))
+
+    async def get(self, name: str) -> Optional[bytes]:
+        await self._ensure_loaded()
+        if name not in self._entries:
+            size = await storage.size(self.key(name))
+            if size is None:
+                self.counts["misses"] += 1
+                return None
+            # Synthesized by another worker
+            self._add(name, size)
+        try:
+            data = b"".join([chunk async for chunk in storage.read(self.key(name))])
+        except FileNotFoundError:
+            # Evicted by another worker or swept
+            self._drop(name)
+            self.counts["misses"] += 1
+            return None
+        if name in self._entries:
+            self._entries.move_to_end(name)
+        self.counts["hits"] += 1
+        return data
+
+    async def put(self, name: str, data: bytes):
+        await self._ensure_loaded()
+        if len(data) > self.max_bytes or name in self._entries:
+            return
+        path = temp_path(os.path.splitext(name)[1])
+
+        def write():
+            with open(path, "wb") as f:
+                f.write(data)
+
+        try:
+            await asyncio.to_thread(write)
+            await storage.save_file(self.key(name), path)
+        finally:
+            remove_quietly(path)
+        self._add(name, len(data))
+        await self._evict()
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries or ()), "bytes": self._size, "max_bytes": self.max_bytes, **self.counts}
+
+
+class TextToSpeech:
+    """Sentence-by-sentence synthesis with a shared audio cache.
+
+    Sentences are synthesized concurrently (up to TTS_CONCURRENCY) but yielded
+    in order, so playback can start after the first sentence; identical
+    sentences requested at the same time are synthesized once.
+    """
+
+    def __init__(self):
+        self._engine: Optional[TTSEngine] = None
+        self._cache: Optional[AudioCache] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def engine(self) -> TTSEngine:
+        if self._engine is None:
+            if settings.TTS_ENGINE not in ENGINES:
+                raise TTSError(f"Unknown TTS_ENGINE: {settings.TTS_ENGINE}")
+            self._engine = ENGINES[settings.TTS_ENGINE]()
+        return self._engine
+
+    @property
+    def cache(self) -> AudioCache:
+        if self._cache is None:
+            self._cache = AudioCache(settings.TTS_CACHE_MAX_MB * 1024 * 1024)
+        return self._cache
+
+    def _name(self, sentence: str) -> str:
+        engine = self.engine
+        digest = hashlib.sha256(f"{engine.name}\0{engine.voice()}\0{sentence}".encode("utf-8")).hexdigest()
+        return f"{digest}.{engine.extension}"
+
+    async def synthesize(self, sentence: str) -> bytes:
+        """One sentence as a complete audio file in the engine's format."""
+        name = self._name(sentence)
+        data = await self.cache.get(name)
+        if data is not None:
+            return data
+        if name in self._in_flight:
+            return await asyncio.shield(self._in_flight[name])
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(settings.TTS_CONCURRENCY)
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[name] = future
+        try:
+            async with self._semaphore:
+                data = await asyncio.to_thread(self.engine.synthesize, sentence)
+            await self.cache.put(name, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()
+            raise
+        finally:
+            del self._in_flight[name]
+
+    async def stream(self, text: str) -> AsyncIterator[bytes]:
+        sentences = split_sentences(text)
+        if not sentences:
+            raise TTSError("Nothing to say")
+        tasks = [asyncio.create_task(self.synthesize(s)) for s in sentences]
+        try:
+            header_sent = False
+            for task in tasks:
+                data = await task
+                if self.engine.extension != "wav":
+                    # MP3 frames can simply be concatenated
+                    yield data
+                    continue
+                params, frames = _wav_frames(data)
+                if not header_sent:
+                    header_sent = True
+                    yield _wav_stream_header(*params)
+                yield frames
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {"engine": settings.TTS_ENGINE, "cache": self.cache.stats(), "in_flight": len(self._in_flight)}
+
+
+tts = TextToSpeech()
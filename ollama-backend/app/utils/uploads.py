@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import logging
+import os
+import weakref
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, BinaryIO, Optional
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from app.auth import owner
+from app.db import db
+from app.settings import settings
+from app.utils.storage import BLOB_PREFIX, TTS_PREFIX, remove_quietly, storage
+from app.utils.tts import AudioCache
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+PARTIAL_PREFIX = "upload-"
+
+# Serialises "link a new upload to a blob" against "drop the last reference"
+_blob_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _blob_lock(key: str) -> asyncio.Lock:
+    lock = _blob_locks.get(key)
+    if lock is None:
+        lock = _blob_locks[key] = asyncio.Lock()
+    return lock
+
+
+def max_upload_bytes() -> int:
+    return settings.UPLOAD_MAX_MB * 1024 * 1024
+
+
+def too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File is larger than {settings.UPLOAD_MAX_MB} MB")
+
+
+def blob_key(sha256: str) -> str:
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256}"
+
+
+def partial_path(upload_id: str) -> str:
+    os.makedirs(settings.STORAGE_TEMP_DIR, exist_ok=True)
+    return os.path.join(settings.STORAGE_TEMP_DIR, f"{PARTIAL_PREFIX}{upload_id}")
+
+
+def copy_and_hash(source: BinaryIO, target_path: str) -> tuple:
+    """Copy in fixed-size chunks while hashing; stops as soon as the size limit is passed."""
+    hasher, size, limit = hashlib.sha256(), 0, max_upload_bytes()
+    with open(target_path, "wb") as target:
+        while chunk := source.read(CHUNK_SIZE):
+            size += len(chunk)
+            if size > limit:
+                raise too_large()
+            hasher.update(chunk)
+            target.write(chunk)
+    return hasher.hexdigest(), size
+
+
+async def store_upload(
+    user: dict, original_filename: str, temp_path: str, sha256: str, size: int, chat_id: Optional[str]
+) -> dict:
+    """Move a fully received upload into content-addressed storage and record it in db.files.
+
+    Every db.files document is one reference to its blob; identical content
+    uploaded again only costs a new document.
+    """
+    key = blob_key(sha256)
+    async with _blob_lock(sha256):
+        deduplicated = await storage.exists(key)
+        if deduplicated:
+            remove_quietly(temp_path)
+        else:
+            await storage.save_file(key, temp_path)
+
+        file_doc = {
+            "user": owner(user),
+            "original_filename": original_filename,
+            "stored_filename": f"{uuid4()}_{original_filename}",
+            "storage_key": key,
+            "sha256": sha256,
+            "size": size,
+            "chat_id": chat_id,
+            "uploaded_at": datetime.utcnow(),
+        }
+        await db.files.insert_one(file_doc)
+    file_doc["deduplicated"] = deduplicated
+    return file_doc
+
+
+async def release_upload(file_doc: dict) -> bool:
+    """Delete one db.files reference; returns True when it was the last one for its content."""
+    sha256 = file_doc.get("sha256")
+    async with _blob_lock(sha256 or file_doc["file_path"]):
+        await db.files.delete_one({"_id": file_doc["_id"]})
+        last = not sha256 or not await db.files.count_documents({"sha256": sha256}, limit=1)
+        if file_doc.get("storage_key"):
+            if last:
+                await storage.delete(file_doc["storage_key"])
+        # Files uploaded before content addressing have a private local path
+        elif not await db.files.count_documents({"file_path": file_doc["file_path"]}, limit=1):
+            remove_quietly(file_doc["file_path"])
+    return last
+
+
+@asynccontextmanager
+async def local_file(file_doc: dict) -> AsyncIterator[str]:
+    """A local path for an uploaded file, downloaded to a temp file when storage is remote."""
+    if not file_doc.get("storage_key"):
+        yield file_doc["file_path"]
+        return
+    suffix = os.path.splitext(file_doc["original_filename"])[1]
+    async with storage.local_path(file_doc["storage_key"], suffix) as path:
+        yield path
+
+
+async def file_size(file_doc: dict) -> Optional[int]:
+    if file_doc.get("storage_key"):
+        return await storage.size(file_doc["storage_key"])
+    try:
+        return os.path.getsize(file_doc["file_path"])
+    except FileNotFoundError:
+        return None
+
+
+async def read_file(file_doc: dict, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+    if file_doc.get("storage_key"):
+        async for chunk in storage.read(file_doc["storage_key"], start, end):
+            yield chunk
+        return
+    with open(file_doc["file_path"], "rb") as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = await asyncio.to_thread(f.read, CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class StorageSweeper:
+    """Periodically removes stale temp files, expired TTS audio and blobs nothing references."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None and settings.STORAGE_GC_INTERVAL > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                removed = await self.sweep()
+                if any(removed.values()):
+                    logger.info("Storage sweep removed %s", removed)
+            except Exception:
+                logger.exception("Storage sweep failed")
+            await asyncio.sleep(settings.STORAGE_GC_INTERVAL)
+
+    async def sweep(self) -> dict:
+        now = datetime.now(timezone.utc)
+        removed = {"temp": 0, "tts": 0, "blobs": 0}
+
+        # Scratch files, except uploads whose session is still alive
+        live = {s["_id"] for s in await db.upload_sessions.find(
+            {"expires_at": {"$gt": datetime.utcnow()}}, {"_id": 1}
+        ).to_list(length=None)}
+        temp_cutoff = (now - timedelta(hours=settings.STORAGE_TEMP_RETENTION_HOURS)).timestamp()
+        if os.path.isdir(settings.STORAGE_TEMP_DIR):
+            for name in os.listdir(settings.STORAGE_TEMP_DIR):
+                path = os.path.join(settings.STORAGE_TEMP_DIR, name)
+                if name.startswith(PARTIAL_PREFIX) and name[len(PARTIAL_PREFIX):] in live:
+                    continue
+                try:
+                    if os.path.getmtime(path) < temp_cutoff:
+                        os.remove(path)
+                        removed["temp"] += 1
+                except FileNotFoundError:
+                    pass
+
+        # Other audio under tts/; AudioCache entries are left to its LRU eviction
+        tts_cutoff = now - timedelta(hours=settings.TTS_RETENTION_HOURS)
+        async for key, _, modified in storage.list(TTS_PREFIX):
+            if not AudioCache.owns(key) and modified < tts_cutoff:
+                await storage.delete(key)
+                removed["tts"] += 1
+
+        # Blobs whose last reference is gone, e.g. after a crash between delete steps;
+        # the grace period covers uploads that are stored but not yet recorded
+        orphan_cutoff = now - timedelta(hours=settings.STORAGE_ORPHAN_GRACE_HOURS)
+        candidates = {}
+        async for key, _, modified in storage.list(BLOB_PREFIX):
+            if modified < orphan_cutoff:
+                candidates[key.rsplit("/", 1)[-1]] = key
+        hashes = list(candidates)
+        for start in range(0, len(hashes), 500):
+            batch = hashes[start:start + 500]
+            referenced = set(await db.files.distinct("sha256", {"sha256": {"$in": batch}}))
+            for sha256 in batch:
+                if sha256 not in referenced:
+                    async with _blob_lock(sha256):
+                        if not await db.files.count_documents({"sha256": sha256}, limit=1):
+                            await storage.delete(candidates[sha256])
+                            removed["blobs"] += 1
+        return removed
+
+
+storage_sweeper = StorageSweeper()
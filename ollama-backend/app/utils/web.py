@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import httpx
+from lxml import html as lxml_html
+from lxml.etree import ParserError
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (compatible; ollama-backend blog reader)"
+HTML_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# Page furniture that is never part of the article
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "iframe", "svg", "form", "nav", "header", "footer", "aside", "button"]
+BOILERPLATE_HINT = re.compile(
+    r"comment|footer|header|menu|nav|sidebar|related|share|social|promo|advert|banner|cookie|newsletter|subscribe",
+    re.IGNORECASE,
+)
+TEXT_TAGS = {"p", "h1", "h2", "h3", "h4", "h5", "h6", "li", "pre", "blockquote", "td"}
+
+
+class FetchError(Exception):
+    """The page could not be downloaded or holds no readable text."""
+
+
+@dataclass
+class Article:
+    url: str
+    title: str
+    text: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.text.encode("utf-8")) + len(self.title.encode("utf-8"))
+
+
+def _text_of(element) -> str:
+    return " ".join(element.text_content().split())
+
+
+def _link_density(element) -> float:
+    text = len(_text_of(element)) or 1
+    return sum(len(_text_of(a)) for a in element.iter("a")) / text
+
+
+def _best_container(root):
+    for xpath in ("//article", "//main", "//*[@role='main']"):
+        found = root.xpath(xpath)
+        if found:
+            return max(found, key=lambda e: len(_text_of(e)))
+
+    # Readability-style: credit each paragraph's text to its parent and
+    # grandparent, discounted by how much of it is link text
+    scores: Dict[object, float] = {}
+    for p in root.iter("p"):
+        length = len(_text_of(p))
+        if length < 25:
+            continue
+        score = (1 + length / 100) * (1 - _link_density(p))
+        parent = p.getparent()
+        if parent is not None:
+            scores[parent] = scores.get(parent, 0) + score
+            grandparent = parent.getparent()
+            if grandparent is not None:
+                scores[grandparent] = scores.get(grandparent, 0) + score / 2
+    if not scores:
+        return root
+    return max(scores, key=scores.get)
+
+
+def extract_article(page: str) -> tuple:
+    """(title, main text) of an HTML page, without navigation, ads and comments."""
+    try:
+        root = lxml_html.document_fromstring(page)
+    except (ParserError, ValueError):
+        return "", ""
+
+    title = " ".join((root.findtext(".//title") or "").split())
+    for element in root.xpath("//" + " | //".join(BOILERPLATE_TAGS)):
+        element.drop_tree()
+    for element in root.xpath("//*[@class or @id]"):
+        hint = f"{element.get('class', '')} {element.get('id', '')}"
+        if element.getparent() is not None and element.tag not in ("html", "body", "article", "main") \
+                and BOILERPLATE_HINT.search(hint) and _link_density(element) > 0.3:
+            element.drop_tree()
+
+    container = _best_container(root)
+    blocks, seen = [], set()
+    for element in container.iter(*TEXT_TAGS):
+        # Skip blocks nested in a block already taken (li inside blockquote...)
+        if any(ancestor in seen for ancestor in element.iterancestors()):
+            continue
+        text = _text_of(element)
+        if text and (element.tag != "li" or _link_density(element) < 0.5):
+            seen.add(element)
+            blocks.append(text)
+    text = "\n\n".join(blocks) or _text_of(container)
+    return title, text
+
+
+class WebFetcher:
+    """Pages fetched over a shared connection pool and kept as extracted articles.
+
+    Within BLOG_CACHE_TTL seconds a page is served from memory; after that it
+    is revalidated with If-None-Match / If-Modified-Since, so an unchanged page
+    costs a 304 and no re-parse. Concurrent requests for one URL share a fetch.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._entries: "OrderedDict[str, Article]" = OrderedDict()
+        self._size = 0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.counts = {"hits": 0, "revalidated": 0, "fetched": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                follow_redirects=True,
+                headers={"User-Agent": USER_AGENT},
+                timeout=httpx.Timeout(settings.BLOG_FETCH_TIMEOUT, connect=settings.OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=settings.BLOG_MAX_CONNECTIONS, max_keepalive_connections=settings.BLOG_MAX_CONNECTIONS),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _remember(self, article: Article):
+        self._forget(article.url)
+        if article.size > settings.BLOG_CACHE_MAX_MB * 1024 * 1024:
+            return
+        self._entries[article.url] = article
+        self._size += article.size
+        while self._size > settings.BLOG_CACHE_MAX_MB * 1024 * 1024:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+
+    def _forget(self, url: str):
+        article = self._entries.pop(url, None)
+        if article is not None:
+            self._size -= article.size
+
+    async def fetch(self, url: str) -> Article:
+        cached = self._entries.get(url)
+        if cached is not None and time.monotonic() - cached.fetched_at < settings.BLOG_CACHE_TTL:
+            self._entries.move_to_end(url)
+            self.counts["hits"] += 1
+            return cached
+        if url in self._in_flight:
+            return await asyncio.shield(self._in_flight[url])
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[url] = future
+        try:
+            article = await self._download(url, cached)
+            future.set_result(article)
+            return article
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()
+            raise
+        finally:
+            del self._in_flight[url]
+
+    async def _download(self, url: str, cached: Optional[Article]) -> Article:
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        limit = settings.BLOG_MAX_PAGE_MB * 1024 * 1024
+        try:
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached is not None:
+                    cached.fetched_at = time.monotonic()
+                    self._remember(cached)
+                    self.counts["revalidated"] += 1
+                    return cached
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "text/html").split(";")[0].strip().lower()
+                if content_type not in HTML_TYPES:
+                    raise FetchError(f"Not a web page ({content_type})")
+                body = bytearray()
+                async for chunk in response.aiter_bytes():
+                    body += chunk
+                    if len(body) > limit:
+                        raise FetchError(f"Page is larger than {settings.BLOG_MAX_PAGE_MB} MB")
+                encoding = response.encoding or "utf-8"
+                etag, last_modified = response.headers.get("etag"), response.headers.get("last-modified")
+        except httpx.HTTPError as e:
+            raise FetchError(str(e))
+
+        page = bytes(body).decode(encoding, errors="replace")
+        if content_type == "text/plain":
+            title, text = "", page.strip()
+        else:
+            # lxml is fast, but a big page still takes a few ms; keep it off the event loop
+            title, text = await asyncio.to_thread(extract_article, page)
+        article = Article(url, title, text, etag, last_modified, time.monotonic())
+        self.counts["fetched"] += 1
+        self._remember(article)
+        return article
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "bytes": self._size, "in_flight": len(self._in_flight), **self.counts}
+
+
+web_fetcher = WebFetcher()
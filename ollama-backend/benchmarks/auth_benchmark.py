@@ -0,0 +1,113 @@
+"""Per-request cost of authenticating a bearer token.
+
+    python -m benchmarks.auth_benchmark
+    python -m benchmarks.auth_benchmark --iterations 50000 --json results/auth.json
+    python -m benchmarks.auth_benchmark --mongo mongodb://localhost:27017
+
+Paths measured, per request:
+  decode      signature check and claims only (what every request paid before AuthCache)
+  decode+db   decode plus the db.admins read a fresh lookup needs
+  miss        AuthCache with an empty cache: decode, revocation check, admin record
+  hit         AuthCache with the token already verified
+
+On mongomock (the default) the Mongo paths measure Python overhead only;
+use --mongo with a real mongod for the read's true cost.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from benchmarks.serve import use_mongomock
+
+USERNAME = "bench-auth"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(name, latencies):
+    return {
+        "path": name,
+        "p50_us": percentile(latencies, 50) * 1e6,
+        "p99_us": percentile(latencies, 99) * 1e6,
+        "mean_us": statistics.mean(latencies) * 1e6,
+        "per_second": len(latencies) / sum(latencies),
+    }
+
+
+async def timed(iterations, call):
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run(iterations):
+    from app.auth import auth_cache, verify_token
+    from app.db import db
+    from app.utils.jwt_handler import create_access_token
+
+    await db.admins.delete_many({"username": USERNAME})
+    await db.admins.insert_one({"username": USERNAME, "password": "-", "tokens_valid_after": 0})
+    token = create_access_token(USERNAME, role="admin")
+
+    async def decode():
+        verify_token(token)
+
+    async def decode_and_read():
+        verify_token(token)
+        await db.admins.find_one({"username": USERNAME}, {"_id": 1})
+
+    async def miss():
+        auth_cache.clear()
+        await auth_cache.user_for(token)
+
+    async def hit():
+        await auth_cache.user_for(token)
+
+    try:
+        results = []
+        for name, call in (("decode", decode), ("decode+db", decode_and_read), ("miss", miss), ("hit", hit)):
+            await call()  # warm up
+            results.append(summarize(name, await timed(iterations, call)))
+        return results
+    finally:
+        await db.admins.delete_many({"username": USERNAME})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--mongo", default="mock", help='"mock" or a MongoDB URI')
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.mongo == "mock":
+        os.environ.setdefault("MONGO_URI", "mongodb://mock")
+        use_mongomock()
+    else:
+        os.environ["MONGO_URI"] = args.mongo
+
+    results = asyncio.run(run(args.iterations))
+
+    print(f"{'path':<10} {'p50 us':>10} {'p99 us':>10} {'mean us':>10} {'per second':>12}")
+    for r in results:
+        print(f"{r['path']:<10} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} {r['mean_us']:>10.1f} {r['per_second']:>12.0f}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump({"iterations": args.iterations, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
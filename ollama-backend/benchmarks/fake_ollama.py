@@ -0,0 +1,119 @@
+"""A stand-in Ollama server for local testing and benchmarks.
+
+Speaks the subset of the Ollama HTTP API the backend uses, with a
+configurable time-to-first-token and token rate:
+
+    python -m benchmarks.fake_ollama --port 11435 --latency 0.2 --tokens-per-second 40
+
+Point the backend at it with OLLAMA_BASE_URL=http://localhost:11435.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def create_app(
+    latency: float = 0.1,
+    tokens_per_second: float = 50.0,
+    response_tokens: int = 40,
+    models: tuple = ("llama3.2:latest",),
+) -> FastAPI:
+    app = FastAPI()
+    app.state.requests = 0
+
+    def reply_tokens(prompt: str) -> list:
+        # Deterministic reply so cache behaviour is reproducible
+        words = (prompt.split() or ["ok"])[:8]
+        return [f"{words[i % len(words)]} " for i in range(response_tokens)]
+
+    async def produce(tokens: list):
+        await asyncio.sleep(latency)
+        delay = 1.0 / tokens_per_second if tokens_per_second > 0 else 0
+        for token in tokens:
+            if delay:
+                await asyncio.sleep(delay)
+            yield token
+
+    def stats(started: float, count: int) -> dict:
+        duration = max(time.perf_counter() - started, 1e-9)
+        return {"done": True, "eval_count": count, "eval_duration": int(duration * 1e9)}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": name, "model": name} for name in models]}
+
+    @app.get("/api/ps")
+    async def ps():
+        return {"models": [{"name": name, "model": name} for name in models]}
+
+    async def generation(body: dict, prompt: str, wrap):
+        app.state.requests += 1
+        tokens = reply_tokens(prompt)
+        started = time.perf_counter()
+
+        if not body.get("stream", True):
+            text = "".join([t async for t in produce(tokens)])
+            return JSONResponse({**wrap(text), **stats(started, len(tokens)), "model": body.get("model")})
+
+        async def lines():
+            async for token in produce(tokens):
+                yield json.dumps({**wrap(token), "done": False, "model": body.get("model")}) + "\n"
+            yield json.dumps({**wrap(""), **stats(started, len(tokens)), "model": body.get("model")}) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        return await generation(body, body.get("prompt", ""), lambda text: {"response": text})
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or [{}]
+        prompt = messages[-1].get("content", "")
+        return await generation(body, prompt, lambda text: {"message": {"role": "assistant", "content": text}})
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        body = await request.json()
+        inputs = body.get("input", "")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        return {"model": body.get("model"), "embeddings": [fake_embedding(text) for text in inputs]}
+
+    return app
+
+
+def fake_embedding(text: str, dims: int = 64) -> list:
+    # Bag of hashed words, L2-normalised: similar texts get similar vectors
+    vector = [0.0] * dims
+    for word in text.lower().split():
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dims] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--response-tokens", type=int, default=40)
+    parser.add_argument("--models", default="llama3.2:latest", help="comma-separated models reported by /api/tags")
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.tokens_per_second, args.response_tokens, tuple(args.models.split(",")))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
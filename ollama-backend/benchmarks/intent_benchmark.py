@@ -0,0 +1,115 @@
+"""Compare local intent detection with the LLM path on a labelled set.
+
+    python -m benchmarks.intent_benchmark                # local engine only
+    python -m benchmarks.intent_benchmark --llm          # also ask Ollama
+    python -m benchmarks.intent_benchmark --llm --json results/intent.json
+
+The LLM path talks to OLLAMA_BASE_URL with the same prompt /api/files/detect-intent
+uses; point it at benchmarks.fake_ollama for a dry run.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import statistics
+import time
+
+import httpx
+
+from app.settings import settings
+from app.utils.intent import intent_engine, llm_intent_prompt, parse_llm_intent
+
+EVAL_FILE = os.path.join(os.path.dirname(__file__), "intent_eval.csv")
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(name, latencies, correct, total, extra=None):
+    return {
+        "path": name,
+        "accuracy": correct / total,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        **(extra or {}),
+    }
+
+
+async def ask_llm(client, text):
+    response = await client.post(
+        f"{settings.OLLAMA_BASE_URL}/api/generate",
+        json={"model": settings.OLLAMA_MODEL, "prompt": llm_intent_prompt(text), "stream": False},
+    )
+    response.raise_for_status()
+    return parse_llm_intent(response.json().get("response", ""))
+
+
+async def run(rows, use_llm):
+    results = []
+    intent_engine.classifier  # train outside the timed loop
+
+    latencies, correct, confident = [], 0, 0
+    local = []
+    for row in rows:
+        started = time.perf_counter()
+        result = intent_engine.classify(row["text"])
+        latencies.append(time.perf_counter() - started)
+        local.append(result)
+        correct += result.intent == row["label"]
+        confident += result.confidence >= settings.INTENT_MIN_CONFIDENCE
+    results.append(summarize("local", latencies, correct, len(rows), {"confident_share": confident / len(rows)}))
+
+    if not use_llm:
+        return results
+
+    async with httpx.AsyncClient(timeout=settings.OLLAMA_INTENT_TIMEOUT) as client:
+        llm_latencies, llm_answers = [], []
+        for row in rows:
+            started = time.perf_counter()
+            llm_answers.append(await ask_llm(client, row["text"]))
+            llm_latencies.append(time.perf_counter() - started)
+    llm_correct = sum(a == r["label"] for a, r in zip(llm_answers, rows))
+    results.append(summarize("llm", llm_latencies, llm_correct, len(rows)))
+
+    # What /api/files/detect-intent does: local answer when confident, LLM otherwise
+    hybrid_latencies, hybrid_correct = [], 0
+    for row, result, latency, answer, llm_latency in zip(rows, local, latencies, llm_answers, llm_latencies):
+        if result.confidence >= settings.INTENT_MIN_CONFIDENCE:
+            hybrid_latencies.append(latency)
+            hybrid_correct += result.intent == row["label"]
+        else:
+            hybrid_latencies.append(latency + llm_latency)
+            hybrid_correct += (answer or result.intent) == row["label"]
+    results.append(summarize("hybrid", hybrid_latencies, hybrid_correct, len(rows)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eval-file", default=EVAL_FILE)
+    parser.add_argument("--llm", action="store_true", help="also benchmark the Ollama path")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    with open(args.eval_file, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+
+    results = asyncio.run(run(rows, args.llm))
+
+    print(f"{'path':<8} {'accuracy':>9} {'p50 ms':>10} {'p99 ms':>10} {'mean ms':>10}")
+    for r in results:
+        print(f"{r['path']:<8} {r['accuracy']:>9.1%} {r['p50_ms']:>10.3f} {r['p99_ms']:>10.3f} {r['mean_ms']:>10.3f}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump({"samples": len(rows), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Drive the durable job queue end to end against a fake Ollama.
+
+    python -m benchmarks.job_queue_check
+    python -m benchmarks.job_queue_check --lease 3 --backoff 4
+    python -m benchmarks.job_queue_check --mongo mongodb://localhost:27017
+
+Runs a JobManager in this process on mongomock (or --mongo) with a fake
+Ollama started alongside, and checks each path a job can take:
+
+  run        a submitted job is claimed and finishes on the first attempt
+  reclaim    a job claimed by a worker that then died is re-queued once its
+             lease expires and finishes on a live worker
+  exhausted  a job whose lease expires on its last attempt is failed
+  backoff    a job that hits an Ollama outage is re-queued with not_before,
+             is not claimed again before it, and finishes once Ollama is back
+
+Exits non-zero if any check fails.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.load_test import free_port, stop_servers, wait_until_up
+from benchmarks.serve import use_mongomock
+
+DOCUMENT = "The quarterly report covers revenue, hiring and the roadmap for the next two releases.\n" * 20
+
+
+class FakeOllama:
+    """The fake Ollama as a subprocess that can be stopped and started again on the same port."""
+
+    def __init__(self, latency: float):
+        self.port = free_port()
+        self.latency = latency
+        self.process = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(self.port), "--latency", str(self.latency),
+             "--tokens-per-second", "0"],
+            cwd=root,
+        )
+        wait_until_up(f"{self.url}/api/tags", self.process)
+
+    def stop(self):
+        if self.process is not None:
+            stop_servers((self.process,))
+            self.process = None
+
+
+class Checks:
+    def __init__(self):
+        self.failed = 0
+
+    def expect(self, name: str, ok: bool, detail: str = ""):
+        print(f"{'ok  ' if ok else 'FAIL'} {name}" + (f"  ({detail})" if detail else ""))
+        if not ok:
+            self.failed += 1
+
+
+async def wait_for(job_id: str, predicate, timeout: float) -> dict:
+    from app.db import db
+
+    deadline = time.monotonic() + timeout
+    while True:
+        job = await db.jobs.find_one({"_id": job_id})
+        if predicate(job) or time.monotonic() > deadline:
+            return job
+        await asyncio.sleep(0.1)
+
+
+def terminal(job: dict) -> bool:
+    return job["status"] in ("done", "failed")
+
+
+async def upload(user: dict, tmp_dir: str) -> str:
+    from app.utils.text_cache import file_sha256
+    from app.utils.uploads import store_upload
+
+    path = os.path.join(tmp_dir, f"{user['username']}.txt")
+    with open(path, "w") as f:
+        f.write(DOCUMENT)
+    file_doc = await store_upload(user, "report.txt", path, file_sha256(path), len(DOCUMENT), None)
+    return file_doc["stored_filename"]
+
+
+async def run(ollama: FakeOllama, args, tmp_dir: str) -> Checks:
+    from app.db import db
+    from app.jobs import JobManager
+    from app.ollama_client import ollama as ollama_client
+    from app.settings import settings
+    from app.utils.extraction import extraction_pool
+
+    checks = Checks()
+    users = {name: {"_id": None, "username": f"queue-{name}", "role": "admin"} for name in ("run", "reclaim", "exhausted", "backoff")}
+    files = {name: await upload(user, tmp_dir) for name, user in users.items()}
+
+    async def submit(manager, name: str) -> dict:
+        return await manager.submit(users[name], "translate", {"filename": files[name]})
+
+    # A worker that claims two jobs and dies before running either: no heartbeat, no stop()
+    crashed = JobManager()
+    reclaimed = await submit(crashed, "reclaim")
+    exhausted = await submit(crashed, "exhausted")
+    await crashed._claim()
+    await crashed._claim()
+    await db.jobs.update_one({"_id": exhausted["_id"]}, {"$set": {"attempts": settings.JOB_MAX_ATTEMPTS}})
+
+    live = JobManager()
+    live.start()
+    try:
+        job = await submit(live, "run")
+        job = await wait_for(job["_id"], terminal, args.timeout)
+        checks.expect(
+            "run: done on the first attempt",
+            job["status"] == "done" and job["attempts"] == 1 and job["worker_id"] == live.worker_id and bool(job["result"]["translation"]),
+            f"status {job['status']}, attempts {job['attempts']}",
+        )
+
+        job = await wait_for(reclaimed["_id"], terminal, args.timeout)
+        checks.expect(
+            "reclaim: expired lease re-queued and finished by a live worker",
+            job["status"] == "done" and job["attempts"] == 2 and job["worker_id"] == live.worker_id,
+            f"status {job['status']}, attempts {job['attempts']}",
+        )
+
+        job = await wait_for(exhausted["_id"], terminal, args.timeout)
+        checks.expect(
+            "exhausted: expired lease on the last attempt fails the job",
+            job["status"] == "failed" and "crashed or stalled" in (job["error"] or ""),
+            f"status {job['status']}, error {job['error']!r}",
+        )
+
+        ollama.stop()
+        job = await submit(live, "backoff")
+        job = await wait_for(job["_id"], lambda j: j["attempts"] >= 1 and j["status"] != "running", args.timeout)
+        not_before = job.get("not_before")
+        checks.expect(
+            "backoff: Ollama outage re-queues the job with not_before",
+            job["status"] == "queued" and not_before is not None and job["error"] is not None,
+            f"status {job['status']}, not_before {not_before}",
+        )
+        ollama.start()
+        job = await wait_for(job["_id"], terminal, args.timeout + args.backoff)
+        checks.expect(
+            "backoff: retried no earlier than not_before and finished",
+            job["status"] == "done" and job["attempts"] == 2 and not_before is not None and job["started_at"] >= not_before,
+            f"status {job['status']}, attempts {job['attempts']}",
+        )
+    finally:
+        await live.stop()
+        await ollama_client.close()
+        extraction_pool.shutdown()
+    return checks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="mock", help='"mock" or a MongoDB URI')
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Ollama: seconds before the first token")
+    parser.add_argument("--lease", type=int, default=2, help="JOB_LEASE_SECONDS for the run")
+    parser.add_argument("--backoff", type=float, default=3.0, help="JOB_RETRY_BACKOFF for the run")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for each job")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="job-queue-check-")
+    ollama = FakeOllama(args.latency)
+    ollama.start()
+
+    # Settings are read on import, so everything is configured before app is imported
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.update({
+        "OLLAMA_BASE_URL": ollama.url,
+        "RESPONSE_CACHE_ENABLED": "false",
+        "JOB_LEASE_SECONDS": str(args.lease),
+        "JOB_POLL_INTERVAL": "0.2",
+        "JOB_RETRY_BACKOFF": str(args.backoff),
+        "STORAGE_BACKEND": "local",
+        "STORAGE_LOCAL_DIR": os.path.join(tmp_dir, "storage"),
+        "STORAGE_TEMP_DIR": os.path.join(tmp_dir, "storage", "tmp"),
+    })
+    if args.mongo == "mock":
+        os.environ.setdefault("MONGO_URI", "mongodb://mock")
+        use_mongomock()
+    else:
+        os.environ["MONGO_URI"] = args.mongo
+
+    try:
+        checks = asyncio.run(run(ollama, args, tmp_dir))
+    finally:
+        ollama.stop()
+
+    if checks.failed:
+        raise SystemExit(f"{checks.failed} check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Drive a mix of realistic requests at the backend and report latency percentiles.
+
+    python -m benchmarks.load_test --duration 30 --concurrency 16 --json results/load.json
+    python -m benchmarks.load_test --mix chat=6,history=3,upload_process=1,translate=1 \\
+        --latency 0.3 --tokens-per-second 30 --mongo mongodb://localhost:27017
+    python -m benchmarks.load_test --baseline results/load.json   # compare with an earlier run
+
+By default a fake Ollama (benchmarks.fake_ollama) and the backend
+(benchmarks.serve, on mongomock) are started as subprocesses; --target
+benchmarks a backend that is already running instead. Every operation records
+its latency and time to first byte; results are grouped per operation with
+throughput and p50/p90/p99, and saved as JSON together with the git commit.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+SUPERADMIN_USERNAME = os.environ.get("SUPERADMIN_USERNAME", "superadmin")
+SUPERADMIN_PASSWORD = os.environ.get("SUPERADMIN_PASSWORD", "supersecret")
+
+WORDS = (
+    "model context latency token stream cache index query storage upload summary translate "
+    "chapter report budget result figure sample method review draft server worker queue"
+).split()
+QUESTIONS = [
+    "What is the main point of the report?",
+    "Summarize the budget section in two sentences.",
+    "Which methods were compared and which one won?",
+    "List the open questions from the last meeting.",
+    "Explain the difference between latency and throughput.",
+]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def document(rng: random.Random, paragraphs: int = 6) -> str:
+    return "\n\n".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 90))).capitalize() + "."
+        for _ in range(paragraphs)
+    )
+
+
+class Recorder:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.ttfb = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.recording = False
+
+    def add(self, operation: str, status, started: float, first_byte: float = None):
+        if not self.recording:
+            return
+        finished = time.perf_counter()
+        self.statuses[operation][str(status)] += 1
+        if isinstance(status, int) and status < 400:
+            self.latency[operation].append(finished - started)
+            self.ttfb[operation].append((first_byte or finished) - started)
+
+    def report(self, elapsed: float) -> dict:
+        results = {}
+        for operation in sorted(self.statuses):
+            latencies, ttfbs = self.latency[operation], self.ttfb[operation]
+            total = sum(self.statuses[operation].values())
+            entry = {
+                "requests": total,
+                "errors": total - len(latencies),
+                "statuses": dict(self.statuses[operation]),
+                "throughput_rps": len(latencies) / elapsed,
+            }
+            if latencies:
+                entry.update({
+                    "p50_ms": percentile(latencies, 50) * 1000,
+                    "p90_ms": percentile(latencies, 90) * 1000,
+                    "p99_ms": percentile(latencies, 99) * 1000,
+                    "mean_ms": statistics.mean(latencies) * 1000,
+                    "ttfb_p50_ms": percentile(ttfbs, 50) * 1000,
+                    "ttfb_p99_ms": percentile(ttfbs, 99) * 1000,
+                })
+            results[operation] = entry
+        return results
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, token: str, recorder: Recorder, rng: random.Random):
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.recorder = recorder
+        self.rng = rng
+        self.files = []
+        self.chat_id = f"bench-{rng.getrandbits(32):08x}"
+
+    async def _stream(self, operation: str, method: str, url: str, **kwargs):
+        started, first_byte, status = time.perf_counter(), None, "error"
+        try:
+            async with self.client.stream(method, url, headers=self.headers, **kwargs) as response:
+                status = response.status_code
+                async for chunk in response.aiter_bytes():
+                    if first_byte is None and chunk:
+                        first_byte = time.perf_counter()
+                return response
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        finally:
+            self.recorder.add(operation, status, started, first_byte)
+
+    async def chat(self):
+        # Half the turns continue a session, so history and context building are exercised too
+        body = {"message": self.rng.choice(QUESTIONS)}
+        if self.rng.random() < 0.5:
+            body["chat_id"] = self.chat_id
+        await self._stream("chat", "POST", "/api/chat/", json=body)
+
+    async def history(self):
+        await self._stream("history", "GET", "/api/chat/history", params={"limit": 20})
+
+    async def upload(self):
+        content = document(self.rng).encode()
+        started, status = time.perf_counter(), "error"
+        try:
+            response = await self.client.post(
+                "/api/files/upload", headers=self.headers,
+                files={"file": (f"bench-{self.rng.getrandbits(24):06x}.txt", content, "text/plain")},
+            )
+            status = response.status_code
+            if status == 200:
+                self.files.append(response.json()["filename"])
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        finally:
+            self.recorder.add("upload", status, started)
+
+    async def upload_process(self):
+        await self.upload()
+        if self.files:
+            await self._stream("process", "POST", "/api/files/process", data={"filename": self.files[-1]})
+
+    async def translate(self):
+        if not self.files:
+            await self.upload()
+        if self.files:
+            await self._stream("translate", "POST", "/api/files/translate", data={"filename": self.rng.choice(self.files)})
+
+
+async def setup_users(client: httpx.AsyncClient, count: int) -> list:
+    """Create bench admins through the API so the run works against any deployment."""
+    response = await client.post("/api/auth/login", json={"username": SUPERADMIN_USERNAME, "password": SUPERADMIN_PASSWORD})
+    response.raise_for_status()
+    admin_headers = {"Authorization": f"Bearer {response.json()['token']}"}
+    tokens = []
+    for i in range(count):
+        username, password = f"bench-user-{i}", "bench-password"
+        created = await client.post("/api/admins/create", headers=admin_headers, data={"username": username, "password": password})
+        if created.status_code not in (200, 400):  # 400: left over from an earlier run
+            created.raise_for_status()
+        login = await client.post("/api/auth/login", json={"username": username, "password": password})
+        login.raise_for_status()
+        tokens.append(login.json()["token"])
+    return tokens
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("chat", "history", "upload_process", "translate"):
+            raise SystemExit(f"Unknown scenario in --mix: {name}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def run_load(base_url: str, args) -> dict:
+    recorder = Recorder()
+    weights = parse_mix(args.mix)
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        tokens = await setup_users(client, args.users)
+        rng = random.Random(args.seed)
+        users = [VirtualUser(client, tokens[i % len(tokens)], recorder, random.Random(rng.random())) for i in range(args.concurrency)]
+
+        stop_at = None
+        remaining = [args.requests] if args.requests else None
+
+        async def worker(user: VirtualUser):
+            while True:
+                if stop_at is not None and time.perf_counter() >= stop_at:
+                    return
+                if remaining is not None and recorder.recording:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                scenario = user.rng.choices(list(weights), weights=list(weights.values()))[0]
+                await getattr(user, scenario)()
+
+        workers = [asyncio.create_task(worker(user)) for user in users]
+        try:
+            await asyncio.sleep(args.warmup)
+            recorder.recording = True
+            started = time.perf_counter()
+            if not args.requests:
+                stop_at = started + args.duration
+            await asyncio.gather(*workers)
+            elapsed = time.perf_counter() - started
+        finally:
+            for task in workers:
+                task.cancel()
+
+    operations = recorder.report(elapsed)
+    return {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "elapsed_seconds": elapsed,
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+        "total_rps": sum(op["throughput_rps"] for op in operations.values()),
+        "operations": operations,
+    }
+
+
+def wait_until_up(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"{' '.join(process.args)} exited with {process.returncode}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_servers(args) -> tuple:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ollama_port, backend_port = free_port(), free_port()
+    ollama = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_ollama", "--port", str(ollama_port), "--latency", str(args.latency),
+         "--tokens-per-second", str(args.tokens_per_second), "--response-tokens", str(args.response_tokens),
+         "--models", "llama3.2:latest,nomic-embed-text:latest"],
+        cwd=root,
+    )
+    env = {
+        **os.environ,
+        "OLLAMA_BASE_URL": f"http://127.0.0.1:{ollama_port}",
+        # Cached answers would hide Ollama; turn the cache on explicitly to measure it
+        "RESPONSE_CACHE_ENABLED": os.environ.get("RESPONSE_CACHE_ENABLED", "false"),
+        "MONGO_ENSURE_INDEXES": os.environ.get("MONGO_ENSURE_INDEXES", "false" if args.mongo == "mock" else "true"),
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.serve", "--port", str(backend_port), "--mongo", args.mongo],
+        cwd=root, env=env,
+    )
+    try:
+        wait_until_up(f"http://127.0.0.1:{ollama_port}/api/tags", ollama)
+        wait_until_up(f"http://127.0.0.1:{backend_port}/", backend)
+    except BaseException:
+        stop_servers((ollama, backend))
+        raise
+    return f"http://127.0.0.1:{backend_port}", (ollama, backend)
+
+
+def stop_servers(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def print_report(result: dict, baseline: dict = None):
+    print(f"commit {result['commit']}  {result['elapsed_seconds']:.1f}s  {result['total_rps']:.1f} req/s")
+    header = f"{'operation':<10} {'reqs':>6} {'errs':>5} {'req/s':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'ttfb p50':>9} {'ttfb p99':>9}"
+    print(header)
+    for name, op in result["operations"].items():
+        cols = [op.get(k) for k in ("p50_ms", "p90_ms", "p99_ms", "ttfb_p50_ms", "ttfb_p99_ms")]
+        print(f"{name:<10} {op['requests']:>6} {op['errors']:>5} {op['throughput_rps']:>7.1f} "
+              + " ".join(f"{c:>9.1f}" if c is not None else f"{'-':>9}" for c in cols))
+        old = (baseline or {}).get("operations", {}).get(name)
+        if old and op.get("p50_ms") and old.get("p50_ms"):
+            change = lambda key: (op[key] - old[key]) / old[key] * 100
+            print(f"{'':<10} vs {baseline['commit']}: p50 {change('p50_ms'):+.1f}%  p99 {change('p99_ms'):+.1f}%  "
+                  f"req/s {(op['throughput_rps'] - old['throughput_rps']) / (old['throughput_rps'] or 1) * 100:+.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", help="benchmark this running backend instead of starting one")
+    parser.add_argument("--mongo", default="mock", help='"mock" (mongomock) or a MongoDB URI for the started backend')
+    parser.add_argument("--latency", type=float, default=0.1, help="fake Ollama: seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="fake Ollama: token rate")
+    parser.add_argument("--response-tokens", type=int, default=40, help="fake Ollama: tokens per answer")
+    parser.add_argument("--mix", default="chat=6,history=3,upload_process=1,translate=1", help="scenario weights")
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users sending requests back to back")
+    parser.add_argument("--users", type=int, default=4, help="distinct accounts the virtual users log in as")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds (ignored with --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="stop after this many measured operations")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of unrecorded load first")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json result to compare against")
+    args = parser.parse_args()
+
+    processes = ()
+    base_url = args.target
+    if not base_url:
+        base_url, processes = start_servers(args)
+    try:
+        result = asyncio.run(run_load(base_url, args))
+    finally:
+        stop_servers(processes)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
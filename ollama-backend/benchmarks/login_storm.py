@@ -0,0 +1,130 @@
+"""Show whether a burst of logins slows down streaming chats on the same worker.
+
+    python -m benchmarks.login_storm --duration 15 --logins 16
+    python -m benchmarks.login_storm --json results/login_storm.json
+
+Chat users stream answers from a fake Ollama for --duration seconds ("quiet"),
+then keep going for the same time while --logins clients log in back to back
+with valid passwords, each login costing a full bcrypt verification ("storm").
+With bcrypt off the event loop, chat p50/p99 and time to first byte should
+stay flat between the two phases. Logins past PASSWORD_HASH_MAX_PENDING get
+503, which counts in the login statuses.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+import httpx
+
+from benchmarks.load_test import Recorder, VirtualUser, git_commit, setup_users, start_servers, stop_servers
+
+
+async def chat_phase(client: httpx.AsyncClient, tokens: list, args, login_storm: bool) -> dict:
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    users = [VirtualUser(client, tokens[i % len(tokens)], recorder, random.Random(rng.random())) for i in range(args.concurrency)]
+    stop_at = time.perf_counter() + args.warmup + args.duration
+
+    async def chatter(user: VirtualUser):
+        while time.perf_counter() < stop_at:
+            await user.chat()
+
+    async def login(i: int):
+        username = f"bench-user-{i % args.users}"
+        while time.perf_counter() < stop_at:
+            started, status = time.perf_counter(), "error"
+            try:
+                response = await client.post("/api/auth/login", json={"username": username, "password": "bench-password"})
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            recorder.add("login", status, started)
+            if status in (429, 503):
+                await asyncio.sleep(0.05)
+
+    tasks = [asyncio.create_task(chatter(user)) for user in users]
+    if login_storm:
+        tasks += [asyncio.create_task(login(i)) for i in range(args.logins)]
+    try:
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        started = time.perf_counter()
+        await asyncio.gather(*tasks)
+        return recorder.report(time.perf_counter() - started)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def run(base_url: str, args) -> dict:
+    limits = httpx.Limits(max_connections=(args.concurrency + args.logins) * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        tokens = await setup_users(client, args.users)
+        quiet = await chat_phase(client, tokens, args, login_storm=False)
+        storm = await chat_phase(client, tokens, args, login_storm=True)
+    return {
+        "commit": git_commit(),
+        "config": {k: v for k, v in vars(args).items() if k != "json"},
+        "quiet": quiet,
+        "storm": storm,
+    }
+
+
+def print_report(result: dict):
+    print(f"commit {result['commit']}")
+    print(f"{'phase':<6} {'chats':>6} {'errs':>5} {'p50 ms':>9} {'p99 ms':>9} {'ttfb p50':>9} {'ttfb p99':>9}")
+    for phase in ("quiet", "storm"):
+        chat = result[phase].get("chat", {})
+        cols = [chat.get(k) for k in ("p50_ms", "p99_ms", "ttfb_p50_ms", "ttfb_p99_ms")]
+        print(f"{phase:<6} {chat.get('requests', 0):>6} {chat.get('errors', 0):>5} "
+              + " ".join(f"{c:>9.1f}" if c is not None else f"{'-':>9}" for c in cols))
+    quiet, storm = result["quiet"].get("chat", {}), result["storm"].get("chat", {})
+    if quiet.get("p99_ms") and storm.get("p99_ms"):
+        change = lambda key: (storm[key] - quiet[key]) / quiet[key] * 100
+        print(f"storm vs quiet: p50 {change('p50_ms'):+.1f}%  p99 {change('p99_ms'):+.1f}%  ttfb p99 {change('ttfb_p99_ms'):+.1f}%")
+    login = result["storm"].get("login")
+    if login:
+        print(f"logins: {login['throughput_rps']:.1f}/s succeeded, statuses {login['statuses']}, "
+              f"p50 {login.get('p50_ms', 0):.0f} ms  p99 {login.get('p99_ms', 0):.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", help="benchmark this running backend instead of starting one")
+    parser.add_argument("--mongo", default="mock", help='"mock" (mongomock) or a MongoDB URI for the started backend')
+    parser.add_argument("--latency", type=float, default=0.1, help="fake Ollama: seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="fake Ollama: token rate")
+    parser.add_argument("--response-tokens", type=int, default=40, help="fake Ollama: tokens per answer")
+    parser.add_argument("--concurrency", type=int, default=8, help="chat users streaming answers back to back")
+    parser.add_argument("--logins", type=int, default=16, help="clients logging in back to back during the storm")
+    parser.add_argument("--users", type=int, default=4, help="distinct accounts")
+    parser.add_argument("--duration", type=float, default=15.0, help="measured seconds per phase")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unrecorded seconds at the start of each phase")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    processes = ()
+    base_url = args.target
+    if not base_url:
+        base_url, processes = start_servers(args)
+    try:
+        result = asyncio.run(run(base_url, args))
+    finally:
+        stop_servers(processes)
+
+    print_report(result)
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or ".", exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
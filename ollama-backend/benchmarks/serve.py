@@ -0,0 +1,50 @@
+"""Run the backend for benchmarks, optionally on an in-memory Mongo.
+
+    python -m benchmarks.serve --port 8001 --mongo mock
+    python -m benchmarks.serve --port 8001 --mongo mongodb://localhost:27017
+
+With --mongo mock, Motor is replaced by mongomock_motor before the app is
+imported, so no mongod is needed (pip install -r benchmarks/requirements.txt).
+Mongo timings are then meaningless; use a real mongod to benchmark queries.
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+
+def use_mongomock():
+    import motor.motor_asyncio
+    from mongomock_motor import AsyncMongoMockClient
+
+    class MockClient(AsyncMongoMockClient):
+        def __init__(self, *args, **kwargs):
+            # Pool sizes, timeouts and event listeners mean nothing to mongomock
+            super().__init__()
+
+    motor.motor_asyncio.AsyncIOMotorClient = MockClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--mongo", default="mock", help='"mock" or a MongoDB URI')
+    args = parser.parse_args()
+
+    # Per-request logs from the app and httpx would swamp the load generator's output
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.mongo == "mock":
+        os.environ.setdefault("MONGO_URI", "mongodb://mock")
+        use_mongomock()
+    else:
+        os.environ["MONGO_URI"] = args.mongo
+
+    from app.main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()